@@ -0,0 +1,218 @@
+"""上游准入控制 - 每个Action一个令牌桶限制QPS，并发数与等待队列有上限，满时快速拒绝"""
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+import metrics
+from resilience import UpstreamUnavailable
+
+# 异步模式下等待并发名额时的检查间隔（秒）；令牌不足时按补充速率精确等待
+ASYNC_POLL_INTERVAL = 0.05
+
+# 各Action的默认配额：qps为令牌补充速率，burst为桶容量，concurrency为同时在途的上游请求数
+DEFAULT_LIMITS = {
+    'JimengVGFMT2VL20SubmitTask': {'qps': 2, 'burst': 2, 'concurrency': 2},
+    'JimengVGFMI2VL20SubmitTask': {'qps': 2, 'burst': 2, 'concurrency': 2},
+    'JimengHighAESGeneralV21L': {'qps': 2, 'burst': 2, 'concurrency': 2},
+    'CVProcess': {'qps': 2, 'burst': 2, 'concurrency': 2},
+    'CVSync2AsyncSubmitTask': {'qps': 2, 'burst': 2, 'concurrency': 2},
+    'JimengVGFMT2VL20GetResult': {'qps': 10, 'burst': 10, 'concurrency': 10},
+    'CVSync2AsyncGetResult': {'qps': 10, 'burst': 10, 'concurrency': 10},
+}
+FALLBACK_LIMIT = {'qps': 5, 'burst': 5, 'concurrency': 5}
+
+
+class AdmissionRejected(UpstreamUnavailable):
+    """等待队列已满或等待超时，调用方应返回429并带上Retry-After"""
+
+    status_code = 429
+
+    def __init__(self, action, retry_after):
+        super().__init__(f'{action} 上游繁忙，请 {retry_after:.1f} 秒后重试', retry_after)
+        self.action = action
+
+
+class ActionLimiter:
+    """单个Action的令牌桶 + 并发上限 + 有界等待队列"""
+
+    def __init__(self, action, qps, burst, concurrency, max_queue, max_wait):
+        self.action = action
+        self.qps = float(qps)
+        self.burst = float(burst)
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._active = 0
+        self._waiting = 0
+        self.rejected = 0
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.qps)
+        self._updated = now
+
+    def _available(self):
+        return self._tokens >= 1 and self._active < self.concurrency
+
+    def _reject(self):
+        self.rejected += 1
+        metrics.admission_rejected.inc(self.action)
+        # 排在前面的请求按qps依次放行，新请求大约需要等这么久
+        return AdmissionRejected(self.action, (self._waiting + 1) / self.qps)
+
+    def _enter_queue(self, start):
+        self._refill(start)
+        if self._waiting >= self.max_queue and not self._available():
+            raise self._reject()
+        self._waiting += 1
+        metrics.admission_queue_depth.set(self.action, value=self._waiting)
+
+    def _leave_queue(self):
+        self._waiting -= 1
+        metrics.admission_queue_depth.set(self.action, value=self._waiting)
+
+    def _try_take(self, wait_until):
+        """能准入时占用名额并返回None，否则返回建议的等待秒数；超过等待期限时抛出AdmissionRejected"""
+        now = time.monotonic()
+        self._refill(now)
+        if self._available():
+            self._tokens -= 1
+            self._active += 1
+            return None
+        remaining = wait_until - now
+        if remaining <= 0:
+            raise self._reject()
+        if self._tokens < 1:
+            return min(remaining, (1 - self._tokens) / self.qps)
+        return remaining
+
+    def _max_wait(self, start, deadline):
+        return self.max_wait if deadline is None else min(self.max_wait, deadline - start)
+
+    def acquire(self, deadline=None):
+        start = time.monotonic()
+        wait_until = start + self._max_wait(start, deadline)
+        with self._cond:
+            self._enter_queue(start)
+            try:
+                while True:
+                    delay = self._try_take(wait_until)
+                    if delay is None:
+                        break
+                    self._cond.wait(delay)
+            finally:
+                self._leave_queue()
+        metrics.admission_wait.observe(self.action, value=time.monotonic() - start)
+
+    async def acquire_async(self, deadline=None):
+        """协程版本：排队只占用协程，不阻塞事件循环线程"""
+        start = time.monotonic()
+        wait_until = start + self._max_wait(start, deadline)
+        with self._cond:
+            self._enter_queue(start)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._try_take(wait_until)
+                    if delay is not None and self._tokens >= 1:
+                        # 等待的是并发名额，归还时无法唤醒协程，按固定间隔检查
+                        delay = min(delay, ASYNC_POLL_INTERVAL)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            with self._cond:
+                self._leave_queue()
+        metrics.admission_wait.observe(self.action, value=time.monotonic() - start)
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def load(self):
+        """在途与排队的请求数相对并发上限的比例，凭证池据此选择负载最低的账号"""
+        with self._cond:
+            return (self._active + self._waiting) / self.concurrency
+
+    def stats(self):
+        with self._cond:
+            return {
+                'qps': self.qps,
+                'concurrency': self.concurrency,
+                'active': self._active,
+                'waiting': self._waiting,
+                'rejected': self.rejected,
+            }
+
+
+class Admission:
+    """按Action懒创建限流器"""
+
+    def __init__(self, limits=None, max_queue=20, max_wait=30.0):
+        self.overrides = dict(limits or {})
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, overrides=None):
+        """UPSTREAM_LIMITS为JSON，例如 {"CVSync2AsyncSubmitTask": {"qps": 1, "concurrency": 1}}
+
+        overrides（如某个账号单独的配额）按Action覆盖UPSTREAM_LIMITS中的配置。
+        """
+        limits = json.loads(os.getenv('UPSTREAM_LIMITS', '{}'))
+        limits.update(overrides or {})
+        return cls(
+            limits=limits,
+            max_queue=int(os.getenv('UPSTREAM_MAX_QUEUE', '20')),
+            max_wait=float(os.getenv('UPSTREAM_MAX_WAIT', '30')),
+        )
+
+    def limiter(self, action):
+        limiter = self._limiters.get(action)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.get(action)
+                if limiter is None:
+                    override = self.overrides.get(action, {})
+                    config = dict(DEFAULT_LIMITS.get(action, FALLBACK_LIMIT), **override)
+                    if 'qps' in override and 'burst' not in override:
+                        config['burst'] = config['qps']
+                    limiter = self._limiters[action] = ActionLimiter(
+                        action, config['qps'], config['burst'], config['concurrency'],
+                        self.max_queue, self.max_wait,
+                    )
+        return limiter
+
+    @contextmanager
+    def slot(self, action, deadline=None):
+        """获取该Action的令牌和并发名额，退出时归还名额；无法准入时抛出AdmissionRejected
+
+        deadline为time.monotonic()时间点，排队时间不会超过请求剩余的时间预算。
+        """
+        limiter = self.limiter(action)
+        limiter.acquire(deadline)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    @asynccontextmanager
+    async def slot_async(self, action, deadline=None):
+        """slot的协程版本，供异步服务模式使用"""
+        limiter = self.limiter(action)
+        await limiter.acquire_async(deadline)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    def stats(self):
+        return {action: limiter.stats() for action, limiter in list(self._limiters.items())}
@@ -1,121 +1,409 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, g, has_request_context
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
-import requests
-import json
+import functools
 import hashlib
-import hmac
-import base64
-from datetime import datetime, timezone
+import io
+import itertools
+import json
+import logging
+import time
+import uuid
+from datetime import datetime
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from admission import DEFAULT_LIMITS
+from asset_cache import AssetCache, normalize_url
+from derived_assets import FORMATS as VARIANT_FORMATS, DerivedAssets, snap_width
+from byte_ranges import RangeNotSatisfiable, file_range_response, parse_byte_ranges
+from conditional import IMMUTABLE_CACHE_CONTROL, is_not_modified, not_modified_headers, range_if_matches, strong_etag
+from credential_pool import CredentialPool
+from idempotency import Idempotency, IdempotencyKeyReused, body_hash
+from image_normalizer import ImageNormalizer
+from image_store import ImageStore, StoredImage
+import json_codec
+import metrics
+from materializer import ResultMaterializer
+from pipelines import PipelineRunner, wait_for_task
+from prompt_optimizer import SYSTEM_PROMPTS, PromptOptimizer, completion_text
+from resilience import UpstreamUnavailable
+from result_cache import ResultCache
+from task_poller import TERMINAL_STATUSES, TaskPoller
+from task_store import TaskStore
+from upload_body import IMAGE_PLACEHOLDER, StreamingJsonBody
+from upstream import UpstreamClient
 
 # 加载环境变量
 load_dotenv()
 
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
+logger = logging.getLogger(__name__)
+
+class CodecJSONProvider(JSONProvider):
+    """jsonify、返回dict的路由和request.get_json都使用json_codec（安装了orjson时更快）"""
+
+    def dumps(self, obj, **kwargs):
+        return json_codec.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return json_codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        # 直接用编码好的bytes构造响应，不经过str中转
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(json_codec.dumps(obj), mimetype='application/json')
+
 app = Flask(__name__)
+app.json = CodecJSONProvider(app)
 CORS(app)  # 允许跨域请求
 
-# VolcEngine配置
-VOLCENGINE_ACCESS_KEY = os.getenv('VOLCENGINE_ACCESS_KEY')
-VOLCENGINE_SECRET_KEY = os.getenv('VOLCENGINE_SECRET_KEY')
+# VolcEngine配置（账号密钥见CredentialPool.from_env）
 VOLCENGINE_REGION = 'cn-beijing'
 VOLCENGINE_SERVICE = 'cv'
 VOLCENGINE_HOST = 'visual.volcengineapi.com'
+# 实际请求地址，压测时可指向本地模拟服务；签名中的host仍为VOLCENGINE_HOST
+VOLCENGINE_ENDPOINT = os.getenv('VOLCENGINE_ENDPOINT', f'https://{VOLCENGINE_HOST}').rstrip('/')
 
-def sign(key, msg):
-    """HMAC-SHA256签名 - 按照官方实现"""
-    return hmac.new(key, msg.encode('utf-8'), hashlib.sha256).digest()
+# 共享上游连接池（keep-alive + 超时），所有路由通过它访问VolcEngine和CDN
+upstream = UpstreamClient.from_env()
 
-def get_signature_key(key, date_stamp, region_name, service_name):
-    """生成签名密钥 - 按照官方实现"""
-    k_date = sign(key.encode('utf-8'), date_stamp)
-    k_region = sign(k_date, region_name)
-    k_service = sign(k_region, service_name)
-    k_signing = sign(k_service, 'request')
-    return k_signing
+# 代理资源的本地磁盘缓存（按源URL内容寻址，LRU淘汰）
+asset_cache = AssetCache.from_env()
 
-def generate_volcengine_signature(method, path, query_string, body):
-    """生成VolcEngine API签名 - 按照官方实现"""
-    
-    # 直接使用Secret Key，不进行Base64解码
-    secret_key = VOLCENGINE_SECRET_KEY
-    
-    # 创建时间戳 - 使用UTC时间，按照官方实现
-    t = datetime.now(timezone.utc)
-    current_date = t.strftime('%Y%m%dT%H%M%SZ')
-    datestamp = t.strftime('%Y%m%d')
-    
-    # 计算body的SHA256
-    payload_hash = hashlib.sha256(body.encode('utf-8')).hexdigest()
-    
-    # 构建规范头部 - 按照官方实现
-    canonical_uri = '/'
-    # 对查询参数进行排序处理，按照官方实现
-    query_params = {}
+# 上传图片预处理：按模型最大分辨率缩放并重新压缩（需要Pillow）
+image_normalizer = ImageNormalizer.from_env()
+
+# 缩略图和视频封面帧：在线程池中生成一次，写入独立的派生资源缓存
+derived_assets = DerivedAssets.from_env()
+
+# 上传过的原图按内容哈希保存，之后的生成请求用image_ref引用，不再重复上传
+image_store = ImageStore.from_env()
+
+# 固定seed的同步生图请求：相同请求体合并为一次上游调用，成功结果按TTL/LRU缓存
+result_cache = ResultCache.from_env()
+
+# 提交过的任务持久化到SQLite：查询使用正确的req_key，已完成的任务直接本地应答
+task_store = TaskStore.from_env()
+
+# 提示词优化：后端调用DeepSeek改写提示词，结果按规范化后的提示词缓存
+prompt_optimizer = PromptOptimizer.from_env()
+
+# 提交任务接口的Idempotency-Key，记录在任务库中，多个worker进程共享
+idempotency = Idempotency.from_env(task_store)
+
+# 每个请求的时间预算（秒）：排队、签名、重试在内的全部上游调用不超过该时间
+REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', '60'))
+ROUTE_DEADLINES = {
+    '/api/volcengine': 30,
+    '/api/video-proxy': 30,  # 代理只限制拿到响应头的时间，之后的流式传输按读取超时
+    '/api/image-proxy': 30,
+    '/api/batch': 120,  # 批量提交中每一项共用这个预算，包括在准入控制中排队的时间
+}
+ROUTE_DEADLINES.update(json.loads(os.getenv('ROUTE_DEADLINES', '{}')))
+
+# 查询类Action幂等，失败可以安全重试
+IDEMPOTENT_ACTIONS = {'JimengVGFMT2VL20GetResult', 'CVSync2AsyncGetResult'}
+
+# 异步任务的提交Action与查询Action -> 任务类型；任务只在提交它的账号下可见
+TASK_SUBMIT_ACTIONS = {
+    'JimengVGFMT2VL20SubmitTask': 'video',
+    'JimengVGFMI2VL20SubmitTask': 'video',
+    'CVSync2AsyncSubmitTask': 'image_edit',
+}
+TASK_RESULT_ACTIONS = {'JimengVGFMT2VL20GetResult': 'video', 'CVSync2AsyncGetResult': 'image_edit'}
+
+# VolcEngine账号池：每个账号一个签名器（按UTC日缓存签名密钥）和一套准入控制（每个Action的令牌桶与有界等待队列），
+# 新请求发往负载最低的账号，配额超限或鉴权失败的账号暂时移出
+credential_pool = CredentialPool.from_env(VOLCENGINE_REGION, VOLCENGINE_SERVICE, VOLCENGINE_HOST)
+
+@app.before_request
+def start_request_metrics():
+    """记录请求开始时间与进行中的请求数"""
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_route = route
+    g.metrics_start = time.perf_counter()
+    metrics.http_in_flight.inc(route)
+    if request.content_length:
+        metrics.http_request_size.observe(route, value=request.content_length)
+
+@app.before_request
+def start_request_deadline():
+    """按路由设置本次请求的截止时间，上游调用据此收紧超时与重试"""
+    g.deadline = time.monotonic() + ROUTE_DEADLINES.get(g.metrics_route, REQUEST_DEADLINE)
+
+@app.after_request
+def record_response_metrics(response):
+    g.metrics_status = response.status_code
+    if response.content_length is not None:
+        metrics.http_response_size.observe(g.metrics_route, value=response.content_length)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    route = g.pop('metrics_route', None)
+    if route is None:
+        return
+    metrics.http_in_flight.dec(route)
+    metrics.http_latency.observe(route, request.method, value=time.perf_counter() - g.metrics_start)
+    metrics.http_requests.inc(route, request.method, str(g.pop('metrics_status', 500)))
+
+def generate_volcengine_signature(account, method, path, query_string, body):
+    """生成VolcEngine API签名 - 复用该账号签名器缓存的签名密钥"""
+    start = time.perf_counter()
+    headers = account.signer.sign(method, path, query_string, body)
+    metrics.sign_latency.observe(value=time.perf_counter() - start)
+    return headers
+
+# 本服务自己调用的Action（默认配额表列出了全部）；/api/volcengine透传的其他Action由客户端任意指定，
+# 在指标标签和准入控制中统一记为other，否则标签和限流器的数量会无限增长
+KNOWN_ACTIONS = frozenset(DEFAULT_LIMITS)
+
+def query_action(query_string):
+    """从查询串中取出Action参数，作为上游指标的标签和准入控制的键；不在KNOWN_ACTIONS中的记为other"""
     for param in query_string.split('&'):
-        if '=' in param:
-            key, value = param.split('=', 1)
-            query_params[key] = value
-    
-    # 重新构建排序后的查询字符串
-    canonical_querystring = ''
-    for key in sorted(query_params):
-        canonical_querystring += key + '=' + query_params[key] + '&'
-    canonical_querystring = canonical_querystring[:-1] if canonical_querystring else ''
-    signed_headers = 'host;x-content-sha256;x-date'
-    content_type = 'application/json'
-    canonical_headers = (
-        'host:' + VOLCENGINE_HOST + '\n' + 
-        'x-content-sha256:' + payload_hash + '\n' + 
-        'x-date:' + current_date + '\n'
-    )
-    
-    # 构建规范请求 - 按照官方实现
-    canonical_request = (
-        method + '\n' + 
-        canonical_uri + '\n' + 
-        canonical_querystring + '\n' + 
-        canonical_headers + '\n' + 
-        signed_headers + '\n' + 
-        payload_hash
-    )
-    
-    # 构建待签名字符串 - 按照官方实现
-    algorithm = 'HMAC-SHA256'
-    credential_scope = datestamp + '/' + VOLCENGINE_REGION + '/' + VOLCENGINE_SERVICE + '/' + 'request'
-    string_to_sign = (
-        algorithm + '\n' + 
-        current_date + '\n' + 
-        credential_scope + '\n' + 
-        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
-    )
-    
-    # 计算签名 - 按照官方实现
-    signing_key = get_signature_key(secret_key, datestamp, VOLCENGINE_REGION, VOLCENGINE_SERVICE)
-    signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
-    
-    # 构建Authorization头部 - 按照官方实现
-    authorization_header = (
-        algorithm + ' ' + 
-        'Credential=' + VOLCENGINE_ACCESS_KEY + '/' + credential_scope + ', ' + 
-        'SignedHeaders=' + signed_headers + ', ' + 
-        'Signature=' + signature
+        if param.startswith('Action='):
+            action = param[len('Action='):]
+            return action if action in KNOWN_ACTIONS else 'other'
+    return 'unknown'
+
+def log_upstream_request(query_string, body):
+    """只记录上游Action和请求体字节数；请求体可能带数MB的base64图片，不格式化进日志"""
+    logger.info('上游请求 %s: 请求体 %d 字节', query_action(query_string), len(body))
+
+def current_deadline():
+    """请求内使用路由的时间预算；后台轮询线程使用默认预算"""
+    if has_request_context() and 'deadline' in g:
+        return g.deadline
+    return time.monotonic() + REQUEST_DEADLINE
+
+def retry_allowed(action):
+    """查询类Action幂等，超时和5xx可以重试；提交任务发出后不再重试（上游可能已经创建了任务，
+    Idempotency-Key只在本服务内去重，不会传给VolcEngine），只重试连接建立阶段的失败"""
+    return action in IDEMPOTENT_ACTIONS
+
+def task_account(action, body):
+    """查询任务的请求返回提交该任务的账号名，其余请求返回None（由凭证池选择账号）
+
+    没有记录的任务（启用多账号之前提交的）使用第一个账号。
+    """
+    kind = TASK_RESULT_ACTIONS.get(action)
+    if kind is None or not credential_pool.multiple:
+        return None
+    try:
+        task_id = json_codec.loads(body).get('task_id')
+    except (ValueError, AttributeError):
+        return None
+    if not task_id:
+        return None
+    return task_store.get_task_account(kind, task_id) or credential_pool.primary.name
+
+def bind_task_account(action, account, status_code, content):
+    """提交异步任务成功后记录提交它的账号，之后的查询发往同一个账号"""
+    kind = TASK_SUBMIT_ACTIONS.get(action)
+    if kind is None or not credential_pool.multiple or status_code != 200:
+        return
+    try:
+        response_data = json_codec.loads(content)
+        # 视频接口的结果在Result下，CV接口直接在data下
+        task_id = (response_data.get('Result') or response_data).get('data', {}).get('task_id')
+    except (ValueError, AttributeError):
+        return
+    if task_id:
+        task_store.set_task_account(kind, task_id, account.name)
+
+def account_post(account, action, query_string, body, retry, deadline):
+    """以指定账号签名并发送，占用该账号的准入名额"""
+    with account.admission.slot(action, deadline):
+        headers = generate_volcengine_signature(account, 'POST', '/', query_string, body)
+        url = f'{VOLCENGINE_ENDPOINT}/?{query_string}'
+        return upstream.post(url, action=action, retry=retry, deadline=deadline, headers=headers, data=body)
+
+def volcengine_post(query_string, body, deadline=None):
+    """签名并通过共享连接池向VolcEngine发送POST请求
+
+    查询任务发往提交任务的账号，其余请求发往负载最低的账号；账号配额超限或鉴权失败时
+    （上游没有受理该请求）换一个账号重发，总共最多发送账号数次。
+    在请求线程之外调用（如批量提交的工作线程）时显式传入时间预算。
+    """
+    action = query_action(query_string)
+    retry = retry_allowed(action)
+    deadline = deadline or current_deadline()
+    pinned = task_account(action, body)
+    account = credential_pool.choose(action, pinned, deadline)
+    attempts = len(credential_pool.accounts)
+    for attempt in range(attempts):
+        response = account_post(account, action, query_string, body, retry, deadline)
+        rejected = credential_pool.record(account, response.status_code, response.content)
+        if rejected is None or pinned is not None or attempt + 1 >= attempts:
+            break
+        response.close()
+        account = credential_pool.choose(action, deadline=deadline)
+    bind_task_account(action, account, response.status_code, response.content)
+    return response
+
+def upstream_unavailable_response(e):
+    """限流（429）、熔断（503）或超出时间预算（504）时快速返回，带Retry-After时提示客户端稍后重试"""
+    headers = {'Retry-After': e.retry_after_header} if e.retry_after is not None else {}
+    return jsonify({'success': False, 'error': str(e)}), e.status_code, headers
+
+class InvalidRequest(ValueError):
+    """请求参数不完整，路由返回400"""
+
+def result_response(body, code):
+    return jsonify(body), code
+
+def idempotent(view):
+    """提交任务的路由：带Idempotency-Key的重复请求返回首次提交的响应，不再向上游提交"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view(*args, **kwargs)
+        try:
+            # 先读取原始请求体（会缓存下来，之后解析JSON或multipart不受影响）
+            digest = body_hash(request.get_data(), request.content_type)
+            claim = idempotency.claim(key, request.path, digest, g.deadline)
+        except IdempotencyKeyReused as e:
+            return jsonify({'success': False, 'error': str(e)}), 422
+        except UpstreamUnavailable as e:
+            return upstream_unavailable_response(e)
+        if claim.response is not None:
+            return Response(
+                claim.response, status=claim.status_code, content_type='application/json',
+                headers={'Idempotent-Replayed': 'true'}
+            )
+        try:
+            response = app.make_response(view(*args, **kwargs))
+        except BaseException:
+            idempotency.abort(claim)
+            raise
+        idempotency.finish(claim, response.status_code, response.get_data(as_text=True))
+        return response
+    return wrapper
+
+def record_volcengine_errors(query_string, response_data):
+    """按VolcEngine错误码或业务码记录上游错误指标"""
+    error = response_data.get('ResponseMetadata', {}).get('Error')
+    if error:
+        metrics.upstream_errors.inc(query_action(query_string), error.get('Code', 'unknown'))
+    elif 'code' in response_data and response_data['code'] != 10000:
+        metrics.upstream_errors.inc(query_action(query_string), str(response_data['code']))
+
+def volcengine_json(query_string, body, **kwargs):
+    """发送VolcEngine请求并解析JSON响应，按错误码记录上游错误指标"""
+    response_data = json_codec.loads(volcengine_post(query_string, body, **kwargs).content)
+    record_volcengine_errors(query_string, response_data)
+    return response_data
+
+# 结果只由请求体决定（客户端指定seed时）的同步生图Action，可以合并与缓存
+DETERMINISTIC_ACTIONS = {'JimengHighAESGeneralV21L', 'CVProcess'}
+
+def request_seed(data):
+    """客户端指定非负整数seed时开启确定性模式；未指定时为-1，每次随机生成"""
+    seed = data.get('seed')
+    if seed is None or seed == '':
+        return -1
+    try:
+        seed = int(seed)
+    except (TypeError, ValueError):
+        raise InvalidRequest('seed必须是整数')
+    if seed < -1:
+        raise InvalidRequest('seed必须是非负整数，-1表示随机')
+    return seed
+
+def result_cache_key(query_string, body):
+    """按Action和上游请求体的SHA-256生成缓存key；流式上传的请求体已算好哈希"""
+    payload_hash = getattr(body, 'payload_hash', None)
+    if payload_hash is None:
+        payload_hash = hashlib.sha256(body if isinstance(body, bytes) else body.encode('utf-8')).hexdigest()
+    return f'{query_action(query_string)}:{payload_hash}'
+
+def successful_response(response_data):
+    """上游成功生成的响应才缓存，错误和业务失败每次都重新请求"""
+    if response_data.get('ResponseMetadata', {}).get('Error'):
+        return False
+    return response_data.get('code', 10000) == 10000 and response_data.get('Result', {}).get('code', 10000) == 10000
+
+def is_deterministic(query_string, data):
+    return query_action(query_string) in DETERMINISTIC_ACTIONS and request_seed(data) >= 0
+
+def generation_json(query_string, body, data, **kwargs):
+    """提交生成请求；确定性请求经过single-flight与结果缓存，其余直接调用volcengine_json"""
+    if not is_deterministic(query_string, data):
+        return volcengine_json(query_string, body, **kwargs)
+    return result_cache.get_or_compute(
+        result_cache_key(query_string, body),
+        lambda: volcengine_json(query_string, body, **kwargs),
+        successful_response,
     )
+
+def request_image(data):
+    """参数中的图片：imageBase64，或/api/images返回的image_ref；都没有时返回None"""
+    if data.get('imageBase64'):
+        return data['imageBase64']
+    ref = data.get('image_ref')
+    if not ref:
+        return None
+    image = image_store.get(ref)
+    if image is None:
+        raise InvalidRequest('image_ref不存在或已过期，请重新上传图片')
+    return image
+
+def read_image_request():
+    """读取图片类请求：JSON中的imageBase64或image_ref，或multipart/form-data上传的image文件
     
-    # 调试信息
-    print("=== 签名调试信息 ===")
-    print(f"Canonical Request:\n{canonical_request}")
-    print(f"String to Sign:\n{string_to_sign}")
-    print(f"Signature: {signature}")
-    print(f"Authorization: {authorization_header}")
-    print("==================")
-    
-    return {
-        'X-Date': current_date,
-        'Authorization': authorization_header,
-        'X-Content-Sha256': payload_hash,
-        'Content-Type': content_type
-    }
+    返回 (参数dict, 图片)；图片是base64字符串、可seek的二进制流或StoredImage，缺失时为None。
+    """
+    if request.mimetype == 'multipart/form-data':
+        data = request.form.to_dict()
+        if 'strength' in data:
+            data['strength'] = float(data['strength'])
+        upload = request.files.get('image')
+        return data, upload.stream if upload else request_image(data)
+    data = request.get_json()
+    return data, request_image(data)
+
+def normalize_image(image, req_key):
+    """按模型预处理图片；image_ref引用的图片复用之前同一模型的预处理结果"""
+    if isinstance(image, StoredImage):
+        return image_store.normalized(image, req_key, image_normalizer.normalize, image_normalizer.enabled)
+    return image_normalizer.normalize(image, req_key)
+
+def upload_image_result(image):
+    """保存上传的原图，返回 (响应体, HTTP状态码)；缺少图片或base64不合法时抛出InvalidRequest"""
+    if image is None:
+        raise InvalidRequest('请提供图片数据')
+    if not image_store.enabled:
+        raise InvalidRequest('图片存储未启用')
+    try:
+        ref, size = image_store.put(image)
+    except ValueError as e:
+        raise InvalidRequest(str(e)) from e
+    return {'success': True, 'data': {'image_ref': ref, 'size': size}}, 200
+
+@app.route('/api/images', methods=['POST'])
+def upload_image():
+    """上传原图，返回image_ref；之后的图生图、图片修改、图生视频请求用它代替imageBase64"""
+    try:
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('image')
+            image = upload.stream if upload else None
+        else:
+            image = request.get_json().get('imageBase64') or None
+        return result_response(*upload_image_result(image))
+
+    except InvalidRequest as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def encode_image_request(request_body, image):
+    """生成上游请求体：base64字符串直接序列化，二进制上传边读边编码"""
+    if isinstance(image, str):
+        request_body['binary_data_base64'] = [image]
+        return json_codec.dumps(request_body)
+    return StreamingJsonBody(request_body, image)
 
 @app.route('/api/volcengine', methods=['POST'])
 def volcengine_proxy():
@@ -124,264 +412,436 @@ def volcengine_proxy():
         # 获取查询参数
         query_string = request.query_string.decode('utf-8')
         
-        # 获取请求体
-        body = request.get_data(as_text=True)
-        
-        # 生成签名
-        headers = generate_volcengine_signature('POST', '/', query_string, body)
+        # 获取请求体（原始字节，签名和转发都不做解码）
+        body = request.get_data()
         
-        # 构建请求URL
-        url = f'https://{VOLCENGINE_HOST}/?{query_string}'
+        # 签名并通过共享连接池发送到VolcEngine
+        response = volcengine_post(query_string, body)
         
-        # 发送请求到VolcEngine
-        response = requests.post(url, headers=headers, data=body)
-        
-        # 返回响应
-        return jsonify(response.json()), response.status_code
+        # 原样返回上游响应，不做解析和重新序列化
+        return Response(
+            response.content, status=response.status_code,
+            content_type=response.headers.get('content-type', 'application/json')
+        )
         
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def text_to_video_request(data):
+    """构造文生视频的上游请求，返回 (查询串, 请求体)"""
+    request_body = {
+        "req_key": "jimeng_vgfm_t2v_l20",
+        "prompt": data.get('prompt', ''),
+        "aspect_ratio": data.get('aspect_ratio', '16:9')
+    }
+    
+    body = json_codec.dumps(request_body)
+    query_string = 'Action=JimengVGFMT2VL20SubmitTask&Version=2024-06-06'
+    log_upstream_request(query_string, body)
+    return query_string, body
+
+def video_submit_result(response_data, data, label, req_key):
+    """处理视频任务提交的响应，登记到任务表和后台轮询，返回 (响应体, HTTP状态码)"""
+    if response_data.get('ResponseMetadata', {}).get('Error'):
+        error_msg = response_data['ResponseMetadata']['Error']['Message']
+        print(f"{label}API错误: {error_msg}")
+        return {'success': False, 'error': error_msg}, 400
+    
+    # 从正确的路径获取task_id
+    result = response_data.get('Result', {})
+    task_id = result.get('data', {}).get('task_id', '')
+    logger.info('%s任务已提交: task_id=%s', label, task_id)
+    if task_id:
+        task_store.add('video', task_id, req_key, data.get('prompt', ''))
+        task_poller.watch('video', task_id)
+    
+    return {
+        'success': True,
+        'data': {
+            'task_id': task_id,
+            'status': 'pending'
+        }
+    }, 200
+
+def text_to_video_result(response_data, data):
+    return video_submit_result(response_data, data, '文生视频', 'jimeng_vgfm_t2v_l20')
+
 @app.route('/api/text-to-video', methods=['POST'])
+@idempotent
 def text_to_video():
     """文本生成视频"""
     try:
         data = request.get_json()
-        print(f"=== 文本生成视频请求 ===")
-        print(f"请求数据: {data}")
+        query_string, body = text_to_video_request(data)
         
-        request_body = {
-            "req_key": "jimeng_vgfm_t2v_l20",
-            "prompt": data.get('prompt', ''),
-            "aspect_ratio": data.get('aspect_ratio', '16:9')
-        }
-        
-        body = json.dumps(request_body)
-        query_string = 'Action=JimengVGFMT2VL20SubmitTask&Version=2024-06-06'
-        print(f"请求体: {body}")
-        print(f"查询字符串: {query_string}")
-        
-        # 生成签名
-        headers = generate_volcengine_signature('POST', '/', query_string, body)
-        
-        # 构建请求URL
-        url = f'https://{VOLCENGINE_HOST}/?{query_string}'
-        
-        # 发送请求到VolcEngine
-        response = requests.post(url, headers=headers, data=body)
-        response_data = response.json()
-        
-        # 处理响应
-        if response_data.get('ResponseMetadata', {}).get('Error'):
-            error_msg = response_data['ResponseMetadata']['Error']['Message']
-            return jsonify({'success': False, 'error': error_msg}), 400
-        
-        # 从正确的路径获取task_id
-        result = response_data.get('Result', {})
-        task_id = result.get('data', {}).get('task_id', '')
-        print(f"文生视频生成的task_id: {task_id}")
+        # 签名并通过共享连接池发送到VolcEngine
+        response_data = volcengine_json(query_string, body)
         
-        return jsonify({
-            'success': True,
-            'data': {
-                'task_id': task_id,
-                'status': 'pending'
-            }
-        })
+        return result_response(*text_to_video_result(response_data, data))
         
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def image_to_video_request(data, image):
+    """构造图生视频的上游请求，返回 (查询串, 请求体)"""
+    if image is None:
+        image = ''
+    
+    image = normalize_image(image, 'jimeng_vgfm_i2v_l20')
+    request_body = {
+        "req_key": "jimeng_vgfm_i2v_l20",
+        "prompt": data.get('prompt', ''),
+        "binary_data_base64": [IMAGE_PLACEHOLDER],
+        "aspect_ratio": data.get('aspect_ratio', '16:9')
+    }
+    
+    body = encode_image_request(request_body, image)
+    query_string = 'Action=JimengVGFMI2VL20SubmitTask&Version=2024-06-06'
+    log_upstream_request(query_string, body)
+    return query_string, body
+
+def image_to_video_result(response_data, data):
+    return video_submit_result(response_data, data, '图生视频', 'jimeng_vgfm_i2v_l20')
+
 @app.route('/api/image-to-video', methods=['POST'])
+@idempotent
 def image_to_video():
     """图像生成视频"""
     try:
-        data = request.get_json()
-        print(f"=== 图像生成视频请求 ===")
-        print(f"请求数据: {data}")
-        
-        image_base64 = data.get('imageBase64', '')
-        print(f"图片base64长度: {len(image_base64)}")
-        print(f"图片base64前100字符: {image_base64[:100] if image_base64 else 'None'}")
-        
-        request_body = {
-            "req_key": "jimeng_vgfm_i2v_l20",
-            "prompt": data.get('prompt', ''),
-            "binary_data_base64": [image_base64],
-            "aspect_ratio": data.get('aspect_ratio', '16:9')
-        }
-        
-        body = json.dumps(request_body)
-        query_string = 'Action=JimengVGFMI2VL20SubmitTask&Version=2024-06-06'
-        print(f"请求体长度: {len(body)}")
-        print(f"查询字符串: {query_string}")
-        
-        # 生成签名
-        headers = generate_volcengine_signature('POST', '/', query_string, body)
+        data, image = read_image_request()
+        query_string, body = image_to_video_request(data, image)
         
-        # 构建请求URL
-        url = f'https://{VOLCENGINE_HOST}/?{query_string}'
+        # 签名并通过共享连接池发送到VolcEngine
+        response_data = volcengine_json(query_string, body)
         
-        # 发送请求到VolcEngine
-        print(f"图生视频发送请求到: {url}")
-        response = requests.post(url, headers=headers, data=body)
-        response_data = response.json()
-        print(f"图生视频API响应: {response_data}")
+        return result_response(*image_to_video_result(response_data, data))
         
-        # 处理响应
-        if response_data.get('ResponseMetadata', {}).get('Error'):
-            error_msg = response_data['ResponseMetadata']['Error']['Message']
-            print(f"图生视频API错误: {error_msg}")
-            return jsonify({'success': False, 'error': error_msg}), 400
-        
-        # 从正确的路径获取task_id
-        result = response_data.get('Result', {})
-        task_id = result.get('data', {}).get('task_id', '')
-        print(f"图生视频生成的task_id: {task_id}")
-        print(f"完整Result数据: {result}")
-        
-        return jsonify({
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        print(f"图像生成视频异常: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def task_req_key(kind, task_id, default):
+    """任务提交时使用的req_key，查询时必须一致；任务表中没有记录时使用default"""
+    task = task_store.get(kind, task_id)
+    return task['req_key'] if task is not None else default
+
+def fetch_video_status(task_id):
+    """向VolcEngine查询视频任务状态，返回(响应体, HTTP状态码, 任务状态)"""
+    request_body = {
+        "req_key": task_req_key('video', task_id, 'jimeng_vgfm_t2v_l20'),
+        "task_id": task_id
+    }
+    
+    body = json_codec.dumps(request_body)
+    query_string = 'Action=JimengVGFMT2VL20GetResult&Version=2024-06-06'
+    
+    # 签名并通过共享连接池发送到VolcEngine
+    response_data = volcengine_json(query_string, body)
+    
+    # 处理响应
+    if response_data.get('ResponseMetadata', {}).get('Error'):
+        error_msg = response_data['ResponseMetadata']['Error']['Message']
+        print(f"状态查询错误: {error_msg}")
+        return {'success': False, 'error': error_msg}, 400, None
+    
+    # 从正确的路径获取状态信息
+    result = response_data.get('Result', {})
+    result_data = result.get('data', {})
+    status = result_data.get('status', 'processing')
+    video_url = result_data.get('video_url')
+    print(f"任务 {task_id} 状态: {status}, 视频URL: {video_url}")
+    
+    result = video_status_response(task_id, status, video_url)
+    if result[2] is not None:
+        task_store.update_status('video', task_id, result[2], [video_url] if video_url else [])
+    return result
+
+def video_status_response(task_id, status, video_url):
+    """视频任务状态的响应，返回(响应体, HTTP状态码, 任务状态)；轮询结果与任务表记录共用"""
+    if status == 'done' and video_url:
+        # 结果在后台下载到本地，返回稳定的本地URL；上游签名URL过期后仍可播放
+        local_url = materializer.materialize(video_url, '.mp4')
+        return {
             'success': True,
             'data': {
                 'task_id': task_id,
-                'status': 'pending'
+                'status': 'done',
+                'video_url': local_url,
+                'result': {
+                    'type': 'video',
+                    'url': local_url,
+                    'source_url': video_url
+                }
             }
-        })
-        
-    except Exception as e:
-        print(f"图像生成视频异常: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        }, 200, 'done'
+    else:
+        return {
+            'success': True,
+            'data': {
+                'task_id': task_id,
+                'status': status
+            }
+        }, 200, None if status == 'done' else status
 
-@app.route('/api/check-status', methods=['POST'])
-def check_status():
-    """检查任务状态"""
-    try:
-        data = request.get_json()
-        task_id = data.get('task_id')
-        print(f"=== 检查任务状态 ===")
-        print(f"请求数据: {data}")
-        print(f"task_id: {task_id}")
-        
-        if not task_id:
-            print("错误: task_id为空")
-            return jsonify({'success': False, 'error': 'task_id is required'}), 400
-        
-        request_body = {
-            "req_key": "jimeng_vgfm_t2v_l20",
-            "task_id": task_id
+def text_to_image_request(data):
+    """构造文生图的上游请求，返回 (查询串, 请求体)"""
+    prompt = data.get('prompt', '')
+    
+    request_body = {
+        "req_key": "jimeng_high_aes_general_v21_L",
+        "prompt": prompt,
+        "width": data.get('width', 512),
+        "height": data.get('height', 512),
+        "seed": request_seed(data),
+        "return_url": True,
+        "use_pre_llm": len(prompt) <= 30,
+    }
+    
+    body = json_codec.dumps(request_body)
+    query_string = 'Action=JimengHighAESGeneralV21L&Version=2024-06-06'
+    return query_string, body
+
+def local_task_id(prefix):
+    """同步生成的结果没有上游task_id，本地生成；批量提交时同一毫秒内可能完成多项，附加随机后缀"""
+    return f'{prefix}_{int(datetime.now().timestamp() * 1000)}_{uuid.uuid4().hex[:6]}'
+
+def text_to_image_result(response_data, data):
+    """处理文生图响应并登记到任务表，返回 (响应体, HTTP状态码)"""
+    if response_data.get('ResponseMetadata', {}).get('Error'):
+        error_msg = response_data['ResponseMetadata']['Error']['Message']
+        return {'success': False, 'error': error_msg}, 400
+    
+    result_data = response_data.get('Result', {}).get('data', {})
+    image_url = result_data.get('image_urls', [''])[0]
+    task_id = local_task_id('img')
+    task_store.add('image', task_id, 'jimeng_high_aes_general_v21_L', data.get('prompt', ''), 'done', [image_url])
+    
+    return {
+        'success': True,
+        'data': {
+            'task_id': task_id,
+            'status': 'done',
+            'result': {
+                'type': 'image',
+                'url': materializer.materialize(image_url, '.png'),
+                'source_url': image_url
+            }
         }
-        print(f"查询请求体: {request_body}")
-        
-        body = json.dumps(request_body)
-        query_string = 'Action=JimengVGFMT2VL20GetResult&Version=2024-06-06'
-        
-        # 生成签名
-        headers = generate_volcengine_signature('POST', '/', query_string, body)
-        
-        # 构建请求URL
-        url = f'https://{VOLCENGINE_HOST}/?{query_string}'
-        
-        # 发送请求到VolcEngine
-        print(f"查询状态URL: {url}")
-        response = requests.post(url, headers=headers, data=body)
-        response_data = response.json()
-        print(f"状态查询响应: {response_data}")
-        
-        # 处理响应
-        if response_data.get('ResponseMetadata', {}).get('Error'):
-            error_msg = response_data['ResponseMetadata']['Error']['Message']
-            print(f"状态查询错误: {error_msg}")
-            return jsonify({'success': False, 'error': error_msg}), 400
-        
-        # 从正确的路径获取状态信息
-        result = response_data.get('Result', {})
-        result_data = result.get('data', {})
-        status = result_data.get('status', 'processing')
-        video_url = result_data.get('video_url')
-        print(f"任务状态: {status}, 视频URL: {video_url}")
-        print(f"完整状态数据: {result_data}")
-        
-        if status == 'done' and video_url:
-            return jsonify({
-                'success': True,
-                'data': {
-                    'task_id': task_id,
-                    'status': 'done',
-                    'video_url': video_url,
-                    'result': {
-                        'type': 'video',
-                        'url': video_url
-                    }
-                }
-            })
-        else:
-            return jsonify({
-                'success': True,
-                'data': {
-                    'task_id': task_id,
-                    'status': status
-                }
-            })
-        
-    except Exception as e:
-        print(f"检查状态异常: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+    }, 200
 
 @app.route('/api/text-to-image', methods=['POST'])
 def text_to_image():
     """文生图"""
     try:
         data = request.get_json()
-        prompt = data.get('prompt', '')
-        
-        request_body = {
-            "req_key": "jimeng_high_aes_general_v21_L",
-            "prompt": prompt,
-            "width": data.get('width', 512),
-            "height": data.get('height', 512),
-            "seed": -1,
-            "return_url": True,
-            "use_pre_llm": len(prompt) <= 30,
-        }
-        
-        body = json.dumps(request_body)
-        query_string = 'Action=JimengHighAESGeneralV21L&Version=2024-06-06'
-        
-        # 生成签名
-        headers = generate_volcengine_signature('POST', '/', query_string, body)
-        
-        # 构建请求URL
-        url = f'https://{VOLCENGINE_HOST}/?{query_string}'
-        
-        # 发送请求到VolcEngine
-        response = requests.post(url, headers=headers, data=body)
-        response_data = response.json()
-
-        print(f"图片生成API响应: {response_data}")
+        query_string, body = text_to_image_request(data)
         
-        # 处理响应
-        if response_data.get('ResponseMetadata', {}).get('Error'):
-            error_msg = response_data['ResponseMetadata']['Error']['Message']
-            return jsonify({'success': False, 'error': error_msg}), 400
+        # 签名并通过共享连接池发送到VolcEngine（固定seed时合并相同请求并复用结果）
+        response_data = generation_json(query_string, body, data)
         
-        result_data = response_data.get('Result', {}).get('data', {})
-        image_url = result_data.get('image_urls', [''])[0]
-        
-        return jsonify({
-            'success': True,
-            'data': {
-                'task_id': f'img_{int(datetime.now().timestamp() * 1000)}',
-                'status': 'done',
-                'result': {
-                    'type': 'image',
-                    'url': image_url
-                }
-            }
-        })
+        return result_response(*text_to_image_result(response_data, data))
         
+    except InvalidRequest as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+def validator_headers(response_headers, etag, last_modified=None):
+    """加上强校验器和长期缓存头：同一个源URL（或派生参数）对应的内容不会改变"""
+    headers = dict(response_headers, ETag=etag, **{'Cache-Control': IMMUTABLE_CACHE_CONTROL})
+    if last_modified:
+        headers['Last-Modified'] = last_modified
+    return headers
+
+def not_modified(request_headers, headers):
+    """条件请求成立时返回304的响应头，否则返回None；headers为validator_headers的结果"""
+    if is_not_modified(
+        request_headers.get('If-None-Match'), request_headers.get('If-Modified-Since'),
+        headers['ETag'], headers.get('Last-Modified')
+    ):
+        return not_modified_headers(headers)
+    return None
+
+def usable_range(request_headers, headers):
+    """请求的Range头；If-Range与当前校验器不符时忽略Range，返回完整内容"""
+    range_header = request_headers.get('Range')
+    if range_header and not range_if_matches(
+        request_headers.get('If-Range'), headers['ETag'], headers.get('Last-Modified')
+    ):
+        return None
+    return range_header
+
+def local_file_response(f, size, content_type, request_headers, response_headers):
+    """本地文件的响应，返回 (状态码, 响应头, 响应体迭代器, 关闭回调)；支持条件请求和Range请求"""
+    unchanged = not_modified(request_headers, response_headers)
+    if unchanged is not None:
+        f.close()
+        return 304, unchanged, (), lambda: None
+    try:
+        ranges = parse_byte_ranges(usable_range(request_headers, response_headers), size)
+    except RangeNotSatisfiable as e:
+        f.close()
+        return 416, {'Content-Range': f'bytes */{e.length}'}, (), lambda: None
+    status, range_headers, body = file_range_response(f, size, content_type, ranges)
+    headers = dict(response_headers, **range_headers, **{'X-Cache': 'HIT'})
+    return status, headers, body, f.close
+
+def cached_asset_response(url, request_headers, default_content_type, response_headers):
+    """本地缓存命中时返回 (状态码, 响应头, 响应体迭代器, 关闭回调)，未命中返回None"""
+    cached = asset_cache.get(url)
+    if cached is None:
+        return None
+    content_type = cached.content_type or default_content_type
+    if cached.last_modified:
+        response_headers = dict(response_headers, **{'Last-Modified': cached.last_modified})
+    return local_file_response(cached.file, cached.size, content_type, request_headers, response_headers)
+
+def asset_etag(url):
+    """代理资源的ETag：按规范化的源URL计算，而不是上游的ETag或内容哈希
+
+    这样在读缓存、访问上游之前就能确定ETag，带If-None-Match的再次请求可以直接304。
+    前提是源URL不可变：每次生成的结果都有新的URL，同一URL上的内容不会改变。
+    内容可能变化的URL不能经过proxy_asset，否则浏览器会一直拿到旧内容。
+    """
+    return strong_etag('asset', normalize_url(url))
+
+def file_response(result):
+    """把 (状态码, 响应头, 响应体迭代器, 关闭回调) 包装为Flask响应"""
+    status, headers, body, close = result
+    resp = Response(body, status=status, headers=headers)
+    resp.call_on_close(close)
+    return resp
+
+def upstream_range(range_header):
+    """缓存未命中时转发给上游的Range。播放器的首个请求bytes=0-要的就是完整内容，改为不带Range请求，
+    上游返回200时可以边转发边写入缓存；其他区间原样转发，只回传请求的部分，不写缓存"""
+    if range_header and asset_cache.enabled and range_header.replace(' ', '').lower() == 'bytes=0-':
+        return None
+    return range_header
+
+def miss_range_headers(range_header, forwarded_range, status, upstream_headers):
+    """缓存未命中时回复客户端的 (状态码, 长度与区间响应头)：上游返回206时沿用其Content-Range；
+    bytes=0-改为完整请求且上游返回200时，按完整区间回复206"""
+    content_length = upstream_headers.get('content-length')
+    headers = {'Content-Length': content_length} if content_length else {}
+    if status == 206 and upstream_headers.get('content-range'):
+        headers['Content-Range'] = upstream_headers['content-range']
+    elif status == 200 and range_header and forwarded_range is None and content_length and int(content_length) > 0:
+        headers['Content-Range'] = f'bytes 0-{int(content_length) - 1}/{content_length}'
+        status = 206
+    return status, headers
+
+def proxy_asset(url, headers, default_content_type, response_headers, label, etag=None):
+    """代理CDN资源：命中本地缓存直接读文件，未命中时边转发边写入缓存；支持条件请求和Range请求"""
+    response_headers = validator_headers(response_headers, etag or asset_etag(url))
+    # 浏览器带着之前拿到的ETag再次请求时，不读缓存也不访问上游（源URL不可变，见asset_etag）
+    unchanged = not_modified(request.headers, response_headers)
+    if unchanged is not None:
+        return Response(status=304, headers=unchanged)
+    
+    hit = cached_asset_response(url, request.headers, default_content_type, response_headers)
+    if hit is not None:
+        return file_response(hit)
+    
+    range_header = usable_range(request.headers, response_headers)
+    forwarded_range = upstream_range(range_header)
+    if forwarded_range:
+        # 本地没有副本时把Range转发给上游，只回传请求的区间
+        headers = dict(headers, Range=forwarded_range)
+    response = upstream.get(url, retry=True, deadline=current_deadline(), headers=headers, stream=True)
+    if response.status_code == 416:
+        response.close()
+        return Response(status=416, headers={'Content-Range': response.headers.get('content-range', '')})
+    if response.status_code not in (200, 206):
+        response.close()
+        return jsonify({'error': f'{label} request failed: {response.status_code}'}), response.status_code
+    
+    last_modified = response.headers.get('last-modified')
+    if last_modified:
+        response_headers['Last-Modified'] = last_modified
+        unchanged = not_modified(request.headers, response_headers)
+        if unchanged is not None:
+            response.close()
+            return Response(status=304, headers=unchanged)
+    
+    content_type = response.headers.get('content-type', default_content_type)
+    content_length = response.headers.get('content-length')
+    # 只缓存完整内容；上游忽略Range返回200时同样可以缓存
+    writer = None
+    if response.status_code == 200:
+        writer = asset_cache.writer(
+            url, content_type, int(content_length) if content_length else None, last_modified
+        )
+    
+    def generate():
+        completed = False
+        try:
+            for chunk in response.iter_content(chunk_size=65536):
+                if writer is not None:
+                    writer.write(chunk)
+                yield chunk
+            completed = True
+        finally:
+            response.close()
+            if writer is not None:
+                # 客户端中途断开时丢弃不完整的缓存文件
+                writer.commit() if completed else writer.abort()
+    
+    status, range_headers = miss_range_headers(range_header, forwarded_range, response.status_code, response.headers)
+    response_headers = dict(response_headers, **range_headers, **{'X-Cache': 'MISS'})
+    return Response(
+        generate(),
+        status=status,
+        content_type=content_type,
+        headers=response_headers
+    )
+
+# 代理请求CDN时使用的请求头
+VIDEO_PROXY_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Referer': 'https://jimeng.jd.com/',  # 模拟从官方网站访问
+    'Accept': 'video/webm,video/ogg,video/*;q=0.9,application/ogg;q=0.7,audio/*;q=0.6,*/*;q=0.5',
+}
+IMAGE_PROXY_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Referer': 'https://jimeng.jd.com/',  # 模拟从官方网站访问
+    'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+}
+
+# 后台下载结果文件时使用的请求头，视频和图片共用
+RESULT_FETCH_HEADERS = dict(VIDEO_PROXY_HEADERS, Accept='*/*')
+
+def fetch_result_file(url):
+    """后台下载结果文件，返回流式响应"""
+    return upstream.get(
+        url, retry=True, deadline=time.monotonic() + REQUEST_DEADLINE, headers=RESULT_FETCH_HEADERS, stream=True
+    )
+
+# 任务完成后把结果文件下载到本地（不参与LRU淘汰），状态接口返回稳定的本地URL
+materializer = ResultMaterializer.from_env(task_store, fetch_result_file)
+
+def video_response_headers(filename, download):
+    response_headers = {
+        'Accept-Ranges': 'bytes'
+    }
+    # 如果是下载模式，添加attachment头部
+    if download:
+        response_headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response_headers
+
+def image_response_headers(filename):
+    return {
+        'Content-Disposition': f'attachment; filename="{filename}"'
+    }
+
 @app.route('/api/video-proxy', methods=['GET'])
 def video_proxy():
     """视频代理接口"""
@@ -398,300 +858,714 @@ def video_proxy():
         if not video_url:
             return jsonify({'error': 'Missing video URL'}), 400
         
-        # 设置适当的请求头
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://jimeng.jd.com/',  # 模拟从官方网站访问
-            'Accept': 'video/webm,video/ogg,video/*;q=0.9,application/ogg;q=0.7,audio/*;q=0.6,*/*;q=0.5',
-        }
-        
-        # 请求视频
-        response = requests.get(video_url, headers=headers, stream=True)
-        
-        if response.status_code == 200:
-            # 返回视频流
-            def generate():
-                for chunk in response.iter_content(chunk_size=8192):
-                    yield chunk
-            
-            response_headers = {
-                'Accept-Ranges': 'bytes',
-                'Content-Length': response.headers.get('content-length'),
-                'Cache-Control': 'no-cache'
-            }
-            
-            # 如果是下载模式，添加attachment头部
-            if download:
-                response_headers['Content-Disposition'] = f'attachment; filename="{filename}"'
-            
-            return Response(
-                generate(),
-                content_type=response.headers.get('content-type', 'video/mp4'),
-                headers=response_headers
-            )
-        else:
-            return jsonify({'error': f'Video request failed: {response.status_code}'}), response.status_code
+        return proxy_asset(
+            video_url, VIDEO_PROXY_HEADERS, 'video/mp4', video_response_headers(filename, download), 'Video'
+        )
             
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def image_to_image_request(data, image):
+    """构造图生图的上游请求，返回 (查询串, 请求体)；缺少图片时抛出InvalidRequest"""
+    prompt = data.get('prompt', '')
+    controlnet_type = data.get('controlnet_type', 'depth')  # canny、depth、pose
+    strength = data.get('strength', 0.6)
+    
+    if image is None:
+        raise InvalidRequest('请提供图片数据')
+        
+    image = normalize_image(image, 'high_aes_scheduler_svr_controlnet_v2.0')
+        
+    # 使用VolcEngine的图生图API（CVProcess接口）
+    request_body = {
+        "req_key": "high_aes_scheduler_svr_controlnet_v2.0",
+        "prompt": prompt if prompt else "保持原图风格，生成新的图片",
+        "binary_data_base64": [IMAGE_PLACEHOLDER],
+        "controlnet_args": [
+            {
+                "type": controlnet_type,  # canny（轮廓边缘）、depth（景深）、pose（人物姿态）
+                "binary_data_index": 0,
+                "strength": strength  # ControlNet强度 (0.0, 1.0]
+            }
+        ],
+        "seed": request_seed(data),
+        "scale": 3.0,  # 影响文本描述的程度 [1, 30]
+        "ddim_steps": 16,  # 生成图像的步数 [1, 50]
+        "use_rephraser": len(prompt) < 50 if prompt else True,  # 短提示词开启扩写
+        "return_url": True,
+        "logo_info": {
+            "add_logo": False
+        }
+    }
+    
+    body = encode_image_request(request_body, image)
+    query_string = 'Action=CVProcess&Version=2022-08-31'
+    
+    log_upstream_request(query_string, body)
+    return query_string, body
+
+def image_to_image_result(response_data, data):
+    """处理图生图响应并登记到任务表，返回 (响应体, HTTP状态码)"""
+    if response_data.get('ResponseMetadata', {}).get('Error'):
+        error_msg = response_data['ResponseMetadata']['Error']['Message']
+        return {'success': False, 'error': error_msg}, 400
+    
+    # 检查业务错误码
+    if response_data.get('code') != 10000:
+        error_msg = response_data.get('message', '图生图处理失败')
+        return {'success': False, 'error': error_msg}, 400
+        
+    result_data = response_data.get('data', {})
+    image_urls = result_data.get('image_urls', [])
+    image_url = image_urls[0] if image_urls else ''
+    description = result_data.get('rephraser_result', '')  # 扩写后的提示词作为描述
+    
+    if not image_url:
+        return {'success': False, 'error': '未获取到生成的图片'}, 400
+    
+    task_id = local_task_id('img2img')
+    task_store.add(
+        'image', task_id, 'high_aes_scheduler_svr_controlnet_v2.0', data.get('prompt', ''), 'done', [image_url]
+    )
+    
+    return {
+        'success': True,
+        'data': {
+            'task_id': task_id,
+            'status': 'done',
+            'result': {
+                'type': 'image',
+                'url': materializer.materialize(image_url, '.png'),
+                'source_url': image_url,
+                'description': description
+            }
+        }
+    }, 200
+
 @app.route('/api/image-to-image', methods=['POST'])
 def image_to_image():
     """图生图 - 基于字节跳动高美感2.0模型的可控图生图"""
     try:
-        data = request.get_json()
+        data, image = read_image_request()
+        query_string, body = image_to_image_request(data, image)
         
-        image_base64 = data.get('imageBase64', '')
-        prompt = data.get('prompt', '')
-        controlnet_type = data.get('controlnet_type', 'depth')  # canny、depth、pose
-        strength = data.get('strength', 0.6)
+        # 签名并通过共享连接池发送到VolcEngine（固定seed时合并相同请求并复用结果）
+        response_data = generation_json(query_string, body, data)
         
-        if not image_base64:
-            return jsonify({'success': False, 'error': '请提供图片数据'}), 400
-            
-        # 使用VolcEngine的图生图API（CVProcess接口）
-        request_body = {
-            "req_key": "high_aes_scheduler_svr_controlnet_v2.0",
-            "prompt": prompt if prompt else "保持原图风格，生成新的图片",
-            "binary_data_base64": [image_base64],
-            "controlnet_args": [
-                {
-                    "type": controlnet_type,  # canny（轮廓边缘）、depth（景深）、pose（人物姿态）
-                    "binary_data_index": 0,
-                    "strength": strength  # ControlNet强度 (0.0, 1.0]
-                }
-            ],
-            "seed": -1,
-            "scale": 3.0,  # 影响文本描述的程度 [1, 30]
-            "ddim_steps": 16,  # 生成图像的步数 [1, 50]
-            "use_rephraser": len(prompt) < 50 if prompt else True,  # 短提示词开启扩写
-            "return_url": True,
-            "logo_info": {
-                "add_logo": False
-            }
-        }
-        
-        body = json.dumps(request_body)
-        query_string = 'Action=CVProcess&Version=2022-08-31'
+        return result_response(*image_to_image_result(response_data, data))
         
-        print(f"图生图请求体: {body}")
-        print(f"查询字符串: {query_string}")
-        
-        # 生成签名
-        headers = generate_volcengine_signature('POST', '/', query_string, body)
+    except InvalidRequest as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        print(f"图生图异常: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def image_edit_request(data, image):
+    """构造图片修改的上游请求，返回 (查询串, 请求体)；缺少图片或描述时抛出InvalidRequest"""
+    prompt = data.get('prompt', '')
+    strength = data.get('strength', 0.5)
+    
+    if image is None:
+        raise InvalidRequest('请提供图片数据')
         
-        # 构建请求URL
-        url = f'https://{VOLCENGINE_HOST}/?{query_string}'
+    if not prompt:
+        raise InvalidRequest('请提供编辑描述')
         
-        # 发送请求到VolcEngine
-        response = requests.post(url, headers=headers, data=body)
-        response_data = response.json()
+    image = normalize_image(image, 'seededit_v3.0')
         
-        print(f"图生图API响应: {response_data}")
+    # 使用VolcEngine的新版图片编辑API (seededit_v3.0)
+    request_body = {
+        "req_key": "seededit_v3.0",
+        "binary_data_base64": [IMAGE_PLACEHOLDER],
+        "prompt": prompt,
+        "seed": -1,
+        "scale": strength  # 使用用户设置的强度
+    }
+    
+    body = encode_image_request(request_body, image)
+    query_string = 'Action=CVSync2AsyncSubmitTask&Version=2022-08-31'
+    
+    log_upstream_request(query_string, body)
+    return query_string, body
+
+def image_edit_result(response_data, data):
+    """处理图片修改任务提交的响应，登记到任务表和后台轮询，返回 (响应体, HTTP状态码)"""
+    if response_data.get('ResponseMetadata', {}).get('Error'):
+        error_msg = response_data['ResponseMetadata']['Error']['Message']
+        return {'success': False, 'error': error_msg}, 400
+    
+    # 检查业务错误码
+    if response_data.get('code') != 10000:
+        error_msg = response_data.get('message', '图片修改任务提交失败')
+        return {'success': False, 'error': error_msg}, 400
+        
+    # 获取任务ID
+    task_id = response_data.get('data', {}).get('task_id', '')
+    if not task_id:
+        return {'success': False, 'error': '未获取到任务ID'}, 400
+    
+    logger.info('图片修改任务已提交: task_id=%s', task_id)
+    task_store.add('image_edit', task_id, 'seededit_v3.0', data.get('prompt', ''))
+    task_poller.watch('image_edit', task_id)
+    
+    return {
+        'success': True,
+        'data': {
+            'task_id': task_id,
+            'status': 'pending'
+        }
+    }, 200
+
+@app.route('/api/image-edit', methods=['POST'])
+@idempotent
+def image_edit():
+    """图片修改 - 基于seededit_v3.0的异步图片编辑"""
+    try:
+        data, image = read_image_request()
+        query_string, body = image_edit_request(data, image)
         
-        # 处理响应
-        if response_data.get('ResponseMetadata', {}).get('Error'):
-            error_msg = response_data['ResponseMetadata']['Error']['Message']
-            return jsonify({'success': False, 'error': error_msg}), 400
+        # 签名并通过共享连接池发送到VolcEngine
+        response_data = volcengine_json(query_string, body)
         
-        # 检查业务错误码
-        if response_data.get('code') != 10000:
-            error_msg = response_data.get('message', '图生图处理失败')
-            return jsonify({'success': False, 'error': error_msg}), 400
-            
-        result_data = response_data.get('data', {})
-        image_urls = result_data.get('image_urls', [])
-        image_url = image_urls[0] if image_urls else ''
-        description = result_data.get('rephraser_result', '')  # 扩写后的提示词作为描述
+        return result_response(*image_edit_result(response_data, data))
         
-        if not image_url:
-            return jsonify({'success': False, 'error': '未获取到生成的图片'}), 400
+    except InvalidRequest as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        print(f"图片修改异常: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# 批量提交支持的任务类型：type -> (请求构造函数, 响应处理函数, 是否带图片)
+BATCH_JOB_TYPES = {
+    'text-to-video': (text_to_video_request, text_to_video_result, False),
+    'image-to-video': (image_to_video_request, image_to_video_result, True),
+    'text-to-image': (text_to_image_request, text_to_image_result, False),
+    'image-to-image': (image_to_image_request, image_to_image_result, True),
+    'image-edit': (image_edit_request, image_edit_result, True),
+}
+BATCH_MAX_JOBS = int(os.getenv('BATCH_MAX_JOBS', '100'))
+# 单个批量请求同时在途的上游提交数；各Action的QPS仍受准入控制约束
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '8'))
+
+class InvalidJobs(InvalidRequest):
+    """批量请求或流水线中有不合法的任务，整体不执行；errors为 [{'index': 序号, 'error': 原因}]"""
+
+    def __init__(self, errors):
+        super().__init__(f'{len(errors)}个任务参数不合法')
+        self.errors = errors
+
+class BatchJob:
+    """批量请求中的一项，参数格式与对应的单个提交接口相同（图片使用imageBase64或image_ref）"""
+
+    __slots__ = ('index', 'type', 'data', 'query_string', 'body')
+
+    def __init__(self, index, job_type, data):
+        self.index = index
+        self.type = job_type
+        self.data = data
+        self.query_string = None
+        self.body = None
+
+    def build(self):
+        """构造上游请求（含图片预处理）；参数不合法时返回错误dict，否则返回None"""
+        build, _, reads_image = BATCH_JOB_TYPES[self.type]
+        try:
+            if reads_image:
+                self.query_string, self.body = build(self.data, request_image(self.data))
+            else:
+                self.query_string, self.body = build(self.data)
+        except Exception as e:
+            return {'index': self.index, 'error': str(e)}
+        return None
+
+    def handle_result(self, response_data):
+        return self.result(*BATCH_JOB_TYPES[self.type][1](response_data, self.data))
+
+    def result(self, body, code):
+        return dict(body, index=self.index, type=self.type, status_code=code)
+
+    def error(self, e):
+        if isinstance(e, UpstreamUnavailable):
+            return self.result({'success': False, 'error': str(e), 'retry_after': e.retry_after}, e.status_code)
+        return self.result({'success': False, 'error': str(e)}, 500)
+
+def parse_batch(payload):
+    """校验批量请求的结构，返回BatchJob列表；不合法时抛出InvalidRequest"""
+    jobs = payload.get('jobs') if isinstance(payload, dict) else None
+    if not isinstance(jobs, list) or not jobs:
+        raise InvalidRequest('请提供jobs数组')
+    if len(jobs) > BATCH_MAX_JOBS:
+        raise InvalidRequest(f'单次最多提交{BATCH_MAX_JOBS}个任务')
+    errors = []
+    for index, job in enumerate(jobs):
+        if not isinstance(job, dict):
+            errors.append({'index': index, 'error': '任务必须是JSON对象'})
+        elif job.get('type') not in BATCH_JOB_TYPES:
+            errors.append({'index': index, 'error': f"未知的任务类型: {job.get('type')}"})
+    if errors:
+        raise InvalidJobs(errors)
+    return [BatchJob(index, job['type'], job) for index, job in enumerate(jobs)]
+
+def batch_summary(results):
+    succeeded = sum(1 for item in results if item.get('success'))
+    return {'total': len(results), 'succeeded': succeeded, 'failed': len(results) - succeeded}
+
+def batch_response_body(results):
+    """非流式响应：各项按提交顺序排列"""
+    results = sorted(results, key=lambda item: item['index'])
+    return {'success': True, 'data': dict(batch_summary(results), results=results)}
+
+def ndjson_line(item):
+    return json_codec.dumps(item) + b'\n'
+
+def submit_batch_job(job, deadline):
+    """提交单个任务并返回该项结果；失败记录在结果中，不抛出异常"""
+    try:
+        response_data = generation_json(job.query_string, job.body, job.data, deadline=deadline)
+        return job.handle_result(response_data)
+    except Exception as e:
+        print(f"批量任务第{job.index}项提交异常: {str(e)}")
+        return job.error(e)
+
+def iter_batch_results(executor, jobs, deadline):
+    """并发提交全部任务，按完成顺序产出结果；结束或客户端断开时关闭线程池"""
+    try:
+        futures = [executor.submit(submit_batch_job, job, deadline) for job in jobs]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def batch_ndjson(results):
+    """流式响应（NDJSON）：每完成一项输出一行，最后一行为汇总"""
+    done = []
+    for item in results:
+        done.append(item)
+        yield ndjson_line(item)
+    yield ndjson_line({'summary': batch_summary(done)})
+
+@app.route('/api/batch', methods=['POST'])
+def batch_submit():
+    """批量提交生成任务 - 先整体校验，再以有限并发提交；stream为true时按完成顺序逐行返回"""
+    try:
+        payload = request.get_json()
+        jobs = parse_batch(payload)
+        
+        executor = ThreadPoolExecutor(max_workers=min(BATCH_CONCURRENCY, len(jobs)), thread_name_prefix='batch')
+        errors = [error for error in executor.map(BatchJob.build, jobs) if error]
+        if errors:
+            executor.shutdown()
+            raise InvalidJobs(errors)
+        
+        # 工作线程中没有请求上下文，时间预算显式传入
+        results = iter_batch_results(executor, jobs, current_deadline())
+        if payload.get('stream'):
+            return Response(
+                batch_ndjson(results),
+                content_type='application/x-ndjson',
+                headers={
+                    'Cache-Control': 'no-cache',
+                    'X-Accel-Buffering': 'no'
+                }
+            )
+        return jsonify(batch_response_body(results))
         
-        return jsonify({
+    except InvalidJobs as e:
+        return jsonify({'success': False, 'error': str(e), 'errors': e.errors}), 400
+    except InvalidRequest as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"批量提交异常: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def fetch_image_edit_status(task_id):
+    """向VolcEngine查询图片修改任务状态，返回(响应体, HTTP状态码, 任务状态)"""
+    # 使用seededit_v3.0的查询接口
+    request_body = {
+        "req_key": "seededit_v3.0",
+        "task_id": task_id,
+        "req_json": json.dumps({
+            "return_url": True,
+            "logo_info": {
+                "add_logo": False
+            }
+        })
+    }
+    
+    body = json_codec.dumps(request_body)
+    query_string = 'Action=CVSync2AsyncGetResult&Version=2022-08-31'
+    
+    # 签名并通过共享连接池发送到VolcEngine
+    response_data = volcengine_json(query_string, body)
+    
+    # 处理响应
+    if response_data.get('ResponseMetadata', {}).get('Error'):
+        error_msg = response_data['ResponseMetadata']['Error']['Message']
+        return {'success': False, 'error': error_msg}, 400, None
+    
+    # 检查业务错误码
+    if response_data.get('code') != 10000:
+        error_msg = response_data.get('message', '状态查询失败')
+        return {'success': False, 'error': error_msg}, 400, None
+        
+    result_data = response_data.get('data', {})
+    status = result_data.get('status', 'processing')
+    image_urls = result_data.get('image_urls', [])
+    
+    print(f"图片修改任务 {task_id} 状态: {status}, 图片URLs: {image_urls}")
+    
+    result = image_edit_status_response(task_id, status, image_urls)
+    if result[2] is not None:
+        task_store.update_status('image_edit', task_id, result[2], image_urls)
+    return result
+
+def image_edit_status_response(task_id, status, image_urls):
+    """图片修改任务状态的响应，返回(响应体, HTTP状态码, 任务状态)；轮询结果与任务表记录共用"""
+    if status == 'done' and image_urls:
+        image_url = image_urls[0]
+        return {
             'success': True,
             'data': {
-                'task_id': f'img2img_{int(datetime.now().timestamp() * 1000)}',
+                'task_id': task_id,
                 'status': 'done',
                 'result': {
                     'type': 'image',
-                    'url': image_url,
-                    'description': description
+                    'url': materializer.materialize(image_url, '.png'),
+                    'source_url': image_url
                 }
             }
-        })
-        
-    except Exception as e:
-        print(f"图生图异常: {str(e)}")
-        return jsonify({'success': False, 'error': str(e)}), 500
+        }, 200, 'done'
+    elif status == 'not_found':
+        return {'success': False, 'error': '任务未找到或已过期'}, 400, status
+    elif status == 'expired':
+        return {'success': False, 'error': '任务已过期，请重新提交'}, 400, status
+    else:
+        return image_edit_pending_body(task_id, status), 200, None if status == 'done' else status
 
-@app.route('/api/image-edit', methods=['POST'])
-def image_edit():
-    """图片修改 - 基于seededit_v3.0的异步图片编辑"""
+def image_edit_pending_body(task_id, status):
+    """图片修改任务进行中的响应体"""
+    # in_queue, generating 等状态
+    status_map = {
+        'in_queue': '任务已提交，排队等待中',
+        'generating': '正在处理中'
+    }
+    return {
+        'success': True,
+        'data': {
+            'task_id': task_id,
+            'status': status,
+            'statusMessage': status_map.get(status, f'当前状态: {status}')
+        }
+    }
+
+# 后台任务轮询：状态接口从本地任务表读取，同一task_id只轮询一次上游
+task_poller = TaskPoller.from_env({
+    'video': fetch_video_status,
+    'image_edit': fetch_image_edit_status,
+})
+
+# 事件流无状态变化时的心跳间隔（秒）
+TASK_EVENTS_HEARTBEAT = float(os.getenv('TASK_EVENTS_HEARTBEAT', '15'))
+
+# 由任务表记录生成状态响应：kind -> (task_id, 状态, 结果URL列表) -> (响应体, HTTP状态码, 任务状态)
+STORED_STATUS_RESPONSES = {
+    'video': lambda task_id, status, urls: video_status_response(task_id, status, urls[0] if urls else None),
+    'image_edit': image_edit_status_response,
+}
+
+def stored_task_result(kind, task_id):
+    """任务表中已结束的任务直接返回 (响应体, HTTP状态码)，不再查询上游；否则返回None"""
+    task = task_store.get(kind, task_id)
+    if task is None or task['status'] not in TERMINAL_STATUSES:
+        return None
+    body, code, status = STORED_STATUS_RESPONSES[kind](task_id, task['status'], task['result_urls'])
+    if status is None:
+        return None  # done但没有结果URL，交给轮询重新查询
+    return body, code
+
+def task_status_result(kind, task_id):
+    """返回任务状态 (响应体, HTTP状态码)；未结束的任务登记后台轮询，首次查询尚未返回时告知客户端继续等待"""
+    stored = stored_task_result(kind, task_id)
+    if stored is not None:
+        return stored
+    snapshot = task_poller.watch(kind, task_id)
+    if snapshot is not None:
+        return snapshot
+    if kind == 'image_edit':
+        return image_edit_pending_body(task_id, 'in_queue'), 200
+    return {
+        'success': True,
+        'data': {
+            'task_id': task_id,
+            'status': 'processing'
+        }
+    }, 200
+
+@app.route('/api/check-status', methods=['POST'])
+def check_status():
+    """检查任务状态 - 读取后台轮询的任务表"""
     try:
         data = request.get_json()
-        print(f"=== 图片修改请求 ===")
-        print(f"请求数据: {data}")
-        
-        image_base64 = data.get('imageBase64', '')
-        prompt = data.get('prompt', '')
-        strength = data.get('strength', 0.5)
-        
-        if not image_base64:
-            return jsonify({'success': False, 'error': '请提供图片数据'}), 400
-            
-        if not prompt:
-            return jsonify({'success': False, 'error': '请提供编辑描述'}), 400
-            
-        # 使用VolcEngine的新版图片编辑API (seededit_v3.0)
-        request_body = {
-            "req_key": "seededit_v3.0",
-            "binary_data_base64": [image_base64],
-            "prompt": prompt,
-            "seed": -1,
-            "scale": strength  # 使用用户设置的强度
-        }
-        
-        body = json.dumps(request_body)
-        query_string = 'Action=CVSync2AsyncSubmitTask&Version=2022-08-31'
-        
-        print(f"图片修改请求体: {body}")
-        print(f"查询字符串: {query_string}")
-        
-        # 生成签名
-        headers = generate_volcengine_signature('POST', '/', query_string, body)
-        
-        # 构建请求URL
-        url = f'https://{VOLCENGINE_HOST}/?{query_string}'
-        
-        # 发送请求到VolcEngine
-        response = requests.post(url, headers=headers, data=body)
-        response_data = response.json()
-        
-        print(f"图片修改API响应: {response_data}")
-        
-        # 处理响应
-        if response_data.get('ResponseMetadata', {}).get('Error'):
-            error_msg = response_data['ResponseMetadata']['Error']['Message']
-            return jsonify({'success': False, 'error': error_msg}), 400
+        task_id = data.get('task_id')
         
-        # 检查业务错误码
-        if response_data.get('code') != 10000:
-            error_msg = response_data.get('message', '图片修改任务提交失败')
-            return jsonify({'success': False, 'error': error_msg}), 400
-            
-        # 获取任务ID
-        task_id = response_data.get('data', {}).get('task_id', '')
         if not task_id:
-            return jsonify({'success': False, 'error': '未获取到任务ID'}), 400
-        
-        print(f"图片修改生成的task_id: {task_id}")
+            print("错误: task_id为空")
+            return jsonify({'success': False, 'error': 'task_id is required'}), 400
         
-        return jsonify({
-            'success': True,
-            'data': {
-                'task_id': task_id,
-                'status': 'pending'
-            }
-        })
+        return result_response(*task_status_result('video', task_id))
         
     except Exception as e:
-        print(f"图片修改异常: {str(e)}")
+        print(f"检查状态异常: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/image-edit-status', methods=['POST'])
 def image_edit_status():
-    """查询图片修改任务状态"""
+    """查询图片修改任务状态 - 读取后台轮询的任务表"""
     try:
         data = request.get_json()
         task_id = data.get('task_id')
-        print(f"=== 查询图片修改任务状态 ===")
-        print(f"task_id: {task_id}")
         
         if not task_id:
             return jsonify({'success': False, 'error': 'task_id is required'}), 400
         
-        # 使用seededit_v3.0的查询接口
-        request_body = {
-            "req_key": "seededit_v3.0",
-            "task_id": task_id,
-            "req_json": json.dumps({
-                "return_url": True,
-                "logo_info": {
-                    "add_logo": False
-                }
-            })
-        }
-        
-        body = json.dumps(request_body)
-        query_string = 'Action=CVSync2AsyncGetResult&Version=2022-08-31'
-        
-        print(f"图片修改状态查询请求体: {body}")
-        
-        # 生成签名
-        headers = generate_volcengine_signature('POST', '/', query_string, body)
-        
-        # 构建请求URL
-        url = f'https://{VOLCENGINE_HOST}/?{query_string}'
-        
-        # 发送请求到VolcEngine
-        response = requests.post(url, headers=headers, data=body)
-        response_data = response.json()
-        
-        print(f"图片修改状态查询响应: {response_data}")
-        
-        # 处理响应
-        if response_data.get('ResponseMetadata', {}).get('Error'):
-            error_msg = response_data['ResponseMetadata']['Error']['Message']
-            return jsonify({'success': False, 'error': error_msg}), 400
-        
-        # 检查业务错误码
-        if response_data.get('code') != 10000:
-            error_msg = response_data.get('message', '状态查询失败')
-            return jsonify({'success': False, 'error': error_msg}), 400
-            
-        result_data = response_data.get('data', {})
-        status = result_data.get('status', 'processing')
-        image_urls = result_data.get('image_urls', [])
-        
-        print(f"任务状态: {status}")
-        print(f"图片URLs: {image_urls}")
-        
-        if status == 'done' and image_urls:
-            image_url = image_urls[0]
-            return jsonify({
-                'success': True,
-                'data': {
-                    'task_id': task_id,
-                    'status': 'done',
-                    'result': {
-                        'type': 'image',
-                        'url': image_url
-                    }
-                }
-            })
-        elif status == 'not_found':
-            return jsonify({'success': False, 'error': '任务未找到或已过期'}), 400
-        elif status == 'expired':
-            return jsonify({'success': False, 'error': '任务已过期，请重新提交'}), 400
-        else:
-            # in_queue, generating 等状态
-            status_map = {
-                'in_queue': '任务已提交，排队等待中',
-                'generating': '正在处理中'
-            }
-            return jsonify({
-                'success': True,
-                'data': {
-                    'task_id': task_id,
-                    'status': status,
-                    'statusMessage': status_map.get(status, f'当前状态: {status}')
-                }
-            })
+        return result_response(*task_status_result('image_edit', task_id))
         
     except Exception as e:
         print(f"查询图片修改状态异常: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# /api/tasks每页最多返回的任务数
+TASK_LIST_MAX_LIMIT = 100
+
+def list_tasks_result(args):
+    """分页列出任务表（新提交的在前），返回 (响应体, HTTP状态码)；参数非法时抛出InvalidRequest"""
+    try:
+        limit = int(args.get('limit', 20))
+        cursor = int(args['cursor']) if args.get('cursor') else None
+    except ValueError:
+        raise InvalidRequest('limit和cursor必须是整数')
+    if not 1 <= limit <= TASK_LIST_MAX_LIMIT:
+        raise InvalidRequest(f'limit取值范围为1-{TASK_LIST_MAX_LIMIT}')
+    tasks, next_cursor = task_store.list(
+        limit, cursor, status=args.get('status') or None, kind=args.get('kind') or None
+    )
+    for task in tasks:
+        if task['status'] == 'done':
+            # 与状态接口一致返回本地URL，尚未下载的旧结果在此时补下载
+            default_ext = '.mp4' if task['kind'] == 'video' else '.png'
+            task['result_urls'] = [materializer.materialize(url, default_ext) for url in task['result_urls']]
+    return {
+        'success': True,
+        'data': {
+            'tasks': tasks,
+            'next_cursor': next_cursor
+        }
+    }, 200
+
+@app.route('/api/tasks', methods=['GET'])
+def list_tasks():
+    """任务历史（供作品库分页展示）- 参数: limit, cursor, status, kind"""
+    try:
+        return result_response(*list_tasks_result(request.args))
+    except InvalidRequest as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"查询任务列表异常: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def task_status_event(body):
+    """SSE状态事件，数据格式与POST状态接口的响应体一致"""
+    return f'event: status\ndata: {json.dumps(body, ensure_ascii=False)}\n\n'
+
+@app.route('/api/tasks/<task_id>/events', methods=['GET'])
+def task_events(task_id):
+    """任务状态事件流（SSE）- 后台轮询得到新状态后立即推送给客户端"""
+    kind = request.args.get('kind', 'video')
+    if kind not in task_poller.fetchers:
+        return jsonify({'success': False, 'error': f'unknown task kind: {kind}'}), 400
+    
+    stored = stored_task_result(kind, task_id)
+    if stored is None:
+        task_poller.watch(kind, task_id)
+    
+    def generate():
+        version = 0
+        yield 'retry: 3000\n\n'
+        if stored is not None:
+            # 已结束的任务推送一次最终状态即可
+            yield task_status_event(stored[0])
+            return
+        while True:
+            snapshot, new_version, terminal = task_poller.wait_for_change(
+                kind, task_id, version, TASK_EVENTS_HEARTBEAT
+            )
+            if snapshot is None or new_version == version:
+                # 没有新状态：续期关注（任务被淘汰时重新登记）并发送心跳保持连接
+                task_poller.watch(kind, task_id)
+                version = new_version
+                yield ': keep-alive\n\n'
+                continue
+            version = new_version
+            body, code = snapshot
+            yield task_status_event(body)
+            if terminal or not body.get('success'):
+                return
+    
+    return Response(
+        generate(),
+        content_type='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # 禁止反向代理缓冲事件流
+        }
+    )
+
+# 流水线中可以接收上一步结果图片的步骤；视频结果不能再作为输入
+PIPELINE_IMAGE_INPUT_STEPS = {'image-to-image', 'image-edit', 'image-to-video'}
+PIPELINE_VIDEO_STEPS = {'text-to-video', 'image-to-video'}
+# 需要后台轮询结果的异步任务：步骤类型 -> 任务表中的kind
+PIPELINE_TASK_KINDS = {'text-to-video': 'video', 'image-to-video': 'video', 'image-edit': 'image_edit'}
+PIPELINE_MAX_STEPS = int(os.getenv('PIPELINE_MAX_STEPS', '5'))
+# 单个异步步骤（视频生成、图片修改）等待结果的最长时间（秒）
+PIPELINE_STAGE_TIMEOUT = float(os.getenv('PIPELINE_STAGE_TIMEOUT', '600'))
+
+def parse_pipeline(payload):
+    """校验流水线定义，返回步骤列表；不合法时抛出InvalidRequest
+
+    第一步可以是任意生成任务（图片类步骤需要imageBase64、image_ref或image_url），之后每一步都以上一步的结果图片为输入。
+    """
+    steps = payload.get('steps') if isinstance(payload, dict) else None
+    if not isinstance(steps, list) or not steps:
+        raise InvalidRequest('请提供steps数组')
+    if len(steps) > PIPELINE_MAX_STEPS:
+        raise InvalidRequest(f'流水线最多{PIPELINE_MAX_STEPS}步')
+    errors = []
+    for index, step in enumerate(steps):
+        if not isinstance(step, dict):
+            errors.append({'index': index, 'error': '步骤必须是JSON对象'})
+            continue
+        step_type = step.get('type')
+        if step_type not in BATCH_JOB_TYPES:
+            errors.append({'index': index, 'error': f'未知的步骤类型: {step_type}'})
+        elif index == 0 and step_type in PIPELINE_IMAGE_INPUT_STEPS and not (
+                step.get('imageBase64') or step.get('image_ref') or step.get('image_url')):
+            errors.append({'index': index, 'error': '第一步需要imageBase64、image_ref或image_url'})
+        elif index > 0 and step_type not in PIPELINE_IMAGE_INPUT_STEPS:
+            errors.append({'index': index, 'error': f'{step_type} 不能以上一步的结果作为输入'})
+        elif index > 0 and steps[index - 1].get('type') in PIPELINE_VIDEO_STEPS:
+            errors.append({'index': index, 'error': '视频结果不能作为下一步的输入'})
+        elif step_type == 'image-edit' and not step.get('prompt'):
+            errors.append({'index': index, 'error': '请提供编辑描述'})
+    if errors:
+        raise InvalidJobs(errors)
+    return steps
+
+def download_asset(url, deadline, headers=None, default_content_type='image/png'):
+    """在服务端下载结果文件（同时写入资源缓存），返回可seek的二进制流；用于流水线的中间结果和派生资源的源文件"""
+    record = materializer.record_for_url(url)
+    if record is not None:
+        # 上一步的结果已经本地化：直接读本地文件，尚未下载完成时回源
+        local = materializer.open(record)
+        if local is not None:
+            with local[0] as f:
+                return io.BytesIO(f.read())
+        url = record['url']
+    cached = asset_cache.get(url)
+    if cached is not None:
+        with cached.file:
+            return io.BytesIO(cached.file.read())
+    response = upstream.get(
+        url, retry=True, deadline=deadline, headers=headers or IMAGE_PROXY_HEADERS, stream=True
+    )
+    writer = None
+    try:
+        if response.status_code != 200:
+            raise RuntimeError(f'下载源文件失败: {response.status_code}')
+        content_length = response.headers.get('content-length')
+        writer = asset_cache.writer(
+            url, response.headers.get('content-type', default_content_type),
+            int(content_length) if content_length else None
+        )
+        buffer = io.BytesIO()
+        for chunk in response.iter_content(chunk_size=65536):
+            buffer.write(chunk)
+            if writer is not None:
+                writer.write(chunk)
+        if writer is not None:
+            writer.commit()
+            writer = None
+    finally:
+        response.close()
+        if writer is not None:
+            writer.abort()
+    buffer.seek(0)
+    return buffer
+
+def run_pipeline_stage(step, image_url):
+    """执行流水线的一步：复用各提交接口的请求构造与响应处理，异步任务等待后台轮询得到结果"""
+    build, handle_result, reads_image = BATCH_JOB_TYPES[step['type']]
+    deadline = time.monotonic() + REQUEST_DEADLINE
+    if reads_image:
+        if image_url is not None:
+            image = download_asset(image_url, deadline)
+        else:
+            image = request_image(step) or download_asset(step['image_url'], deadline)
+        query_string, body = build(step, image)
+    else:
+        query_string, body = build(step)
+    # 后台线程中没有请求上下文，时间预算和请求头显式传入
+    response_data = generation_json(query_string, body, step, deadline=deadline)
+    result, code = handle_result(response_data, step)
+    kind = PIPELINE_TASK_KINDS.get(step['type'])
+    if kind is not None and result.get('success'):
+        result, code = wait_for_task(
+            task_poller, kind, result['data']['task_id'], PIPELINE_STAGE_TIMEOUT, TASK_EVENTS_HEARTBEAT
+        )
+    if not result.get('success') or result['data'].get('status') != 'done':
+        raise RuntimeError(result.get('error') or f"任务状态: {result['data'].get('status')}")
+    return {'task_id': result['data']['task_id'], 'result_url': result['data']['result']['url']}
+
+# 流水线在后台线程池中执行，进度记录在任务库中
+pipeline_runner = PipelineRunner.from_env(task_store, run_pipeline_stage, PIPELINE_STAGE_TIMEOUT)
+
+def start_pipeline_result(payload):
+    """校验并启动流水线，返回 (响应体, HTTP状态码)；不合法时抛出InvalidRequest"""
+    pipeline = pipeline_runner.start(parse_pipeline(payload))
+    return {'success': True, 'data': pipeline}, 202
+
+def pipeline_status_result(pipeline_id):
+    pipeline = pipeline_runner.get(pipeline_id)
+    if pipeline is None:
+        return {'success': False, 'error': '流水线不存在'}, 404
+    return {'success': True, 'data': pipeline}, 200
+
+@app.route('/api/pipelines', methods=['POST'])
+def create_pipeline():
+    """创建生成流水线 - 例如 text-to-image → image-edit → image-to-video，中间结果不经过浏览器"""
+    try:
+        return result_response(*start_pipeline_result(request.get_json()))
+    except InvalidJobs as e:
+        return jsonify({'success': False, 'error': str(e), 'errors': e.errors}), 400
+    except InvalidRequest as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"创建流水线异常: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/pipelines/<pipeline_id>', methods=['GET'])
+def pipeline_status(pipeline_id):
+    """查询流水线及每个阶段的状态"""
+    try:
+        return result_response(*pipeline_status_result(pipeline_id))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/image-proxy', methods=['GET'])
 def image_proxy():
     """图片代理下载接口"""
@@ -702,44 +1576,268 @@ def image_proxy():
         if not image_url:
             return jsonify({'error': 'Missing image URL'}), 400
         
-        # 设置适当的请求头
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://jimeng.jd.com/',  # 模拟从官方网站访问
-            'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-        }
-        
-        # 请求图片
-        response = requests.get(image_url, headers=headers, stream=True)
-        
-        if response.status_code == 200:
-            # 从URL推断文件类型
-            content_type = response.headers.get('content-type', 'image/png')
+        variant = variant_params(request.args)
+        if variant is not None and derived_assets.enabled:
+            # 缩略图：缩放并转码后的派生资源，作品库网格只需下载几十KB
+            response_headers = validator_headers({}, derived_assets.etag(image_url, *variant))
+            unchanged = not_modified(request.headers, response_headers)
+            if unchanged is not None:
+                return Response(status=304, headers=unchanged)
+            return file_response(derived_file_response(
+                image_variant(image_url, *variant, current_deadline()), request.headers, response_headers
+            ))
+        
+        return proxy_asset(
+            image_url, IMAGE_PROXY_HEADERS, 'image/png', image_response_headers(filename), 'Image'
+        )
             
-            # 返回图片流
-            def generate():
-                for chunk in response.iter_content(chunk_size=8192):
-                    yield chunk
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def variant_params(args, default_width=None):
+    """派生资源参数 w、format，返回 (宽度, 格式)；两者都未指定且没有默认宽度时返回None"""
+    width = args.get('w')
+    fmt = args.get('format')
+    if width is None and fmt is None and default_width is None:
+        return None
+    try:
+        width = int(width) if width is not None else default_width or 0
+    except ValueError:
+        raise InvalidRequest('w必须是正整数')
+    if width < 0:
+        raise InvalidRequest('w必须是正整数')
+    fmt = (fmt or 'webp').lower()
+    if fmt not in VARIANT_FORMATS:
+        raise InvalidRequest(f'不支持的格式: {fmt}，可选 {"、".join(VARIANT_FORMATS)}')
+    return (snap_width(width) if width else 0), fmt
+
+def image_variant(url, width, fmt, deadline):
+    return derived_assets.image_variant(url, width, fmt, lambda: download_asset(url, deadline).getvalue())
+
+def video_poster_frame(url, width, fmt, deadline):
+    return derived_assets.poster(
+        url, width, fmt, lambda: download_asset(url, deadline, VIDEO_PROXY_HEADERS, 'video/mp4').getvalue()
+    )
+
+def derived_file_response(asset, request_headers, response_headers):
+    """asset为DerivedAssets返回的 (文件对象, 字节数, Content-Type, 是否命中缓存)，返回值同local_file_response"""
+    f, size, content_type, hit = asset
+    response_headers = dict(response_headers, **{'X-Cache': 'HIT' if hit else 'MISS'})
+    return local_file_response(f, size, content_type, request_headers, response_headers)
+
+@app.route('/api/video-poster', methods=['GET'])
+def video_poster():
+    """视频封面帧 - 参数: url, w（默认640）, format（webp/jpeg/png，默认webp）"""
+    try:
+        video_url = request.args.get('url')
+        if not video_url:
+            return jsonify({'error': 'Missing video URL'}), 400
+        width, fmt = variant_params(request.args, default_width=640)
+        if not derived_assets.posters_enabled:
+            return jsonify({'error': 'Poster frames require Pillow and ffmpeg'}), 501
+        response_headers = validator_headers({}, derived_assets.etag(video_url, width, fmt, poster=True))
+        unchanged = not_modified(request.headers, response_headers)
+        if unchanged is not None:
+            return Response(status=304, headers=unchanged)
+        return file_response(derived_file_response(
+            video_poster_frame(video_url, width, fmt, current_deadline()), request.headers, response_headers
+        ))
             
-            return Response(
-                generate(),
-                content_type=content_type,
-                headers={
-                    'Content-Disposition': f'attachment; filename="{filename}"',
-                    'Content-Length': response.headers.get('content-length'),
-                    'Cache-Control': 'no-cache'
-                }
-            )
-        else:
-            return jsonify({'error': f'Image request failed: {response.status_code}'}), response.status_code
+    except InvalidRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def features_result():
+    """前端按后端的可选功能调整界面，例如没有ffmpeg时视频不设置封面"""
+    return {'success': True, 'data': {'posters_enabled': derived_assets.posters_enabled}}, 200
+
+@app.route('/api/features', methods=['GET'])
+def features():
+    return result_response(*features_result())
+
+RESULT_CONTENT_TYPES = {
+    '.mp4': 'video/mp4', '.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
+    '.webp': 'image/webp', '.gif': 'image/gif',
+}
+
+def result_file_params(name, args):
+    """结果文件路由的参数，返回 (记录, 默认Content-Type, 回源请求头, 响应头)；记录不存在时记录为None"""
+    record = materializer.get(name)
+    ext = os.path.splitext(name)[1]
+    content_type = RESULT_CONTENT_TYPES.get(ext, 'application/octet-stream')
+    is_video = content_type.startswith('video/')
+    filename = args.get('filename', f'generated-{"video" if is_video else "image"}{ext}')
+    # 文件名由源URL的哈希得到，本地副本与回源代理使用同一个ETag
+    response_headers = validator_headers(
+        video_response_headers(filename, args.get('download', 'false').lower() == 'true'),
+        strong_etag('result', name)
+    )
+    if record is not None and record['content_type']:
+        content_type = record['content_type']
+    return record, content_type, VIDEO_PROXY_HEADERS if is_video else IMAGE_PROXY_HEADERS, response_headers
+
+@app.route('/api/results/<name>', methods=['GET'])
+def result_file(name):
+    """本地化的生成结果 - 下载完成后读本地文件，完成前回源代理；支持Range请求"""
+    try:
+        record, content_type, fetch_headers, response_headers = result_file_params(name, request.args)
+        if record is None:
+            return jsonify({'error': 'Result not found'}), 404
+        
+        unchanged = not_modified(request.headers, response_headers)
+        if unchanged is not None:
+            return Response(status=304, headers=unchanged)
+        
+        local = materializer.open(record)
+        if local is not None:
+            f, size = local
+            return file_response(local_file_response(f, size, content_type, request.headers, response_headers))
+        
+        # 尚未下载完成（或下载失败）：本次回源代理，同时重新排队下载
+        materializer.retry(record)
+        return proxy_asset(
+            record['url'], fetch_headers, content_type, response_headers, 'Result', etag=response_headers['ETag']
+        )
             
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def optimize_prompt_params(data):
+    """校验提示词优化请求，返回 (提示词类型, 提示词)；不合法时抛出InvalidRequest"""
+    prompt = data.get('prompt', '')
+    kind = data.get('kind', 'video')
+    if not isinstance(prompt, str) or not prompt.strip():
+        raise InvalidRequest('请先输入文本描述')
+    if kind not in SYSTEM_PROMPTS:
+        raise InvalidRequest(f'未知的提示词类型: {kind}')
+    if not prompt_optimizer.api_key:
+        raise RuntimeError('未配置DEEPSEEK_API_KEY')
+    return kind, prompt
+
+def llm_post(body, deadline, stream=False):
+    """通过共享连接池调用chat/completions；非200响应抛出RuntimeError"""
+    response = upstream.post(
+        prompt_optimizer.url, action='chat/completions', retry=True, deadline=deadline,
+        headers=prompt_optimizer.headers, data=body, stream=stream
+    )
+    if response.status_code != 200:
+        response.close()
+        raise RuntimeError(f'提示词优化服务返回{response.status_code}')
+    return response
+
+def fetch_optimized_prompt(body, deadline):
+    return completion_text(json_codec.loads(llm_post(body, deadline).content))
+
+def open_llm_stream(body, deadline):
+    """逐行读取模型的SSE响应，读完或客户端断开时关闭连接"""
+    response = llm_post(body, deadline, stream=True)
+    try:
+        yield from response.iter_lines()
+    finally:
+        response.close()
+
+def optimize_prompt_ndjson(events):
+    """事件逐行输出；中途出错时最后一行为 {"error": ...}"""
+    try:
+        for event in events:
+            yield ndjson_line(event)
+    except Exception as e:
+        print(f"提示词优化异常: {str(e)}")
+        yield ndjson_line({'error': str(e)})
+
+@app.route('/api/optimize-prompt', methods=['POST'])
+def optimize_prompt():
+    """提示词优化 - stream为true时按NDJSON逐行返回模型输出的文本片段"""
+    try:
+        data = request.get_json()
+        kind, prompt = optimize_prompt_params(data)
+        # 流式响应在请求上下文之外生成，时间预算显式传入
+        deadline = current_deadline()
+        
+        if not data.get('stream'):
+            text = prompt_optimizer.optimize(kind, prompt, lambda body: fetch_optimized_prompt(body, deadline))
+            return jsonify({'success': True, 'data': {'prompt': text}})
+        
+        events = prompt_optimizer.stream(kind, prompt, lambda body: open_llm_stream(body, deadline))
+        first = next(events)  # 返回响应前先拿到第一段输出，连接模型服务失败时仍能返回错误状态码
+        return Response(
+            optimize_prompt_ndjson(itertools.chain([first], events)),
+            content_type='application/x-ndjson',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+        
+    except InvalidRequest as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        print(f"提示词优化异常: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# 各子系统的统计值在输出/metrics前同步为仪表盘
+subsystem_stat = metrics.REGISTRY.gauge(
+    'backend_subsystem_stat', 'Counters reported by backend subsystems', ('subsystem', 'stat'))
+
+def collect_subsystem_stats():
+    for subsystem, stats in (
+        ('upstream_pool', upstream.stats()),
+        ('task_poller', task_poller.stats()),
+        ('task_store', task_store.stats()),
+        ('result_cache', result_cache.stats()),
+        ('prompt_optimizer', prompt_optimizer.stats()),
+        ('pipelines', pipeline_runner.stats()),
+        ('asset_cache', asset_cache.stats()),
+        ('image_store', image_store.stats()),
+        ('materializer', materializer.stats()),
+        ('image_normalizer', image_normalizer.stats()),
+        ('derived_assets', derived_assets.stats()),
+        ('credentials', credential_pool.stats()),
+    ):
+        for stat, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                subsystem_stat.set(subsystem, stat, value=value)
+
+metrics.REGISTRY.add_collector(collect_subsystem_stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus文本格式指标"""
+    return Response(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康检查"""
-    return jsonify({'status': 'healthy'})
+    return jsonify(health_stats())
+
+def health_stats():
+    return {
+        'status': 'healthy',
+        'upstream': upstream.stats(),
+        'task_poller': task_poller.stats(),
+        'task_store': task_store.stats(),
+        'result_cache': result_cache.stats(),
+        'prompt_optimizer': prompt_optimizer.stats(),
+        'pipelines': pipeline_runner.stats(),
+        'asset_cache': asset_cache.stats(),
+        'image_store': image_store.stats(),
+        'materializer': materializer.stats(),
+        'image_normalizer': image_normalizer.stats(),
+        'derived_assets': derived_assets.stats(),
+        'credentials': credential_pool.stats(),
+        'json_codec': json_codec.NAME
+    }
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
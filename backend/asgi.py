@@ -0,0 +1,750 @@
+"""异步服务模式（ASGI）- 与app.py相同的/api/*接口，等待上游和代理流式传输只占用协程
+
+请求体构造、响应处理、任务轮询、资源缓存、准入控制与签名都复用app.py中的实现，
+这里只把阻塞的网络I/O换成aiohttp。
+
+运行: uvicorn asgi:app --host 0.0.0.0 --port 5000
+依赖: pip install aiohttp starlette uvicorn[standard] python-multipart
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.datastructures import UploadFile
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse as StarletteJSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import app as core
+import json_codec
+import metrics
+from async_upstream import AsyncUpstreamClient
+from idempotency import IdempotencyKeyReused, body_hash
+from resilience import UpstreamUnavailable
+
+async_upstream = AsyncUpstreamClient.from_env(core.upstream)
+
+
+class JSONResponse(StarletteJSONResponse):
+    """响应体由json_codec编码（与同步模式的CodecJSONProvider相同）"""
+
+    def render(self, content):
+        return json_codec.dumps(content)
+
+
+async def read_json(request):
+    """解析请求体；与request.json()相同，但使用json_codec直接解析bytes"""
+    return json_codec.loads(await request.body())
+
+ROUTES = []
+
+
+def route(path, methods):
+    """注册路由，并记录与同步模式相同的请求指标和时间预算"""
+    # 指标标签与Flask的路由规则保持一致
+    label = path.replace('{', '<').replace('}', '>')
+    budget = core.ROUTE_DEADLINES.get(label, core.REQUEST_DEADLINE)
+
+    def decorator(endpoint):
+        async def handler(request):
+            metrics.http_in_flight.inc(label)
+            start = time.perf_counter()
+            content_length = request.headers.get('content-length', '')
+            if content_length.isdigit() and int(content_length):
+                metrics.http_request_size.observe(label, value=int(content_length))
+            request.state.deadline = time.monotonic() + budget
+            status = 500
+            try:
+                response = await endpoint(request)
+                status = response.status_code
+                size = response.headers.get('content-length')
+                if size is not None:
+                    metrics.http_response_size.observe(label, value=int(size))
+                return response
+            finally:
+                metrics.http_in_flight.dec(label)
+                metrics.http_latency.observe(label, request.method, value=time.perf_counter() - start)
+                metrics.http_requests.inc(label, request.method, str(status))
+
+        ROUTES.append(Route(path, handler, methods=methods))
+        return endpoint
+    return decorator
+
+
+def json_result(body, code=200):
+    return JSONResponse(body, status_code=code)
+
+
+def upstream_unavailable_response(e):
+    headers = {'Retry-After': e.retry_after_header} if e.retry_after is not None else {}
+    return JSONResponse({'success': False, 'error': str(e)}, status_code=e.status_code, headers=headers)
+
+
+def error_response(e, key_only=False):
+    body = {'error': str(e)} if key_only else {'success': False, 'error': str(e)}
+    return JSONResponse(body, status_code=500)
+
+
+async def account_post(account, action, query_string, body, retry, deadline):
+    """与app.account_post相同：以指定账号签名并发送，占用该账号的准入名额"""
+    async with account.admission.slot_async(action, deadline):
+        headers = core.generate_volcengine_signature(account, 'POST', '/', query_string, body)
+        url = f'{core.VOLCENGINE_ENDPOINT}/?{query_string}'
+        return await async_upstream.post(
+            url, action=action, retry=retry, deadline=deadline, headers=headers, data=body
+        )
+
+
+async def volcengine_post(request, query_string, body):
+    """签名并通过异步连接池向VolcEngine发送POST请求 - 账号选择与app.volcengine_post相同"""
+    action = core.query_action(query_string)
+    retry = core.retry_allowed(action)
+    deadline = request.state.deadline
+    pool = core.credential_pool
+    pinned = None
+    if pool.multiple and action in core.TASK_RESULT_ACTIONS:
+        # 查询任务所属账号需要读任务库，放到线程池中
+        pinned = await run_in_threadpool(core.task_account, action, body)
+    account = await pool.choose_async(action, pinned, deadline)
+    attempts = len(pool.accounts)
+    for attempt in range(attempts):
+        response = await account_post(account, action, query_string, body, retry, deadline)
+        content = await response.read()
+        rejected = pool.record(account, response.status, content)
+        if rejected is None or pinned is not None or attempt + 1 >= attempts:
+            break
+        account = await pool.choose_async(action, deadline=deadline)
+    if pool.multiple and action in core.TASK_SUBMIT_ACTIONS:
+        await run_in_threadpool(core.bind_task_account, action, account, response.status, content)
+    return response
+
+
+async def volcengine_json(request, query_string, body):
+    response_data = json_codec.loads(await (await volcengine_post(request, query_string, body)).read())
+    core.record_volcengine_errors(query_string, response_data)
+    return response_data
+
+
+async def generation_json(request, query_string, body, data):
+    """与app.generation_json相同：确定性请求经过single-flight与结果缓存"""
+    if not core.is_deterministic(query_string, data):
+        return await volcengine_json(request, query_string, body)
+    return await core.result_cache.get_or_compute_async(
+        core.result_cache_key(query_string, body),
+        lambda: volcengine_json(request, query_string, body),
+        core.successful_response,
+    )
+
+
+async def read_image_request(request):
+    """与app.read_image_request相同：返回 (参数dict, base64字符串、二进制流或StoredImage)"""
+    if request.headers.get('content-type', '').startswith('multipart/form-data'):
+        form = await request.form()
+        data = {key: value for key, value in form.items() if isinstance(value, str)}
+        if 'strength' in data:
+            data['strength'] = float(data['strength'])
+        upload = form.get('image')
+        if isinstance(upload, UploadFile):
+            return data, upload.file
+    else:
+        data = await read_json(request)
+    # image_ref从磁盘读取，放到线程池中
+    return data, await run_in_threadpool(core.request_image, data)
+
+
+@route('/api/images', ['POST'])
+async def upload_image(request):
+    """上传原图，返回image_ref - 与app.upload_image相同"""
+    try:
+        if request.headers.get('content-type', '').startswith('multipart/form-data'):
+            upload = (await request.form()).get('image')
+            image = upload.file if isinstance(upload, UploadFile) else None
+        else:
+            image = (await read_json(request)).get('imageBase64') or None
+        return json_result(*await run_in_threadpool(core.upload_image_result, image))
+    except core.InvalidRequest as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=400)
+    except Exception as e:
+        return error_response(e)
+    finally:
+        await request.close()
+
+
+@route('/api/volcengine', ['POST'])
+async def volcengine_proxy(request):
+    """VolcEngine API代理"""
+    try:
+        query_string = request.url.query
+        body = await request.body()
+        response = await volcengine_post(request, query_string, body)
+        # 与同步模式相同：原始字节双向透传
+        return Response(
+            await response.read(), status_code=response.status,
+            media_type=response.headers.get('content-type', 'application/json'),
+        )
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        return error_response(e, key_only=True)
+
+
+async def submit(request, build, handle_result, reads_image):
+    """提交类路由的公共流程：构造请求体（图片预处理在线程池中）→ 异步调用上游 → 处理响应"""
+    try:
+        if reads_image:
+            data, image = await read_image_request(request)
+            query_string, body = await run_in_threadpool(build, data, image)
+        else:
+            data = await read_json(request)
+            query_string, body = build(data)
+        response_data = await generation_json(request, query_string, body, data)
+        # 记录任务和本地化结果都要写SQLite，放到线程池中
+        return json_result(*await run_in_threadpool(handle_result, response_data, data))
+    except core.InvalidRequest as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=400)
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        return error_response(e)
+    finally:
+        await request.close()  # 关闭multipart上传的临时文件
+
+
+def idempotent(endpoint):
+    """与app.idempotent相同：带Idempotency-Key的重复请求返回首次提交的响应"""
+    async def wrapper(request):
+        key = request.headers.get('idempotency-key')
+        if not key:
+            return await endpoint(request)
+        try:
+            # request.body()会缓存请求体，之后的read_json和form()从缓存读取
+            digest = body_hash(await request.body(), request.headers.get('content-type'))
+            claim = await core.idempotency.claim_async(key, request.url.path, digest, request.state.deadline)
+        except IdempotencyKeyReused as e:
+            return JSONResponse({'success': False, 'error': str(e)}, status_code=422)
+        except UpstreamUnavailable as e:
+            return upstream_unavailable_response(e)
+        if claim.response is not None:
+            return Response(
+                claim.response, status_code=claim.status_code, media_type='application/json',
+                headers={'Idempotent-Replayed': 'true'},
+            )
+        try:
+            response = await endpoint(request)
+        except BaseException:
+            # 可能是取消：不再await，直接删除这一行
+            core.idempotency.abort(claim)
+            raise
+        await run_in_threadpool(core.idempotency.finish, claim, response.status_code, response.body.decode('utf-8'))
+        return response
+    return wrapper
+
+
+@route('/api/text-to-video', ['POST'])
+@idempotent
+async def text_to_video(request):
+    return await submit(request, core.text_to_video_request, core.text_to_video_result, reads_image=False)
+
+
+@route('/api/image-to-video', ['POST'])
+@idempotent
+async def image_to_video(request):
+    return await submit(request, core.image_to_video_request, core.image_to_video_result, reads_image=True)
+
+
+@route('/api/text-to-image', ['POST'])
+async def text_to_image(request):
+    return await submit(request, core.text_to_image_request, core.text_to_image_result, reads_image=False)
+
+
+@route('/api/image-to-image', ['POST'])
+async def image_to_image(request):
+    return await submit(request, core.image_to_image_request, core.image_to_image_result, reads_image=True)
+
+
+@route('/api/image-edit', ['POST'])
+@idempotent
+async def image_edit(request):
+    return await submit(request, core.image_edit_request, core.image_edit_result, reads_image=True)
+
+
+@route('/api/batch', ['POST'])
+async def batch_submit(request):
+    """批量提交生成任务 - 与app.batch_submit相同，以信号量限制同时在途的上游提交数"""
+    try:
+        payload = await read_json(request)
+        jobs = core.parse_batch(payload)
+        limit = asyncio.Semaphore(core.BATCH_CONCURRENCY)
+
+        async def build(job):
+            async with limit:
+                return await run_in_threadpool(job.build)
+
+        errors = [error for error in await asyncio.gather(*(build(job) for job in jobs)) if error]
+        if errors:
+            raise core.InvalidJobs(errors)
+
+        async def submit_job(job):
+            async with limit:
+                try:
+                    response_data = await generation_json(request, job.query_string, job.body, job.data)
+                    return await run_in_threadpool(job.handle_result, response_data)
+                except Exception as e:
+                    return job.error(e)
+
+        tasks = [asyncio.ensure_future(submit_job(job)) for job in jobs]
+
+        async def results():
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    yield await next_done
+            finally:
+                for task in tasks:
+                    task.cancel()  # 客户端断开流式响应时不再提交剩余任务
+
+        if payload.get('stream'):
+            async def ndjson():
+                done = []
+                async for item in results():
+                    done.append(item)
+                    yield core.ndjson_line(item)
+                yield core.ndjson_line({'summary': core.batch_summary(done)})
+
+            return StreamingResponse(
+                ndjson(), media_type='application/x-ndjson',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+            )
+        return json_result(core.batch_response_body([item async for item in results()]))
+    except core.InvalidJobs as e:
+        return JSONResponse({'success': False, 'error': str(e), 'errors': e.errors}, status_code=400)
+    except core.InvalidRequest as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=400)
+    except Exception as e:
+        return error_response(e)
+
+
+@route('/api/pipelines', ['POST'])
+async def create_pipeline(request):
+    """创建生成流水线 - 各阶段在后台线程池中执行"""
+    try:
+        payload = await read_json(request)
+        return json_result(*await run_in_threadpool(core.start_pipeline_result, payload))
+    except core.InvalidJobs as e:
+        return JSONResponse({'success': False, 'error': str(e), 'errors': e.errors}, status_code=400)
+    except core.InvalidRequest as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=400)
+    except Exception as e:
+        return error_response(e)
+
+
+@route('/api/pipelines/{pipeline_id}', ['GET'])
+async def pipeline_status(request):
+    """查询流水线及每个阶段的状态"""
+    try:
+        return json_result(*await run_in_threadpool(core.pipeline_status_result, request.path_params['pipeline_id']))
+    except Exception as e:
+        return error_response(e)
+
+
+async def task_status(request, kind):
+    try:
+        task_id = (await read_json(request)).get('task_id')
+        if not task_id:
+            return JSONResponse({'success': False, 'error': 'task_id is required'}, status_code=400)
+        return json_result(*await run_in_threadpool(core.task_status_result, kind, task_id))
+    except Exception as e:
+        return error_response(e)
+
+
+@route('/api/check-status', ['POST'])
+async def check_status(request):
+    return await task_status(request, 'video')
+
+
+@route('/api/image-edit-status', ['POST'])
+async def image_edit_status(request):
+    return await task_status(request, 'image_edit')
+
+
+@route('/api/tasks', ['GET'])
+async def list_tasks(request):
+    """任务历史（供作品库分页展示）- 参数: limit, cursor, status, kind"""
+    try:
+        return json_result(*await run_in_threadpool(core.list_tasks_result, request.query_params))
+    except core.InvalidRequest as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=400)
+    except Exception as e:
+        return error_response(e)
+
+
+async def llm_post(body, deadline, stream=False):
+    """与app.llm_post相同：通过异步连接池调用chat/completions"""
+    response = await async_upstream.post(
+        core.prompt_optimizer.url, action='chat/completions', retry=True, deadline=deadline,
+        headers=core.prompt_optimizer.headers, data=body, stream=stream,
+    )
+    if response.status != 200:
+        response.release()
+        raise RuntimeError(f'提示词优化服务返回{response.status}')
+    return response
+
+
+async def fetch_optimized_prompt(body, deadline):
+    return core.completion_text(json_codec.loads(await (await llm_post(body, deadline)).read()))
+
+
+async def open_llm_stream(body, deadline):
+    response = await llm_post(body, deadline, stream=True)
+    try:
+        async for line in response.content:
+            yield line
+    finally:
+        response.release()
+
+
+@route('/api/optimize-prompt', ['POST'])
+async def optimize_prompt(request):
+    """提示词优化 - 与app.optimize_prompt相同，等待模型输出只占用协程"""
+    try:
+        data = await read_json(request)
+        kind, prompt = core.optimize_prompt_params(data)
+        deadline = request.state.deadline
+        if not data.get('stream'):
+            text = await core.prompt_optimizer.optimize_async(
+                kind, prompt, lambda body: fetch_optimized_prompt(body, deadline)
+            )
+            return json_result({'success': True, 'data': {'prompt': text}})
+
+        events = core.prompt_optimizer.stream_async(kind, prompt, lambda body: open_llm_stream(body, deadline))
+        first = await events.__anext__()
+
+        async def ndjson():
+            yield core.ndjson_line(first)
+            try:
+                async for event in events:
+                    yield core.ndjson_line(event)
+            except Exception as e:
+                yield core.ndjson_line({'error': str(e)})
+
+        return StreamingResponse(
+            ndjson(), media_type='application/x-ndjson',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+    except core.InvalidRequest as e:
+        return JSONResponse({'success': False, 'error': str(e)}, status_code=400)
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        return error_response(e)
+
+
+class TaskEventHub:
+    """把轮询线程中的状态变化转发给事件循环里等待的事件流协程"""
+
+    def __init__(self):
+        self._waiters = {}
+        self._loop = None
+
+    def subscribe(self, kind, task_id):
+        self._loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        self._waiters.setdefault((kind, task_id), set()).add(event)
+        return event
+
+    def unsubscribe(self, kind, task_id, event):
+        waiters = self._waiters.get((kind, task_id))
+        if waiters is not None:
+            waiters.discard(event)
+            if not waiters:
+                del self._waiters[(kind, task_id)]
+
+    def notify(self, kind, task_id):
+        """在轮询线程中调用"""
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake, (kind, task_id))
+        except RuntimeError:
+            pass  # 事件循环已关闭
+
+    def _wake(self, key):
+        for event in self._waiters.get(key, ()):
+            event.set()
+
+
+task_event_hub = TaskEventHub()
+core.task_poller.add_listener(task_event_hub.notify)
+
+
+@route('/api/tasks/{task_id}/events', ['GET'])
+async def task_events(request):
+    """任务状态事件流（SSE）- 每个连接只是一个等待事件的协程"""
+    task_id = request.path_params['task_id']
+    kind = request.query_params.get('kind', 'video')
+    if kind not in core.task_poller.fetchers:
+        return JSONResponse({'success': False, 'error': f'unknown task kind: {kind}'}, status_code=400)
+
+    stored = await run_in_threadpool(core.stored_task_result, kind, task_id)
+    if stored is None:
+        core.task_poller.watch(kind, task_id)
+
+    async def generate():
+        version = 0
+        changed = task_event_hub.subscribe(kind, task_id)
+        try:
+            yield 'retry: 3000\n\n'
+            if stored is not None:
+                yield core.task_status_event(stored[0])
+                return
+            while True:
+                changed.clear()
+                snapshot, new_version, terminal = core.task_poller.wait_for_change(kind, task_id, version, 0)
+                if snapshot is None or new_version == version:
+                    version = new_version
+                    try:
+                        await asyncio.wait_for(changed.wait(), core.TASK_EVENTS_HEARTBEAT)
+                    except asyncio.TimeoutError:
+                        # 没有新状态：续期关注（任务被淘汰时重新登记）并发送心跳保持连接
+                        core.task_poller.watch(kind, task_id)
+                        yield ': keep-alive\n\n'
+                    continue
+                version = new_version
+                body, code = snapshot
+                yield core.task_status_event(body)
+                if terminal or not body.get('success'):
+                    return
+        finally:
+            task_event_hub.unsubscribe(kind, task_id, changed)
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def local_file_streaming_response(hit):
+    """把 (状态码, 响应头, 响应体迭代器, 关闭回调) 包装为在线程池中读文件的响应"""
+    status, hit_headers, body, close = hit
+    if status == 304:
+        return Response(status_code=304, headers=hit_headers)
+
+    async def read_file():
+        try:
+            async for chunk in iterate_in_threadpool(iter(body)):
+                yield chunk
+        finally:
+            close()
+
+    return StreamingResponse(read_file(), status_code=status, headers=hit_headers)
+
+
+async def proxy_asset(request, url, headers, default_content_type, response_headers, label, etag=None):
+    """与app.proxy_asset相同：条件请求直接304，缓存命中读本地文件，未命中时边转发边写缓存"""
+    response_headers = core.validator_headers(response_headers, etag or core.asset_etag(url))
+    # ETag由源URL计算（源URL不可变，见app.asset_etag），匹配时不读缓存也不访问上游
+    unchanged = core.not_modified(request.headers, response_headers)
+    if unchanged is not None:
+        return Response(status_code=304, headers=unchanged)
+
+    # 缓存的查找（open/stat/utime）、临时文件的创建和写入都是磁盘I/O，放到线程池中
+    hit = await run_in_threadpool(
+        core.cached_asset_response, url, request.headers, default_content_type, response_headers
+    )
+    if hit is not None:
+        return local_file_streaming_response(hit)
+
+    range_header = core.usable_range(request.headers, response_headers)
+    forwarded_range = core.upstream_range(range_header)
+    if forwarded_range:
+        headers = dict(headers, Range=forwarded_range)
+    response = await async_upstream.get(
+        url, retry=True, deadline=request.state.deadline, headers=headers, stream=True
+    )
+    if response.status == 416:
+        response.release()
+        return Response(status_code=416, headers={'Content-Range': response.headers.get('content-range', '')})
+    if response.status not in (200, 206):
+        response.release()
+        return JSONResponse({'error': f'{label} request failed: {response.status}'}, status_code=response.status)
+
+    last_modified = response.headers.get('last-modified')
+    if last_modified:
+        response_headers['Last-Modified'] = last_modified
+        unchanged = core.not_modified(request.headers, response_headers)
+        if unchanged is not None:
+            response.release()
+            return Response(status_code=304, headers=unchanged)
+
+    content_type = response.headers.get('content-type', default_content_type)
+    content_length = response.headers.get('content-length')
+    writer = None
+    if response.status == 200:
+        writer = await run_in_threadpool(
+            core.asset_cache.writer, url, content_type, int(content_length) if content_length else None, last_modified
+        )
+
+    async def generate():
+        completed = False
+        try:
+            async for chunk in response.content.iter_chunked(65536):
+                if writer is not None:
+                    await run_in_threadpool(writer.write, chunk)
+                yield chunk
+            if writer is not None:
+                await run_in_threadpool(writer.commit)
+            completed = True
+        finally:
+            response.release()
+            if writer is not None and not completed:
+                # 可能是客户端断开导致的取消：不再await，关闭并删除临时文件
+                writer.abort()
+
+    status, range_headers = core.miss_range_headers(range_header, forwarded_range, response.status, response.headers)
+    response_headers = dict(response_headers, **range_headers, **{'X-Cache': 'MISS'})
+    return StreamingResponse(
+        generate(), status_code=status, media_type=content_type, headers=response_headers
+    )
+
+
+@route('/api/video-proxy', ['GET'])
+async def video_proxy(request):
+    """视频代理接口"""
+    try:
+        video_url = request.query_params.get('url')
+        filename = request.query_params.get('filename', 'generated-video.mp4')
+        download = request.query_params.get('download', 'false').lower() == 'true'
+        if not video_url:
+            return JSONResponse({'error': 'Missing video URL'}, status_code=400)
+        return await proxy_asset(
+            request, video_url, core.VIDEO_PROXY_HEADERS, 'video/mp4',
+            core.video_response_headers(filename, download), 'Video',
+        )
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        return error_response(e, key_only=True)
+
+
+@route('/api/image-proxy', ['GET'])
+async def image_proxy(request):
+    """图片代理下载接口"""
+    try:
+        image_url = request.query_params.get('url')
+        filename = request.query_params.get('filename', 'generated-image.png')
+        if not image_url:
+            return JSONResponse({'error': 'Missing image URL'}, status_code=400)
+        variant = core.variant_params(request.query_params)
+        if variant is not None and core.derived_assets.enabled:
+            response_headers = core.validator_headers({}, core.derived_assets.etag(image_url, *variant))
+            unchanged = core.not_modified(request.headers, response_headers)
+            if unchanged is not None:
+                return Response(status_code=304, headers=unchanged)
+            asset = await run_in_threadpool(core.image_variant, image_url, *variant, request.state.deadline)
+            return local_file_streaming_response(
+                core.derived_file_response(asset, request.headers, response_headers)
+            )
+        return await proxy_asset(
+            request, image_url, core.IMAGE_PROXY_HEADERS, 'image/png',
+            core.image_response_headers(filename), 'Image',
+        )
+    except core.InvalidRequest as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        return error_response(e, key_only=True)
+
+
+@route('/api/video-poster', ['GET'])
+async def video_poster(request):
+    """视频封面帧"""
+    try:
+        video_url = request.query_params.get('url')
+        if not video_url:
+            return JSONResponse({'error': 'Missing video URL'}, status_code=400)
+        width, fmt = core.variant_params(request.query_params, default_width=640)
+        if not core.derived_assets.posters_enabled:
+            return JSONResponse({'error': 'Poster frames require Pillow and ffmpeg'}, status_code=501)
+        response_headers = core.validator_headers({}, core.derived_assets.etag(video_url, width, fmt, poster=True))
+        unchanged = core.not_modified(request.headers, response_headers)
+        if unchanged is not None:
+            return Response(status_code=304, headers=unchanged)
+        asset = await run_in_threadpool(core.video_poster_frame, video_url, width, fmt, request.state.deadline)
+        return local_file_streaming_response(
+            core.derived_file_response(asset, request.headers, response_headers)
+        )
+    except core.InvalidRequest as e:
+        return JSONResponse({'error': str(e)}, status_code=400)
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        return error_response(e, key_only=True)
+
+
+@route('/api/features', ['GET'])
+async def features(request):
+    """后端的可选功能"""
+    return json_result(*core.features_result())
+
+
+@route('/api/results/{name}', ['GET'])
+async def result_file(request):
+    """本地化的生成结果 - 下载完成后读本地文件，完成前回源代理"""
+    try:
+        record, content_type, fetch_headers, response_headers = await run_in_threadpool(
+            core.result_file_params, request.path_params['name'], request.query_params
+        )
+        if record is None:
+            return JSONResponse({'error': 'Result not found'}, status_code=404)
+        unchanged = core.not_modified(request.headers, response_headers)
+        if unchanged is not None:
+            return Response(status_code=304, headers=unchanged)
+        local = await run_in_threadpool(core.materializer.open, record)
+        if local is not None:
+            f, size = local
+            return local_file_streaming_response(
+                core.local_file_response(f, size, content_type, request.headers, response_headers)
+            )
+        await run_in_threadpool(core.materializer.retry, record)
+        return await proxy_asset(
+            request, record['url'], fetch_headers, content_type, response_headers, 'Result',
+            etag=response_headers['ETag'],
+        )
+    except UpstreamUnavailable as e:
+        return upstream_unavailable_response(e)
+    except Exception as e:
+        return error_response(e, key_only=True)
+
+
+@route('/metrics', ['GET'])
+async def metrics_endpoint(request):
+    """Prometheus文本格式指标"""
+    return Response(metrics.REGISTRY.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@route('/health', ['GET'])
+async def health_check(request):
+    """健康检查"""
+    return JSONResponse(dict(core.health_stats(), mode='async', async_upstream=async_upstream.stats()))
+
+
+@asynccontextmanager
+async def lifespan(_app):
+    yield
+    await async_upstream.aclose()
+
+
+app = Starlette(
+    routes=ROUTES,
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+    lifespan=lifespan,
+)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:app', host='0.0.0.0', port=5000)
@@ -0,0 +1,214 @@
+"""代理资源的本地磁盘缓存 - 按规范化URL内容寻址，按字节预算LRU淘汰"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# 临时文件超过这么久没有写入才视为残留；多个worker进程共用缓存目录，较新的可能正被其他进程写入
+STALE_PART_SECONDS = 600
+
+
+def normalize_url(url):
+    """规范化源URL：scheme/host小写、去掉fragment、查询参数排序"""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+
+def cache_key(url):
+    return hashlib.sha256(normalize_url(url).encode('utf-8')).hexdigest()
+
+
+def remove_stale_part(path, now=None):
+    """删除写入进程已退出后残留的临时文件，返回是否删除；仍在写入的文件保留"""
+    try:
+        if (now or time.time()) - os.stat(path).st_mtime < STALE_PART_SECONDS:
+            return False
+        os.remove(path)
+    except FileNotFoundError:
+        return False  # 写入完成被改名，或其他进程已经清理
+    return True
+
+
+class CachedAsset:
+    """缓存命中的本地文件，文件句柄在命中时即打开，之后被淘汰也能读完"""
+
+    __slots__ = ('key', 'path', 'size', 'content_type', 'last_modified', 'file')
+
+    def __init__(self, key, path, size, content_type, last_modified, file):
+        self.key = key
+        self.path = path
+        self.size = size
+        self.content_type = content_type
+        self.last_modified = last_modified  # 上游的Last-Modified头，没有时为None
+        self.file = file
+
+
+class CacheWriter:
+    """未命中时边转发边写入临时文件，完整写完后才加入缓存"""
+
+    def __init__(self, cache, key, content_type, expected_size, last_modified=None):
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        self.expected_size = expected_size
+        self.last_modified = last_modified
+        self.size = 0
+        self.tmp_path = os.path.join(cache.root, f'{key}.{uuid.uuid4().hex}.part')
+        self._file = open(self.tmp_path, 'wb')
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        if self.expected_size is not None and self.size != self.expected_size:
+            logger.warning('缓存写入不完整 %s: %s/%s 字节', self.key, self.size, self.expected_size)
+            self.abort()
+            return
+        self.cache._commit(self)
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class AssetCache:
+    """磁盘上的LRU缓存，数据文件 <key> 旁边存放 <key>.json 元数据"""
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (size, content_type, last_modified)，按最近使用排序
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+        if self.enabled:
+            os.makedirs(root, exist_ok=True)
+            self._load()
+
+    @classmethod
+    def from_env(cls):
+        default_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'assets')
+        return cls(
+            os.getenv('ASSET_CACHE_DIR', default_root),
+            int(os.getenv('ASSET_CACHE_MAX_BYTES', str(2 * 1024 ** 3))),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _paths(self, key):
+        data_path = os.path.join(self.root, key)
+        return data_path, data_path + '.json'
+
+    def _load(self):
+        """启动时按最近使用时间恢复LRU顺序，清理残留的临时文件"""
+        found = []
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith('.part'):
+                remove_stale_part(path, now)
+                continue
+            if not name.endswith('.json'):
+                continue
+            key = name[:-len('.json')]
+            data_path, meta_path = self._paths(key)
+            try:
+                with open(meta_path) as f:
+                    meta = json.load(f)
+                stat = os.stat(data_path)
+            except (OSError, ValueError):
+                self._remove_files(key)
+                continue
+            found.append((stat.st_mtime, key, stat.st_size, meta.get('content_type'), meta.get('last_modified')))
+        for _, key, size, content_type, last_modified in sorted(found):
+            self._entries[key] = (size, content_type, last_modified)
+            self._bytes += size
+        with self._lock:
+            self._evict_locked()
+
+    def _remove_files(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, url):
+        """查找缓存，命中返回CachedAsset并刷新LRU位置"""
+        if not self.enabled:
+            return None
+        key = cache_key(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        f = None
+        if entry is not None:
+            data_path, _ = self._paths(key)
+            try:
+                os.utime(data_path)  # 用mtime记录最近使用时间，重启后恢复LRU顺序
+                f = open(data_path, 'rb')
+            except FileNotFoundError:
+                f = None  # 文件在查找之后被并发淘汰，按未命中处理
+        with self._lock:
+            self._counters['hits' if f is not None else 'misses'] += 1
+        if f is None:
+            return None
+        size, content_type, last_modified = entry
+        return CachedAsset(key, data_path, size, content_type, last_modified, f)
+
+    def writer(self, url, content_type, expected_size=None, last_modified=None):
+        """为未命中的URL创建写入器；资源超过预算或缓存关闭时返回None"""
+        if not self.enabled:
+            return None
+        if expected_size is not None and expected_size > self.max_bytes:
+            return None
+        return CacheWriter(self, cache_key(url), content_type, expected_size, last_modified)
+
+    def _commit(self, writer):
+        data_path, meta_path = self._paths(writer.key)
+        with open(meta_path, 'w') as f:
+            json.dump({
+                'content_type': writer.content_type, 'size': writer.size, 'last_modified': writer.last_modified,
+            }, f)
+        os.replace(writer.tmp_path, data_path)
+        with self._lock:
+            old = self._entries.pop(writer.key, None)
+            if old is not None:
+                self._bytes -= old[0]
+            self._entries[writer.key] = (writer.size, writer.content_type, writer.last_modified)
+            self._bytes += writer.size
+            self._evict_locked()
+
+    def _evict_locked(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key, (size, _, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._counters['evictions'] += 1
+            self._remove_files(key)
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters,
+                enabled=self.enabled,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+            )
@@ -0,0 +1,155 @@
+"""异步上游HTTP客户端 - 异步服务模式下VolcEngine与CDN请求使用的非阻塞连接池
+
+与同步的UpstreamClient共用超时、重试配置和按host的熔断器，指标标签一致。
+依赖aiohttp（可选，仅异步模式需要）；aiohttp按读取进度暂停接收，代理慢速客户端时不会把整个文件缓存在内存里。
+"""
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import urlsplit
+
+import aiohttp
+
+import metrics
+from resilience import DeadlineExceeded, backoff_delay, remaining
+from upstream import RETRYABLE_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# 网络层可重试的异常：连接失败、超时、连接被重置或协议错误
+RETRYABLE_EXCEPTIONS = (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError)
+# 连接建立阶段的失败：请求还没有发出，任何请求都可以安全重试
+CONNECT_EXCEPTIONS = (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)
+
+
+async def _aiter_body(body):
+    """把同步的可迭代请求体（如StreamingJsonBody）转成异步迭代器，每次重试重新生成"""
+    for chunk in body:
+        yield chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+        await asyncio.sleep(0)  # 大图编码时让出事件循环
+
+
+class AsyncUpstreamClient:
+    """每个事件循环持有一个aiohttp.ClientSession；等待上游只占用协程，不占用线程"""
+
+    def __init__(self, sync_client, max_connections=1000):
+        self.sync_client = sync_client
+        self.max_connections = max_connections
+        self._session = None
+        self._loop = None
+
+    @classmethod
+    def from_env(cls, sync_client):
+        return cls(
+            sync_client,
+            max_connections=int(os.getenv('UPSTREAM_ASYNC_MAX_CONNECTIONS', '1000')),
+        )
+
+    @property
+    def session(self):
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=0),
+            )
+            self._loop = loop
+        return self._session
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _timeout_for(self, deadline):
+        connect, read = self.sync_client._timeout_for(deadline)
+        # 从连接池取连接的等待时间同样受时间预算约束
+        return aiohttp.ClientTimeout(total=None, connect=read, sock_connect=connect, sock_read=read)
+
+    async def request(self, method, url, action=None, retry=False, deadline=None,
+                      headers=None, data=None, stream=False):
+        """与UpstreamClient.request语义一致，返回aiohttp.ClientResponse
+
+        stream为False时已读完响应体；为True时调用方负责release()响应。
+        """
+        parts = urlsplit(url)
+        action = action or parts.hostname
+        breaker = self.sync_client.breaker(parts.netloc)
+        attempts = self.sync_client.max_attempts
+        for attempt in range(attempts):
+            timeout = self._timeout_for(deadline)
+            breaker.before_request()
+            try:
+                response = await self._send(method, url, action, headers, data, stream, timeout)
+            except RETRYABLE_EXCEPTIONS as e:
+                breaker.record_failure()
+                if attempt + 1 >= attempts or not (retry or isinstance(e, CONNECT_EXCEPTIONS)):
+                    if isinstance(e, asyncio.TimeoutError) and deadline is not None and remaining(deadline) <= 0:
+                        raise DeadlineExceeded() from e
+                    raise
+                logger.info('上游请求失败，准备重试 %s (%d/%d): %s', action, attempt + 1, attempts, e)
+            except Exception:
+                breaker.record_failure()
+                raise
+            except BaseException:
+                # 客户端断开时协程被取消（CancelledError），不代表上游失败，只释放探测名额
+                breaker.abort_probe()
+                raise
+            else:
+                if response.status not in RETRYABLE_STATUSES:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if attempt + 1 >= attempts or not retry:
+                    return response
+                response.release()
+                logger.info('上游返回%d，准备重试 %s (%d/%d)', response.status, action, attempt + 1, attempts)
+            delay = backoff_delay(attempt, self.sync_client.backoff_base, self.sync_client.backoff_cap)
+            left = remaining(deadline)
+            if left is not None and delay >= left:
+                raise DeadlineExceeded()
+            metrics.upstream_retries.inc(action)
+            await asyncio.sleep(delay)
+
+    async def _send(self, method, url, action, headers, data, stream, timeout):
+        headers = dict(headers or {})
+        if data is None or isinstance(data, (bytes, str)):
+            content = data
+        else:
+            headers['Content-Length'] = str(len(data))
+            content = _aiter_body(data)
+        if data is not None and hasattr(data, '__len__'):
+            metrics.upstream_request_size.observe(action, value=len(data))
+        metrics.upstream_in_flight.inc(action)
+        start = time.perf_counter()
+        try:
+            response = await self.session.request(method, url, headers=headers, data=content, timeout=timeout)
+            if not stream:
+                await response.read()
+        except Exception as e:
+            metrics.upstream_requests.inc(action, 'error')
+            metrics.upstream_errors.inc(action, type(e).__name__)
+            raise
+        finally:
+            metrics.upstream_in_flight.dec(action)
+            metrics.upstream_latency.observe(action, value=time.perf_counter() - start)
+        metrics.upstream_requests.inc(action, str(response.status))
+        content_length = response.headers.get('content-length')
+        if content_length and content_length.isdigit():
+            metrics.upstream_response_size.observe(action, value=int(content_length))
+        return response
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    def stats(self):
+        connector = self._session.connector if self._session is not None else None
+        # aiohttp没有公开连接池计数，_acquired为正在使用的连接
+        in_use = len(getattr(connector, '_acquired', ())) if connector is not None else 0
+        return {
+            'max_connections': self.max_connections,
+            'connections_in_use': in_use,
+        }
@@ -0,0 +1,114 @@
+"""JSON编解码微基准：对比优化前（标准库 + str中转）与json_codec（bytes直通）每MB负载的CPU时间
+
+用法: python benchmarks/bench_json.py [--payload-mb 4] [--iterations 20]
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_codec  # noqa: E402
+
+
+def flask_jsonify(obj):
+    """优化前jsonify的序列化方式（Flask默认JSONProvider：排序键、转义非ASCII）"""
+    return json.dumps(obj, sort_keys=True, ensure_ascii=True, separators=(',', ':')).encode('utf-8')
+
+
+def legacy_request_parse(raw):
+    # request.get_json()
+    return json.loads(raw)
+
+
+def legacy_upstream_body(request_body):
+    # json.dumps后签名时编码一次，requests发送时再编码一次
+    body = json.dumps(request_body)
+    hashlib.sha256(body.encode('utf-8')).hexdigest()
+    return body.encode('utf-8')
+
+
+def codec_upstream_body(request_body):
+    body = json_codec.dumps(request_body)
+    hashlib.sha256(body).hexdigest()
+    return body
+
+
+def legacy_relay_response(content):
+    # response.json()先按文本解码再解析，jsonify再序列化回去
+    return flask_jsonify(json.loads(content.decode('utf-8')))
+
+
+def codec_relay_response(content):
+    return json_codec.dumps(json_codec.loads(content))
+
+
+def legacy_volcengine_proxy(raw_request, upstream_content):
+    # get_data(as_text=True) → 签名编码 → 发送编码；响应 response.json() → jsonify
+    body = raw_request.decode('utf-8')
+    hashlib.sha256(body.encode('utf-8')).hexdigest()
+    body.encode('utf-8')
+    return legacy_relay_response(upstream_content)
+
+
+def codec_volcengine_proxy(raw_request, upstream_content):
+    # 请求与响应都按原始字节透传，只剩签名需要的哈希
+    hashlib.sha256(raw_request).hexdigest()
+    return upstream_content
+
+
+def cpu_ms_per_mb(fn, payload_bytes, iterations):
+    fn()  # 预热
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.process_time() - start
+    return elapsed * 1000 / iterations / (payload_bytes / (1024 * 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--payload-mb', type=float, default=4)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+
+    image = base64.b64encode(os.urandom(int(args.payload_mb * 1024 * 1024 * 3 / 4))).decode('ascii')
+    request_body = {
+        'req_key': 'seededit_v3.0', 'prompt': '把天空换成晚霞，保持人物不变', 'seed': 42,
+        'scale': 0.5, 'return_url': False, 'binary_data_base64': [image],
+    }
+    raw_request = json.dumps(request_body).encode('utf-8')
+    # return_url为false时同步生图接口在响应中直接返回base64图片
+    upstream_content = json.dumps({
+        'code': 10000, 'message': 'Success', 'request_id': 'bench',
+        'data': {'binary_data_base64': [image], 'rephraser_result': '晚霞下的人物'},
+    }).encode('utf-8')
+    size = len(raw_request)
+
+    # 两种实现的结果必须等价
+    assert json_codec.loads(codec_upstream_body(request_body)) == request_body
+    assert json_codec.loads(codec_relay_response(upstream_content)) == json.loads(upstream_content)
+
+    cases = [
+        ('请求解析', lambda: legacy_request_parse(raw_request), lambda: json_codec.loads(raw_request)),
+        ('上游请求体', lambda: legacy_upstream_body(request_body), lambda: codec_upstream_body(request_body)),
+        ('上游响应转发', lambda: legacy_relay_response(upstream_content),
+         lambda: codec_relay_response(upstream_content)),
+        ('volcengine代理', lambda: legacy_volcengine_proxy(raw_request, upstream_content),
+         lambda: codec_volcengine_proxy(raw_request, upstream_content)),
+    ]
+    print(f'负载 {size / 1024 / 1024:.1f} MB，编解码实现: {json_codec.NAME}')
+    print(f"{'路径':<14}{'before ms/MB':>14}{'after ms/MB':>14}{'加速':>8}")
+    for label, before, after in cases:
+        before_ms = cpu_ms_per_mb(before, size, args.iterations)
+        after_ms = cpu_ms_per_mb(after, size, args.iterations)
+        speedup = before_ms / after_ms if after_ms else float('inf')
+        print(f'{label:<14}{before_ms:>14.2f}{after_ms:>14.2f}{speedup:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""同步（Flask多线程）与异步（uvicorn + asgi.py）服务模式对比
+
+上游延迟较高、并发连接较多时，同步模式每个等待中的请求占用一个线程，异步模式只占用一个协程。
+对每种模式分别启动后端，按相同的并发驱动等待上游的路由和长时间流式传输的代理路由，
+输出吞吐量、延迟、后端峰值RSS和峰值线程数。
+
+用法: python benchmarks/bench_serving.py [--concurrency 200] [--requests 1000] [--latency 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import load_test  # noqa: E402
+from mock_volcengine import MockState, make_server  # noqa: E402
+
+DEFAULT_ROUTES = 'text-to-video,check-status,video-proxy'
+
+
+class ThreadSampler:
+    """后台定期读取后端进程的线程数，记录峰值"""
+
+    def __init__(self, process, interval=0.05):
+        self.process = process
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            count = load_test.thread_count(self.process)
+            if count is not None:
+                self.peak = max(self.peak, count)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_mode(mode, args, routes):
+    mock_state = MockState(args.latency / 1000, args.queue_seconds, args.generate_seconds, args.asset_size)
+    mock_server = make_server(mock_state)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        extra_env = {
+            'ASSET_CACHE_DIR': cache_dir,
+            'TASK_STORE_PATH': os.path.join(cache_dir, 'tasks.sqlite3'),
+            # 关闭资源缓存，代理路由每次都从上游流式转发
+            'ASSET_CACHE_MAX_BYTES': '0',
+            'RESULT_STORE_DIR': os.path.join(cache_dir, 'results'),
+            'IMAGE_STORE_DIR': os.path.join(cache_dir, 'images'),
+            'DERIVED_CACHE_DIR': os.path.join(cache_dir, 'derived'),
+            'TASK_POLL_INTERVAL': '0.5',
+            'UPSTREAM_LIMITS': load_test.unlimited_admission(),
+            'UPSTREAM_MAX_QUEUE': str(args.concurrency * 2),
+        }
+        process, base_url = load_test.start_backend(load_test.free_port(), mock_state.base_url, extra_env, mode)
+        try:
+            ctx = load_test.Context(mock_state.base_url, args.asset_urls)
+            load_test.seed_tasks(base_url, ctx, args.seed_tasks)
+            with ThreadSampler(process) as sampler:
+                rows = [load_test.run_route(base_url, name, ctx, args.concurrency, args.requests) for name in routes]
+        finally:
+            rss = load_test.stop_backend(process)
+            mock_server.shutdown()
+    return rows, rss, sampler.peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=1000, help='每个路由的请求数')
+    parser.add_argument('--latency', type=float, default=500, help='模拟上游延迟（毫秒）')
+    parser.add_argument('--queue-seconds', type=float, default=0.5)
+    parser.add_argument('--generate-seconds', type=float, default=1.0)
+    parser.add_argument('--asset-size', type=int, default=4 * 1024 * 1024, help='模拟视频的字节数')
+    parser.add_argument('--asset-urls', type=int, default=8)
+    parser.add_argument('--seed-tasks', type=int, default=10)
+    parser.add_argument('--routes', default=DEFAULT_ROUTES, help='逗号分隔的路由名')
+    parser.add_argument('--modes', default='sync,async')
+    args = parser.parse_args()
+
+    routes = [r.strip() for r in args.routes.split(',') if r.strip()]
+    results = {mode: run_mode(mode, args, routes) for mode in args.modes.split(',')}
+
+    print(f"{'mode':<8}{'route':<16}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for mode, (rows, _, _) in results.items():
+        for row in rows:
+            print(f"{mode:<8}{row['route']:<16}{row['errors']:>8}{row['throughput']:>10.1f}"
+                  f"{row['p50']:>10.1f}{row['p99']:>10.1f}")
+    for mode, (_, rss, threads) in results.items():
+        rss_text = f'{rss:.1f} MB' if rss is not None else '未知'
+        print(f'{mode}: 峰值RSS {rss_text}，峰值线程数 {threads}')
+
+
+if __name__ == '__main__':
+    main()
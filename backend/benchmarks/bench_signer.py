@@ -0,0 +1,89 @@
+"""签名器微基准：对比原始逐次计算实现与VolcEngineSigner的每秒签名次数
+
+用法: python benchmarks/bench_signer.py [--iterations 20000] [--body-size 512]
+"""
+import argparse
+import contextlib
+import hashlib
+import hmac
+import io
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from signer import VolcEngineSigner, canonicalize_query, get_signature_key  # noqa: E402
+
+ACCESS_KEY = 'AKLTbenchmark'
+SECRET_KEY = 'bench-secret-key'
+REGION = 'cn-beijing'
+SERVICE = 'cv'
+HOST = 'visual.volcengineapi.com'
+QUERY = 'Action=JimengVGFMT2VL20GetResult&Version=2024-06-06'
+
+
+def legacy_sign(method, path, query_string, body, now):
+    """优化前的实现：每次重算签名密钥、重新排序查询串并打印调试信息"""
+    current_date = now.strftime('%Y%m%dT%H%M%SZ')
+    datestamp = now.strftime('%Y%m%d')
+    payload_hash = hashlib.sha256(body.encode('utf-8')).hexdigest()
+    canonical_request = (
+        method + '\n' + path + '\n' + canonicalize_query(query_string) + '\n' +
+        'host:' + HOST + '\n' + 'x-content-sha256:' + payload_hash + '\n' +
+        'x-date:' + current_date + '\n' + '\n' +
+        'host;x-content-sha256;x-date' + '\n' + payload_hash
+    )
+    credential_scope = datestamp + '/' + REGION + '/' + SERVICE + '/' + 'request'
+    string_to_sign = (
+        'HMAC-SHA256' + '\n' + current_date + '\n' + credential_scope + '\n' +
+        hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()
+    )
+    signing_key = get_signature_key(SECRET_KEY, datestamp, REGION, SERVICE)
+    signature = hmac.new(signing_key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    authorization_header = (
+        'HMAC-SHA256 Credential=' + ACCESS_KEY + '/' + credential_scope + ', ' +
+        'SignedHeaders=host;x-content-sha256;x-date, Signature=' + signature
+    )
+    print("=== 签名调试信息 ===")
+    print(f"Canonical Request:\n{canonical_request}")
+    print(f"String to Sign:\n{string_to_sign}")
+    print(f"Signature: {signature}")
+    print(f"Authorization: {authorization_header}")
+    print("==================")
+    return authorization_header
+
+
+def run(label, fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {iterations / elapsed:>12,.0f} 次签名/秒  ({elapsed * 1e6 / iterations:.1f} µs/次)",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--body-size', type=int, default=512)
+    args = parser.parse_args()
+
+    body = '{"req_key": "jimeng_vgfm_t2v_l20", "task_id": "' + 'x' * args.body_size + '"}'
+    now = datetime.now(timezone.utc)
+    signer = VolcEngineSigner(ACCESS_KEY, SECRET_KEY, REGION, SERVICE, HOST)
+
+    # 两种实现必须产生相同的签名
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected = legacy_sign('POST', '/', QUERY, body, now)
+    assert signer.sign('POST', '/', QUERY, body, now=now)['Authorization'] == expected
+
+    # 原实现的调试输出写到stdout，这里重定向到/dev/null以只衡量格式化与写入的开销
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        run('before', lambda: legacy_sign('POST', '/', QUERY, body, now), args.iterations)
+    run('after', lambda: signer.sign('POST', '/', QUERY, body, now=now), args.iterations)
+
+
+if __name__ == '__main__':
+    main()
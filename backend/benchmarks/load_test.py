@@ -0,0 +1,335 @@
+"""后端压测：启动本地模拟VolcEngine与后端服务，按并发驱动各个/api/*路由
+
+输出每个路由的吞吐量、p50/p95/p99延迟和后端进程的峰值RSS，不消耗真实的生成额度。
+
+用法: python benchmarks/load_test.py [--concurrency 16] [--requests 200] [--latency 50]
+                                     [--routes text-to-video,check-status,...] [--mode sync|async]
+                                     [--accounts 4 --account-qps 2]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from admission import DEFAULT_LIMITS  # noqa: E402
+import mock_llm  # noqa: E402
+from mock_volcengine import MOCK_ACCESS_KEY, MOCK_SECRET_KEY, MockState, credentials_json, make_server  # noqa: E402
+
+# 1x1像素PNG，作为图片类接口的上传内容
+TINY_PNG_BASE64 = (
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+
+class Context:
+    """压测过程中共享的数据：预先提交的任务ID与资源URL"""
+
+    def __init__(self, mock_base_url, asset_urls):
+        self.video_tasks = []
+        self.edit_tasks = []
+        self.video_urls = [f'{mock_base_url}/assets/video-{i}.mp4' for i in range(asset_urls)]
+        self.image_urls = [f'{mock_base_url}/assets/image-{i}.png' for i in range(asset_urls)]
+        self.picture_urls = [f'{mock_base_url}/assets/picture-{i}.png' for i in range(asset_urls)]
+
+
+def json_post(path, payload):
+    return 'POST', path, {'json': payload}
+
+
+# 批量提交路由每次请求的任务：提示词 × 宽高比的组合，混合视频与图片任务
+BATCH_JOBS = [
+    {'type': job_type, 'prompt': f'变体{i}', 'aspect_ratio': ratio}
+    for i, (job_type, ratio) in enumerate(
+        (job_type, ratio) for job_type in ('text-to-video', 'text-to-image') for ratio in ('16:9', '9:16', '1:1', '4:3', '3:4')
+    )
+]
+
+
+# 提示词优化路由轮换使用的模板提示词，重复的提示词命中后端缓存
+PROMPT_TEMPLATES = ['日落时分的海边', '一只猫在窗台上晒太阳', '雨夜的城市街道', '雪山下的湖泊', '森林里的小木屋']
+
+
+# 路由名 -> 根据上下文生成一次请求 (method, path, requests参数)
+ROUTES = {
+    'text-to-video': lambda ctx: json_post('/api/text-to-video', {'prompt': '日落时分的海边', 'aspect_ratio': '16:9'}),
+    'image-to-video': lambda ctx: json_post('/api/image-to-video', {'prompt': '让画面动起来', 'imageBase64': TINY_PNG_BASE64}),
+    'check-status': lambda ctx: json_post('/api/check-status', {'task_id': random.choice(ctx.video_tasks)}),
+    'text-to-image': lambda ctx: json_post('/api/text-to-image', {'prompt': '一只猫', 'width': 512, 'height': 512}),
+    'image-to-image': lambda ctx: json_post('/api/image-to-image', {'prompt': '水彩风格', 'imageBase64': TINY_PNG_BASE64}),
+    'image-edit': lambda ctx: json_post('/api/image-edit', {'prompt': '把天空换成晚霞', 'imageBase64': TINY_PNG_BASE64}),
+    'image-edit-status': lambda ctx: json_post('/api/image-edit-status', {'task_id': random.choice(ctx.edit_tasks)}),
+    'volcengine': lambda ctx: (
+        'POST', '/api/volcengine?Action=JimengVGFMT2VL20GetResult&Version=2024-06-06',
+        {'data': json.dumps({'req_key': 'jimeng_vgfm_t2v_l20', 'task_id': random.choice(ctx.video_tasks)}),
+         'headers': {'Content-Type': 'application/json'}},
+    ),
+    # 浏览器播放视频的首个请求都带Range: bytes=0-
+    'video-proxy': lambda ctx: (
+        'GET', '/api/video-proxy', {'params': {'url': random.choice(ctx.video_urls)}, 'headers': {'Range': 'bytes=0-'}}
+    ),
+    'image-proxy': lambda ctx: ('GET', '/api/image-proxy', {'params': {'url': random.choice(ctx.image_urls)}}),
+    'thumbnail': lambda ctx: (
+        'GET', '/api/image-proxy', {'params': {'url': random.choice(ctx.picture_urls), 'w': 160}}
+    ),
+    'batch': lambda ctx: json_post('/api/batch', {'jobs': BATCH_JOBS}),
+    'optimize-prompt': lambda ctx: json_post('/api/optimize-prompt', {'prompt': random.choice(PROMPT_TEMPLATES)}),
+    'optimize-stream': lambda ctx: json_post(
+        '/api/optimize-prompt', {'prompt': f'{random.choice(PROMPT_TEMPLATES)} {random.randrange(1000)}', 'stream': True}
+    ),
+    'task-events': lambda ctx: (
+        'GET', f'/api/tasks/{random.choice(ctx.video_tasks)}/events', {'params': {'kind': 'video'}}
+    ),
+}
+
+
+def unlimited_admission():
+    """UPSTREAM_LIMITS取值：放开所有Action的准入配额"""
+    return json.dumps({action: {'qps': 100000, 'concurrency': 100000} for action in DEFAULT_LIMITS})
+
+
+def plant_part_files(directories):
+    """在各缓存目录放一个临时文件，模拟其他进程正在写入的缓存；返回文件路径"""
+    paths = []
+    for directory in directories:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'load-test-sentinel.part')
+        with open(path, 'wb') as f:
+            f.write(b'in flight')
+        paths.append(path)
+    return paths
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+# 后端进程的启动代码：sync为Flask多线程服务（与app.run相同），async为uvicorn运行asgi.py
+SERVE_CODE = {
+    'sync': "import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)",
+    'async': "import uvicorn; uvicorn.run('asgi:app', host='127.0.0.1', port={port}, log_level='warning')",
+}
+
+
+def start_backend(port, mock_base_url, extra_env, mode='sync'):
+    env = dict(
+        os.environ,
+        VOLCENGINE_ENDPOINT=mock_base_url,
+        VOLCENGINE_ACCESS_KEY=MOCK_ACCESS_KEY,
+        VOLCENGINE_SECRET_KEY=MOCK_SECRET_KEY,
+        LOG_LEVEL='WARNING',
+        **extra_env,
+    )
+    # 以脚本文件启动，与 python app.py 相同：__main__有__file__，multiprocessing的spawn子进程会重新导入它
+    fd, script = tempfile.mkstemp(prefix='load-test-backend-', suffix='.py')
+    with os.fdopen(fd, 'w') as f:
+        f.write(f'import sys\nsys.path.insert(0, {BACKEND_DIR!r})\n' + SERVE_CODE[mode].format(port=port))
+    process = subprocess.Popen(
+        [sys.executable, script], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    process.script = script
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f'{base_url}/health', timeout=1).ok:
+                return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    os.remove(script)
+    raise RuntimeError('后端服务启动超时')
+
+
+def thread_count(process):
+    try:
+        with open(f'/proc/{process.pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss_mb(process):
+    """Linux上读取VmHWM；否则在进程退出后用RUSAGE_CHILDREN近似"""
+    try:
+        with open(f'/proc/{process.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def stop_backend(process):
+    rss = peak_rss_mb(process)
+    process.terminate()
+    process.wait(timeout=10)
+    os.remove(process.script)
+    if rss is None:
+        maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        rss = maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+    return rss
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+def seed_submit(url, payload):
+    """提交一个任务并返回task_id；模拟服务限制了账号配额时等待后重试"""
+    while True:
+        r = requests.post(url, json=payload)
+        body = r.json()
+        task_id = body.get('data', {}).get('task_id') if body.get('success') else None
+        if task_id:
+            return task_id
+        time.sleep(float(r.headers.get('Retry-After', '0.5')))
+
+
+def seed_tasks(base_url, ctx, count):
+    """预先提交一批任务，供状态查询类路由使用"""
+    for _ in range(count):
+        ctx.video_tasks.append(seed_submit(f'{base_url}/api/text-to-video', {'prompt': 'seed'}))
+        ctx.edit_tasks.append(seed_submit(
+            f'{base_url}/api/image-edit', {'prompt': 'seed', 'imageBase64': TINY_PNG_BASE64}))
+
+
+def run_route(base_url, name, ctx, concurrency, total):
+    local = threading.local()
+
+    def one_request(_):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        method, path, kwargs = ROUTES[name](ctx)
+        start = time.perf_counter()
+        try:
+            with session.request(method, base_url + path, stream=True, timeout=60, **kwargs) as response:
+                for _ in response.iter_content(65536):
+                    pass
+                ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one_request, range(total)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        'route': name,
+        'requests': total,
+        'errors': errors,
+        'throughput': total / elapsed,
+        'p50': percentile(latencies, 50) * 1000,
+        'p95': percentile(latencies, 95) * 1000,
+        'p99': percentile(latencies, 99) * 1000,
+    }
+
+
+def print_report(rows, rss, mock_state, llm_state):
+    print(f"{'route':<20}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for row in rows:
+        print(f"{row['route']:<20}{row['requests']:>10}{row['errors']:>8}{row['throughput']:>10.1f}"
+              f"{row['p50']:>10.1f}{row['p95']:>10.1f}{row['p99']:>10.1f}")
+    if rss is not None:
+        print(f'后端峰值RSS: {rss:.1f} MB')
+    print(f'模拟服务: {mock_state.counters}')
+    if len(mock_state.submits_by_account) > 1:
+        print(f'各账号受理的提交: {list(mock_state.submits_by_account.values())}')
+    print(f'模拟LLM: {llm_state.counters}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=200, help='每个路由的请求数')
+    parser.add_argument('--latency', type=float, default=50, help='模拟上游延迟（毫秒）')
+    parser.add_argument('--queue-seconds', type=float, default=0.5)
+    parser.add_argument('--generate-seconds', type=float, default=1.0)
+    parser.add_argument('--asset-size', type=int, default=512 * 1024, help='模拟图片/视频的字节数')
+    parser.add_argument('--asset-urls', type=int, default=8, help='代理路由轮换使用的不同URL数')
+    parser.add_argument('--seed-tasks', type=int, default=20)
+    parser.add_argument('--error-rate', type=float, default=0, help='模拟上游随机返回503的比例（0-1）')
+    parser.add_argument('--routes', default=','.join(ROUTES), help='逗号分隔的路由名')
+    parser.add_argument('--backend-env', action='append', default=[], metavar='KEY=VALUE',
+                        help='传给后端进程的额外环境变量，可重复')
+    parser.add_argument('--mode', choices=sorted(SERVE_CODE), default='sync', help='后端服务模式')
+    parser.add_argument('--accounts', type=int, default=1, help='后端凭证池中的模拟账号数')
+    parser.add_argument('--account-qps', type=int, default=0, help='模拟服务每个账号每秒受理的提交数，0为不限')
+    args = parser.parse_args()
+
+    routes = [r.strip() for r in args.routes.split(',') if r.strip()]
+    unknown = [r for r in routes if r not in ROUTES]
+    if unknown:
+        parser.error(f'未知路由: {", ".join(unknown)}')
+
+    mock_state = MockState(args.latency / 1000, args.queue_seconds, args.generate_seconds, args.asset_size,
+                           error_rate=0, accounts=args.accounts, account_qps=args.account_qps)
+    mock_server = make_server(mock_state)
+    llm_state = mock_llm.MockLLMState(args.latency / 1000)
+    llm_server = mock_llm.make_server(llm_state)
+
+    extra_env = dict(item.split('=', 1) for item in args.backend_env)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        extra_env.setdefault('ASSET_CACHE_DIR', cache_dir)
+        extra_env.setdefault('TASK_STORE_PATH', os.path.join(cache_dir, 'tasks.sqlite3'))
+        extra_env.setdefault('RESULT_STORE_DIR', os.path.join(cache_dir, 'results'))
+        extra_env.setdefault('IMAGE_STORE_DIR', os.path.join(cache_dir, 'images'))
+        extra_env.setdefault('DERIVED_CACHE_DIR', os.path.join(cache_dir, 'derived'))
+        extra_env.setdefault('TASK_POLL_INTERVAL', '0.5')
+        extra_env.setdefault('DEEPSEEK_API_BASE', llm_state.base_url)
+        extra_env.setdefault('DEEPSEEK_API_KEY', mock_llm.MOCK_LLM_API_KEY)
+        # 默认放开准入配额，测量后端自身的开销而不是限流后的排队时间
+        extra_env.setdefault('UPSTREAM_LIMITS', unlimited_admission())
+        if args.accounts > 1:
+            extra_env.setdefault('VOLCENGINE_CREDENTIALS', credentials_json(args.accounts))
+        process, base_url = start_backend(free_port(), mock_state.base_url, extra_env, args.mode)
+        try:
+            # 后端启动之后才放置：渲染缩略图、封面等后台工作不能清理其他进程正在写入的临时文件
+            sentinels = plant_part_files([extra_env['ASSET_CACHE_DIR'], extra_env['IMAGE_STORE_DIR']])
+            ctx = Context(mock_state.base_url, args.asset_urls)
+            seed_tasks(base_url, ctx, args.seed_tasks)
+            mock_state.error_rate = args.error_rate
+            rows = [run_route(base_url, name, ctx, args.concurrency, args.requests) for name in routes]
+            lost_sentinels = [path for path in sentinels if not os.path.exists(path)]
+        finally:
+            rss = stop_backend(process)
+            mock_server.shutdown()
+            llm_server.shutdown()
+    print_report(rows, rss, mock_state, llm_state)
+    if mock_state.counters['bad_signatures']:
+        print('警告: 模拟服务收到签名校验失败的请求')
+        sys.exit(1)
+    if lost_sentinels:
+        print(f'警告: 压测期间其他进程的缓存临时文件被删除: {", ".join(lost_sentinels)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
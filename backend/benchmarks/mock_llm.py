@@ -0,0 +1,134 @@
+"""本地模拟的DeepSeek chat/completions接口 - 校验API Key，按固定间隔逐个输出token（SSE）
+
+单独运行: python benchmarks/mock_llm.py --port 8901 --token-delay 30
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MOCK_LLM_API_KEY = 'sk-mock-llm-key'
+
+
+class MockLLMState:
+    """模拟服务的配置与计数；改写结果为固定前缀 + 用户输入 + 固定后缀，按token_chars个字符一段输出"""
+
+    def __init__(self, latency=0.0, token_delay=0.02, token_chars=2):
+        self.latency = latency  # 收到请求到输出第一个token的时间
+        self.token_delay = token_delay
+        self.token_chars = token_chars
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'streamed': 0, 'bad_auth': 0}
+        self.base_url = None
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def tokens(self, prompt):
+        text = f'优化后的提示词：{prompt}，镜头缓缓推进，柔和的光线洒在画面上'
+        return [text[i:i + self.token_chars] for i in range(0, len(text), self.token_chars)]
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None  # 由make_server注入
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _write_chunk(self, data):
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def do_POST(self):
+        state = self.state
+        state.count('requests')
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.rstrip('/').split('?')[0] != '/chat/completions':
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+        if self.headers.get('Authorization') != f'Bearer {MOCK_LLM_API_KEY}':
+            state.count('bad_auth')
+            self._send_json(401, {'error': {'message': 'invalid api key'}})
+            return
+        data = json.loads(body or b'{}')
+        prompt = data['messages'][-1]['content']
+        tokens = state.tokens(prompt)
+        completion_id = f'chatcmpl-{uuid.uuid4().hex}'
+        if state.latency:
+            time.sleep(state.latency)
+
+        if not data.get('stream'):
+            time.sleep(state.token_delay * len(tokens))
+            self._send_json(200, {
+                'id': completion_id,
+                'object': 'chat.completion',
+                'model': data.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': ''.join(tokens)},
+                             'finish_reason': 'stop'}],
+            })
+            return
+
+        state.count('streamed')
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for i, token in enumerate(tokens):
+                if i:
+                    time.sleep(state.token_delay)
+                chunk = {'id': completion_id, 'object': 'chat.completion.chunk',
+                         'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]}
+                self._write_chunk(f'data: {json.dumps(chunk, ensure_ascii=False)}\n\n'.encode('utf-8'))
+            self._write_chunk(b'data: [DONE]\n\n')
+            self._write_chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # 后端提前断开（浏览器取消了优化）
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    request_queue_size = 1024
+
+
+def make_server(state, host='127.0.0.1', port=0):
+    """创建并在后台线程启动模拟服务，返回server；state.base_url会被设置为服务地址"""
+    handler = type('BoundMockLLMHandler', (MockLLMHandler,), {'state': state})
+    server = MockLLMServer((host, port), handler)
+    server.daemon_threads = True
+    state.base_url = f'http://{host}:{server.server_port}'
+    threading.Thread(target=server.serve_forever, name='mock-llm', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8901)
+    parser.add_argument('--latency', type=float, default=200, help='输出第一个token前的延迟（毫秒）')
+    parser.add_argument('--token-delay', type=float, default=30, help='相邻token之间的间隔（毫秒）')
+    args = parser.parse_args()
+
+    state = MockLLMState(args.latency / 1000, args.token_delay / 1000)
+    make_server(state, port=args.port)
+    print(f'模拟LLM已启动: {state.base_url}')
+    print(f'DEEPSEEK_API_BASE={state.base_url} DEEPSEEK_API_KEY={MOCK_LLM_API_KEY}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""本地模拟的visual.volcengineapi.com - 校验签名、模拟异步任务生命周期、提供假的图片/视频资源
+
+单独运行: python benchmarks/mock_volcengine.py --port 8900 --latency 50
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from byte_ranges import RangeNotSatisfiable, parse_byte_ranges  # noqa: E402
+from signer import VolcEngineSigner  # noqa: E402
+
+try:
+    from PIL import Image
+except ImportError:  # 没有Pillow时picture资源与其他资源相同
+    Image = None
+
+MOCK_ACCESS_KEY = 'AKLTmockaccesskey'
+MOCK_SECRET_KEY = 'mock-secret-key'
+MOCK_REGION = 'cn-beijing'
+MOCK_SERVICE = 'cv'
+MOCK_HOST = 'visual.volcengineapi.com'
+
+
+def sample_picture(side=1024):
+    """可以解码的PNG，用于缩略图路由；没有Pillow时返回None"""
+    if Image is None:
+        return None
+    buf = io.BytesIO()
+    Image.effect_noise((side, side), 64).convert('RGB').save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def mock_credentials(count):
+    """count个模拟账号的 (access_key, secret_key)；第一个与单账号时相同"""
+    return [(MOCK_ACCESS_KEY, MOCK_SECRET_KEY)] + [
+        (f'{MOCK_ACCESS_KEY}{i}', f'{MOCK_SECRET_KEY}-{i}') for i in range(1, count)
+    ]
+
+# 与backend/app.py中各路由使用的req_key/Action对应
+SUBMIT_ACTIONS = {
+    'JimengVGFMT2VL20SubmitTask': 'video',
+    'JimengVGFMI2VL20SubmitTask': 'video',
+    'CVSync2AsyncSubmitTask': 'image',
+}
+RESULT_ACTIONS = {'JimengVGFMT2VL20GetResult', 'CVSync2AsyncGetResult'}
+SYNC_IMAGE_ACTIONS = {'JimengHighAESGeneralV21L', 'CVProcess'}
+
+
+def credentials_json(count):
+    """后端VOLCENGINE_CREDENTIALS的取值"""
+    return json.dumps([
+        {'name': f'mock{i}', 'access_key': access_key, 'secret_key': secret_key}
+        for i, (access_key, secret_key) in enumerate(mock_credentials(count))
+    ])
+
+
+class MockState:
+    """模拟服务的全部状态：任务表、资源内容和计数
+
+    任务只在提交它的账号下可见；account_qps大于0时每个账号每秒最多受理这么多次提交，超出返回429（50429）。
+    """
+
+    def __init__(self, latency=0.0, queue_seconds=1.0, generate_seconds=2.0,
+                 asset_size=1024 * 1024, verify_signatures=True, error_rate=0.0,
+                 accounts=1, account_qps=0):
+        self.latency = latency
+        self.queue_seconds = queue_seconds
+        self.generate_seconds = generate_seconds
+        self.asset = os.urandom(asset_size)
+        self.picture = sample_picture()
+        self.verify_signatures = verify_signatures
+        self.error_rate = error_rate  # 按该比例随机返回503，模拟上游抖动
+        self.signers = {
+            access_key: VolcEngineSigner(access_key, secret_key, MOCK_REGION, MOCK_SERVICE, MOCK_HOST)
+            for access_key, secret_key in mock_credentials(accounts)
+        }
+        self.account_qps = account_qps
+        self.tasks = {}
+        self.submit_windows = {}  # access_key -> (秒, 该秒内受理的提交数)
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'bad_signatures': 0, 'asset_requests': 0, 'range_requests': 0,
+                         'injected_errors': 0, 'quota_rejections': 0, 'foreign_task_polls': 0}
+        self.submits_by_account = {access_key: 0 for access_key in self.signers}
+        self.base_url = None
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def check_signature(self, method, query_string, headers, body):
+        """签名正确时返回请求使用的access_key，否则返回None"""
+        x_date = headers.get('X-Date', '')
+        try:
+            now = datetime.strptime(x_date, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+        except ValueError:
+            return None
+        credential = headers.get('Authorization', '').partition('Credential=')[2]
+        signer = self.signers.get(credential.partition('/')[0])
+        if signer is None:
+            return None
+        expected = signer.sign(method, '/', query_string, body, now=now)
+        if (headers.get('Authorization') == expected['Authorization'] and
+                headers.get('X-Content-Sha256') == hashlib.sha256(body).hexdigest()):
+            return signer.access_key
+        return None
+
+    def admit_submit(self, access_key):
+        """按账号的每秒提交配额受理，超出时返回False"""
+        if not self.account_qps:
+            return True
+        second = int(time.monotonic())
+        with self.lock:
+            window, count = self.submit_windows.get(access_key, (second, 0))
+            if window != second:
+                count = 0
+            if count >= self.account_qps:
+                self.counters['quota_rejections'] += 1
+                return False
+            self.submit_windows[access_key] = (second, count + 1)
+            return True
+
+    def submit(self, kind, access_key=MOCK_ACCESS_KEY):
+        task_id = uuid.uuid4().hex
+        with self.lock:
+            self.tasks[task_id] = (kind, time.monotonic(), access_key)
+            self.submits_by_account[access_key] += 1
+        return task_id
+
+    def status(self, task_id, access_key=MOCK_ACCESS_KEY):
+        with self.lock:
+            task = self.tasks.get(task_id)
+        if task is None:
+            return 'not_found'
+        if task[2] != access_key:
+            self.count('foreign_task_polls')
+            return 'not_found'
+        elapsed = time.monotonic() - task[1]
+        if elapsed < self.queue_seconds:
+            return 'in_queue'
+        if elapsed < self.queue_seconds + self.generate_seconds:
+            return 'generating'
+        return 'done'
+
+    def inject_error(self):
+        if self.error_rate and random.random() < self.error_rate:
+            self.count('injected_errors')
+            return True
+        return False
+
+    def asset_url(self, name):
+        return f'{self.base_url}/assets/{name}'
+
+
+def error_response(code, message):
+    return {'ResponseMetadata': {'Error': {'Code': code, 'Message': message}}}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None  # 由make_server注入
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 后端提前断开（例如客户端取消了代理下载）
+
+    def do_GET(self):
+        state = self.state
+        state.count('asset_requests')
+        if state.latency:
+            time.sleep(state.latency)
+        path = urlsplit(self.path).path
+        if state.inject_error():
+            self._send(503, b'service unavailable', 'text/plain')
+            return
+        if not path.startswith('/assets/'):
+            self._send(404, b'not found', 'text/plain')
+            return
+        content_type = 'video/mp4' if path.endswith('.mp4') else 'image/png'
+        # /assets/picture-*是真实的图片，其余资源是随机字节
+        asset = state.picture if path.startswith('/assets/picture-') and state.picture else state.asset
+        try:
+            ranges = parse_byte_ranges(self.headers.get('Range'), len(asset))
+        except RangeNotSatisfiable as e:
+            self._send(416, b'', content_type, {'Content-Range': f'bytes */{e.length}'})
+            return
+        if ranges is None or len(ranges) > 1:
+            # 多区间请求按完整内容响应，RFC 7233允许服务端忽略Range
+            self._send(200, asset, content_type)
+            return
+        state.count('range_requests')
+        start, end = ranges[0]
+        self._send(206, asset[start:end + 1], content_type,
+                   {'Content-Range': f'bytes {start}-{end}/{len(asset)}'})
+
+    def do_POST(self):
+        state = self.state
+        state.count('requests')
+        if state.latency:
+            time.sleep(state.latency)
+
+        parts = urlsplit(self.path)
+        content_length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(content_length)
+        if len(body) < content_length:
+            # 客户端在发送请求体途中断开（如压测结束时后端被终止），不计为签名错误
+            self.close_connection = True
+            return
+        if state.inject_error():
+            self._send(503, error_response('ServiceUnavailable', 'injected failure'))
+            return
+        access_key = MOCK_ACCESS_KEY
+        if state.verify_signatures:
+            access_key = state.check_signature('POST', parts.query, self.headers, body)
+            if access_key is None:
+                state.count('bad_signatures')
+                self._send(401, error_response('SignatureDoesNotMatch', 'signature mismatch'))
+                return
+
+        action = parse_qs(parts.query).get('Action', [''])[0]
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            self._send(400, error_response('InvalidParameter', 'body is not JSON'))
+            return
+
+        if action in SUBMIT_ACTIONS:
+            if not state.admit_submit(access_key):
+                self._send(429, {'code': 50429, 'message': 'Request Has Reached API Limit, Please Try Later'})
+                return
+            task_id = state.submit(SUBMIT_ACTIONS[action], access_key)
+            if action.startswith('CV'):
+                self._send(200, {'code': 10000, 'message': 'Success', 'data': {'task_id': task_id}})
+            else:
+                self._send(200, {'ResponseMetadata': {}, 'Result': {'code': 10000, 'data': {'task_id': task_id}}})
+        elif action in RESULT_ACTIONS:
+            task_id = data.get('task_id', '')
+            status = state.status(task_id, access_key)
+            if action == 'CVSync2AsyncGetResult':
+                result = {'status': status}
+                if status == 'done':
+                    result['image_urls'] = [state.asset_url(f'{task_id}.png')]
+                self._send(200, {'code': 10000, 'message': 'Success', 'data': result})
+            else:
+                result = {'status': status}
+                if status == 'done':
+                    result['video_url'] = state.asset_url(f'{task_id}.mp4')
+                self._send(200, {'ResponseMetadata': {}, 'Result': {'code': 10000, 'data': result}})
+        elif action in SYNC_IMAGE_ACTIONS:
+            # 同步生图接口：模拟生成耗时后直接返回图片URL
+            image_urls = [state.asset_url(f'{uuid.uuid4().hex}.png')]
+            if action == 'CVProcess':
+                self._send(200, {'code': 10000, 'message': 'Success',
+                                 'data': {'image_urls': image_urls, 'rephraser_result': data.get('prompt', '')}})
+            else:
+                self._send(200, {'ResponseMetadata': {}, 'Result': {'code': 10000, 'data': {'image_urls': image_urls}}})
+        else:
+            self._send(400, error_response('InvalidActionOrVersion', f'unknown action: {action}'))
+
+
+class MockServer(ThreadingHTTPServer):
+    # 压测时后端会同时建立上百个连接，默认的listen backlog（5）会导致连接被重置
+    request_queue_size = 1024
+
+
+def make_server(state, host='127.0.0.1', port=0):
+    """创建并在后台线程启动模拟服务，返回server；state.base_url会被设置为服务地址"""
+    handler = type('BoundMockHandler', (MockHandler,), {'state': state})
+    server = MockServer((host, port), handler)
+    server.daemon_threads = True
+    state.base_url = f'http://{host}:{server.server_port}'
+    threading.Thread(target=server.serve_forever, name='mock-volcengine', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0, help='每个请求的模拟延迟（毫秒）')
+    parser.add_argument('--queue-seconds', type=float, default=1.0)
+    parser.add_argument('--generate-seconds', type=float, default=2.0)
+    parser.add_argument('--asset-size', type=int, default=1024 * 1024)
+    parser.add_argument('--error-rate', type=float, default=0, help='随机返回503的比例（0-1）')
+    parser.add_argument('--accounts', type=int, default=1, help='模拟的账号数')
+    parser.add_argument('--account-qps', type=int, default=0, help='每个账号每秒受理的提交数，0为不限')
+    args = parser.parse_args()
+
+    state = MockState(args.latency / 1000, args.queue_seconds, args.generate_seconds, args.asset_size,
+                      error_rate=args.error_rate, accounts=args.accounts, account_qps=args.account_qps)
+    make_server(state, port=args.port)
+    print(f'模拟VolcEngine已启动: {state.base_url}')
+    print(f'VOLCENGINE_ENDPOINT={state.base_url} VOLCENGINE_ACCESS_KEY={MOCK_ACCESS_KEY} '
+          f'VOLCENGINE_SECRET_KEY={MOCK_SECRET_KEY}')
+    if args.accounts > 1:
+        print(f"VOLCENGINE_CREDENTIALS='{credentials_json(args.accounts)}'")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
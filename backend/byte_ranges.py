@@ -0,0 +1,116 @@
+"""HTTP Range请求处理 - 单区间与多区间（multipart/byteranges）的206/416响应"""
+import uuid
+
+# 区间数超过该值时忽略Range头返回完整内容，防止构造大量小区间放大开销
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    """所有区间都超出资源长度，应返回416"""
+
+    def __init__(self, length):
+        super().__init__(f'bytes */{length}')
+        self.length = length
+
+
+def parse_byte_ranges(header, length):
+    """将Range头解析为按起点排序、合并重叠后的闭区间列表 [(start, end), ...]
+
+    没有Range头、语法无效或区间过多时返回None，表示按完整内容响应。
+    """
+    # werkzeug的parse_range_header会拒绝乱序或重叠的区间，这里按RFC 7233自行解析
+    if not header:
+        return None
+    units, _, specs = header.partition('=')
+    if units.strip().lower() != 'bytes':
+        return None
+    specs = [spec.strip() for spec in specs.split(',') if spec.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, sep, last = spec.partition('-')
+        first, last = first.strip(), last.strip()
+        if not sep or not (first.isdigit() or (not first and last.isdigit())):
+            return None
+        if last and not last.isdigit():
+            return None
+        if not first:
+            # 后缀区间 bytes=-N
+            suffix = int(last)
+            if suffix and length:
+                ranges.append((max(length - suffix, 0), length - 1))
+            continue
+        start = int(first)
+        end = int(last) if last else None
+        if end is not None and end < start:
+            return None
+        if start < length:
+            ranges.append((start, length - 1 if end is None else min(end, length - 1)))
+    if not ranges:
+        raise RangeNotSatisfiable(length)
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def iter_file_range(f, start, end, chunk_size=65536):
+    f.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = f.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def file_range_response(f, length, content_type, ranges):
+    """从本地文件生成区间响应，返回 (状态码, 响应头, 响应体迭代器)；调用方负责关闭f"""
+    if ranges is None:
+        return 200, {
+            'Content-Type': content_type,
+            'Content-Length': str(length),
+        }, iter_file_range(f, 0, length - 1)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        return 206, {
+            'Content-Type': content_type,
+            'Content-Length': str(end - start + 1),
+            'Content-Range': f'bytes {start}-{end}/{length}',
+        }, iter_file_range(f, start, end)
+
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (
+            f'--{boundary}\r\n'
+            f'Content-Type: {content_type}\r\n'
+            f'Content-Range: bytes {start}-{end}/{length}\r\n\r\n'
+        ).encode('ascii')
+        for start, end in ranges
+    ]
+    closing = f'--{boundary}--\r\n'.encode('ascii')
+    body_length = len(closing) + sum(
+        len(head) + (end - start + 1) + 2 for head, (start, end) in zip(part_headers, ranges)
+    )
+
+    def generate():
+        for head, (start, end) in zip(part_headers, ranges):
+            yield head
+            yield from iter_file_range(f, start, end)
+            yield b'\r\n'
+        yield closing
+
+    return 206, {
+        'Content-Type': f'multipart/byteranges; boundary={boundary}',
+        'Content-Length': str(body_length),
+    }, generate()
@@ -0,0 +1,63 @@
+"""HTTP条件请求 - 强校验器、If-None-Match/If-Modified-Since的304判断与If-Range"""
+import hashlib
+from email.utils import parsedate_to_datetime
+
+# 同一个源URL上的生成结果不会改变：浏览器和前面的CDN可以长期缓存，期间无需再验证
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# 304响应只保留这些头（RFC 7232 4.1）
+NOT_MODIFIED_HEADERS = ('ETag', 'Last-Modified', 'Cache-Control', 'Expires', 'Vary', 'Content-Location')
+
+
+def strong_etag(*parts):
+    """由资源标识（规范化的源URL、派生参数等）计算强ETag；标识相同的资源内容相同"""
+    digest = hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def parse_etags(header):
+    """If-None-Match/If-Match头中的实体标签列表（保留W/前缀）；'*' 原样返回"""
+    tags = []
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag:
+            tags.append(tag)
+    return tags
+
+
+def _opaque(tag):
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def _timestamp(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def is_not_modified(if_none_match, if_modified_since, etag, last_modified=None):
+    """GET的条件判断，成立时应返回304；If-None-Match（弱比较）优先，没有时才看If-Modified-Since"""
+    if if_none_match:
+        tags = parse_etags(if_none_match)
+        return '*' in tags or _opaque(etag) in {_opaque(tag) for tag in tags}
+    if if_modified_since and last_modified:
+        since = _timestamp(if_modified_since)
+        modified = _timestamp(last_modified)
+        return since is not None and modified is not None and modified <= since
+    return False
+
+
+def range_if_matches(if_range, etag, last_modified=None):
+    """If-Range成立（或没有If-Range）时返回True；不成立时应忽略Range返回完整内容"""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # If-Range要求强比较：任一方是弱标签时都不匹配
+        return not if_range.startswith('W/') and not etag.startswith('W/') and if_range == etag
+    return last_modified is not None and _timestamp(if_range) == _timestamp(last_modified)
+
+
+def not_modified_headers(headers):
+    return {name: value for name, value in headers.items() if name in NOT_MODIFIED_HEADERS}
@@ -0,0 +1,245 @@
+"""VolcEngine多账号凭证池 - 每个账号有独立的签名器、准入配额与冷却状态
+
+新请求发往负载最低的可用账号，总吞吐随账号数增加；异步任务只在提交它的账号下可见，
+查询时由调用方指定提交任务的账号。配额超限或鉴权失败的账号在冷却期内不再分配新请求。
+只配置了一个账号时不做冷却，行为与单账号相同。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import json_codec
+import metrics
+from admission import Admission
+from resilience import UpstreamUnavailable
+from signer import VolcEngineSigner
+
+logger = logging.getLogger(__name__)
+
+# 配额超限或限流（HTTP 429）的错误码：该账号冷却，请求由其他账号承接
+QUOTA_ERROR_CODES = frozenset(('50429', '50430', 'FlowLimitExceeded', 'AccountFlowLimitExceeded'))
+# 账号级鉴权失败的错误码：密钥错误或已禁用，与调用哪个接口无关。只按错误码判断，不按401/403状态码，
+# AccessDenied这类按接口授权的错误也不计入：/api/volcengine透传客户端指定的Action，
+# 客户端可以故意调用没有权限的接口，不能因此让账号冷却
+AUTH_ERROR_CODES = frozenset((
+    'InvalidAccessKey', 'SignatureDoesNotMatch', 'InvalidAuthorization', 'InvalidCredential',
+    'MissingAuthenticationToken',
+))
+
+
+class NoCredentialsAvailable(UpstreamUnavailable):
+    """所有账号都在冷却中，调用方应返回503并带上Retry-After"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'所有VolcEngine账号暂时不可用，请 {retry_after:.1f} 秒后重试', retry_after)
+
+
+def error_code(content):
+    """VolcEngine错误响应的错误码（ResponseMetadata.Error.Code或业务code）；无法解析时返回None"""
+    try:
+        data = json_codec.loads(content)
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    error = (data.get('ResponseMetadata') or {}).get('Error') or {}
+    code = error.get('Code', data.get('code'))
+    return str(code) if code is not None else None
+
+
+def rejection_reason(status_code, content):
+    """上游因账号原因拒绝请求时返回'quota'或'auth'，否则返回None；成功的响应不解析响应体"""
+    if status_code < 400:
+        return None
+    code = error_code(content)
+    if status_code == 429 or code in QUOTA_ERROR_CODES:
+        return 'quota'
+    if code in AUTH_ERROR_CODES:
+        return 'auth'
+    return None
+
+
+def account_name(access_key):
+    """未指定name时的账号名：access_key的哈希前缀，记录在任务表和指标中，不暴露密钥本身"""
+    return hashlib.sha256(access_key.encode('utf-8')).hexdigest()[:8]
+
+
+class Account:
+    """一个VolcEngine账号：签名器缓存该账号的签名密钥，准入控制按该账号的配额计数"""
+
+    def __init__(self, name, signer, admission):
+        self.name = name
+        self.signer = signer
+        self.admission = admission
+        self.cooldown_until = 0.0
+        self.cooldown_reason = None
+        self.quota_strikes = 0  # 两次成功请求之间连续几轮配额冷却，每轮冷却时间加倍
+        self.counters = {'requests': 0, 'quota_errors': 0, 'auth_errors': 0, 'cooldowns': 0}
+
+    def available(self, now):
+        return now >= self.cooldown_until
+
+
+class CredentialPool:
+    """账号列表中第一个账号用于没有账号记录的任务（启用凭证池之前提交的任务）
+
+    配额冷却从quota_cooldown秒开始，冷却结束后仍然超限（如日配额已用完）时加倍，最长quota_cooldown_max秒，
+    该账号的请求再次成功后从头计算；
+    鉴权失败需要人工处理，固定冷却auth_cooldown秒。所有账号都在冷却时，新请求最多等待max_wait秒。
+    """
+
+    def __init__(self, accounts, quota_cooldown=1.0, quota_cooldown_max=60.0, auth_cooldown=300.0, max_wait=5.0):
+        if not accounts:
+            raise ValueError('至少需要配置一个VolcEngine账号')
+        self.accounts = list(accounts)
+        self._by_name = {account.name: account for account in self.accounts}
+        if len(self._by_name) != len(self.accounts):
+            raise ValueError('VolcEngine账号名重复')
+        self.quota_cooldown = quota_cooldown
+        self.quota_cooldown_max = quota_cooldown_max
+        self.auth_cooldown = auth_cooldown
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, region, service, host):
+        """VOLCENGINE_CREDENTIALS为JSON列表，每项可以用limits单独设置该账号的准入配额，例如
+        [{"name": "a", "access_key": "AK...", "secret_key": "..."},
+         {"name": "b", "access_key": "AK...", "secret_key": "...", "limits": {"CVProcess": {"qps": 5}}}]
+
+        未设置时使用VOLCENGINE_ACCESS_KEY/VOLCENGINE_SECRET_KEY这一个账号。
+        """
+        entries = json.loads(os.getenv('VOLCENGINE_CREDENTIALS', '[]'))
+        if not entries:
+            entries = [{
+                'name': 'default',
+                'access_key': os.getenv('VOLCENGINE_ACCESS_KEY'),
+                'secret_key': os.getenv('VOLCENGINE_SECRET_KEY'),
+            }]
+        accounts = [
+            Account(
+                entry.get('name') or account_name(entry['access_key']),
+                VolcEngineSigner(entry['access_key'], entry['secret_key'], region, service, host),
+                Admission.from_env(entry.get('limits')),
+            )
+            for entry in entries
+        ]
+        return cls(
+            accounts,
+            quota_cooldown=float(os.getenv('CREDENTIAL_QUOTA_COOLDOWN', '1')),
+            quota_cooldown_max=float(os.getenv('CREDENTIAL_QUOTA_COOLDOWN_MAX', '60')),
+            auth_cooldown=float(os.getenv('CREDENTIAL_AUTH_COOLDOWN', '300')),
+            max_wait=float(os.getenv('CREDENTIAL_MAX_WAIT', '5')),
+        )
+
+    @property
+    def multiple(self):
+        return len(self.accounts) > 1
+
+    @property
+    def primary(self):
+        return self.accounts[0]
+
+    def _try_choose(self, action, name, deadline):
+        """返回 (账号, None)，或所有账号都在冷却时返回 (None, 等待秒数)；等不到时抛出NoCredentialsAvailable"""
+        if name is not None:
+            account = self._by_name.get(name)
+            if account is not None:
+                return account, None
+            logger.warning('任务所属的账号 %s 不在配置中，改用其他账号', name)
+        account = self.next_account(action)
+        if account is not None:
+            return account, None
+        now = time.monotonic()
+        delay = min(a.cooldown_until for a in self.accounts) - now
+        if delay > self.max_wait or (deadline is not None and now + delay >= deadline):
+            raise NoCredentialsAvailable(delay)
+        return None, delay
+
+    def choose(self, action, name=None, deadline=None):
+        """选择发送请求的账号：name为提交任务的账号（查询任务时），不论是否在冷却都使用它；
+        否则返回可用账号中负载最低的一个。所有账号都在冷却时等待最早恢复的账号，
+        等待时间超过max_wait或请求的截止时间（time.monotonic()时间点）时抛出NoCredentialsAvailable
+        """
+        while True:
+            account, delay = self._try_choose(action, name, deadline)
+            if account is not None:
+                return account
+            time.sleep(delay)
+
+    async def choose_async(self, action, name=None, deadline=None):
+        """choose的协程版本，等待期间不阻塞事件循环"""
+        while True:
+            account, delay = self._try_choose(action, name, deadline)
+            if account is not None:
+                return account
+            await asyncio.sleep(delay)
+
+    def next_account(self, action):
+        """可用账号中负载最低的一个（按该Action的在途与排队请求数），都在冷却时返回None"""
+        if not self.multiple:
+            return self.primary
+        now = time.monotonic()
+        candidates = [a for a in self.accounts if a.available(now)]
+        if not candidates:
+            return None
+        # 负载相同时选累计请求数最少的账号，空闲时各账号轮流使用
+        return min(candidates, key=lambda a: (a.admission.limiter(action).load(), a.counters['requests']))
+
+    def record(self, account, status_code, content):
+        """记录上游对该账号请求的响应；配额超限或鉴权失败时账号进入冷却，返回原因（'quota'/'auth'），否则返回None"""
+        reason = rejection_reason(status_code, content)
+        metrics.credential_requests.inc(account.name, reason or 'ok')
+        with self._lock:
+            account.counters['requests'] += 1
+            if reason is None:
+                account.quota_strikes = 0
+                return None
+            account.counters[f'{reason}_errors'] += 1
+            if not self.multiple:
+                return reason
+            now = time.monotonic()
+            if reason == 'auth':
+                until = now + self.auth_cooldown
+            elif account.available(now):
+                account.quota_strikes += 1
+                until = now + min(self.quota_cooldown_max, self.quota_cooldown * 2 ** (account.quota_strikes - 1))
+            else:
+                return reason  # 冷却开始前已发出的请求，不再延长本轮冷却
+            if until <= account.cooldown_until:
+                return reason
+            if account.available(now):
+                account.counters['cooldowns'] += 1
+            account.cooldown_until = until
+            account.cooldown_reason = reason
+        logger.warning('VolcEngine账号 %s %s，暂停分配新请求 %.1f 秒',
+                       account.name, '配额超限' if reason == 'quota' else '鉴权失败', until - now)
+        return reason
+
+    def stats(self):
+        now = time.monotonic()
+        by_account = {}
+        with self._lock:
+            for account in self.accounts:
+                available = account.available(now)
+                by_account[account.name] = dict(
+                    account.counters,
+                    available=available,
+                    cooldown_reason=None if available else account.cooldown_reason,
+                    cooldown_remaining=0.0 if available else round(account.cooldown_until - now, 1),
+                    admission=account.admission.stats(),
+                )
+        totals = {
+            counter: sum(stats[counter] for stats in by_account.values())
+            for counter in ('requests', 'quota_errors', 'auth_errors', 'cooldowns')
+        }
+        return dict(
+            totals,
+            accounts=len(by_account),
+            available=sum(1 for stats in by_account.values() if stats['available']),
+            by_account=by_account,
+        )
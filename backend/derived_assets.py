@@ -0,0 +1,222 @@
+"""派生资源 - 生成结果的缩略图（缩放、转码）和视频封面帧，每个派生资源只生成一次
+
+解码、缩放、编码和ffmpeg抽帧都是CPU密集型操作，在有界线程池中执行：Pillow在解码、缩放和编码时释放GIL，
+ffmpeg本身是子进程。不用进程池：spawn出的子进程会把 python app.py 作为__mp_main__重新导入，
+重复执行模块级初始化（打开任务库、清理缓存目录等）。
+结果写入独立的磁盘缓存（按字节预算LRU淘汰），相同派生资源同时只有一个渲染在途。
+依赖Pillow（可选），封面帧另外需要ffmpeg；缺失时对应功能关闭。
+"""
+import io
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow未安装时关闭派生资源
+    Image = None
+
+from asset_cache import AssetCache, cache_key, normalize_url
+from conditional import strong_etag
+
+logger = logging.getLogger(__name__)
+
+# 允许的缩略图宽度；请求的宽度向上取整到其中之一，避免任意宽度把缓存撑满
+VARIANT_WIDTHS = (160, 320, 480, 640, 960, 1280, 1920)
+# 格式参数 -> (Pillow格式, Content-Type)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+}
+POSTER_TIMEOUT = 30
+
+
+def snap_width(width):
+    """向上取整到允许的宽度，超过最大值时取最大值"""
+    for allowed in VARIANT_WIDTHS:
+        if width <= allowed:
+            return allowed
+    return VARIANT_WIDTHS[-1]
+
+
+def encode_variant(img, width, fmt, quality):
+    """按宽度等比缩小（不放大）并编码为fmt，返回字节"""
+    img = ImageOps.exif_transpose(img)
+    if width and img.width > width:
+        height = max(1, round(img.height * width / img.width))
+        img = img.resize((width, height), Image.LANCZOS)
+    pil_format = FORMATS[fmt][0]
+    has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+    if pil_format == 'JPEG' or not has_alpha:
+        img = img.convert('RGB')
+    elif img.mode != 'RGBA':
+        img = img.convert('RGBA')
+    buf = io.BytesIO()
+    img.save(buf, format=pil_format, quality=quality, optimize=True)
+    return buf.getvalue()
+
+
+def render_image_variant(data, width, fmt, quality):
+    """线程池中执行：原图字节 -> 缩略图字节"""
+    with Image.open(io.BytesIO(data)) as img:
+        return encode_variant(img, width, fmt, quality)
+
+
+def render_poster_frame(data, width, fmt, quality, ffmpeg, timeout):
+    """线程池中执行：视频字节 -> 封面帧字节；用thumbnail滤镜在开头的帧中挑选有代表性的一帧，避开黑场"""
+    with tempfile.NamedTemporaryFile(suffix='.mp4') as source:
+        source.write(data)
+        source.flush()
+        frame = subprocess.run(
+            [ffmpeg, '-v', 'error', '-i', source.name, '-vf', 'thumbnail=50', '-frames:v', '1',
+             '-f', 'image2pipe', '-vcodec', 'png', '-'],
+            capture_output=True, timeout=timeout, check=True,
+        ).stdout
+    if not frame:
+        raise RuntimeError('视频中没有可用的帧')
+    with Image.open(io.BytesIO(frame)) as img:
+        return encode_variant(img, width, fmt, quality)
+
+
+class DerivedAssets:
+    """派生资源缓存；源资源由调用方的load_source()读取（通常已在资源缓存或本地结果中）"""
+
+    def __init__(self, cache, workers=2, quality=80, ffmpeg=None):
+        self.cache = cache
+        self.workers = workers
+        self.quality = quality
+        self.ffmpeg = ffmpeg
+        self._pid = None
+        self._executor = None
+        self._in_flight = {}  # 派生资源键 -> Future(渲染结果字节)
+        self._lock = threading.Lock()
+        self._counters = {
+            'hits': 0, 'misses': 0, 'coalesced': 0, 'rendered': 0, 'failed': 0,
+            'bytes_in': 0, 'bytes_out': 0, 'seconds': 0.0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        default_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'derived')
+        return cls(
+            AssetCache(
+                os.getenv('DERIVED_CACHE_DIR', default_root),
+                int(os.getenv('DERIVED_CACHE_MAX_BYTES', str(512 * 1024 * 1024))),
+            ),
+            workers=int(os.getenv('DERIVED_WORKERS', '2')),
+            quality=int(os.getenv('DERIVED_QUALITY', '80')),
+            ffmpeg=os.getenv('FFMPEG_PATH') or shutil.which('ffmpeg'),
+        )
+
+    @property
+    def enabled(self):
+        return Image is not None and self.workers > 0
+
+    @property
+    def posters_enabled(self):
+        return self.enabled and bool(self.ffmpeg)
+
+    def _executor_for_process(self):
+        # 线程不会随fork复制，每个worker进程各自创建线程池
+        pid = os.getpid()
+        with self._lock:
+            if self._pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='derived')
+                self._in_flight = {}
+                self._pid = pid
+            return self._executor
+
+    @staticmethod
+    def _variant(width, fmt, poster):
+        return f'{"poster&" if poster else ""}w={width}&f={fmt}'
+
+    def etag(self, url, width, fmt, poster=False):
+        """派生资源的强ETag，不需要先生成资源；编码质量变化后ETag随之变化"""
+        return strong_etag('derived', normalize_url(url), self._variant(width, fmt, poster), str(self.quality))
+
+    def image_variant(self, url, width, fmt, load_source):
+        """返回 (文件对象, 字节数, Content-Type, 是否命中缓存)；load_source()返回原图字节"""
+        return self._get(
+            url, self._variant(width, fmt, False), fmt, load_source,
+            render_image_variant, (width, fmt, self.quality),
+        )
+
+    def poster(self, url, width, fmt, load_source):
+        """视频封面帧，返回值同image_variant；load_source()返回视频字节"""
+        return self._get(
+            url, self._variant(width, fmt, True), fmt, load_source,
+            render_poster_frame, (width, fmt, self.quality, self.ffmpeg, POSTER_TIMEOUT),
+        )
+
+    def _get(self, url, variant, fmt, load_source, render, args):
+        key = f'derived://{cache_key(url)}/{variant}&q={self.quality}'  # 缓存按这个伪URL寻址
+        content_type = FORMATS[fmt][1]
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count('hits')
+            return cached.file, cached.size, content_type, True
+
+        executor = self._executor_for_process()
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        if not owner:
+            self._count('coalesced')
+            data = future.result()
+        else:
+            self._count('misses')
+            try:
+                data = self._render(executor, key, content_type, load_source, render, args)
+            except BaseException as e:
+                logger.warning('派生资源生成失败 %s: %s', key, e)
+                self._count('failed')
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(data)
+            finally:
+                with self._lock:
+                    self._in_flight.pop(key, None)
+        return io.BytesIO(data), len(data), content_type, False
+
+    def _render(self, executor, key, content_type, load_source, render, args):
+        source = load_source()
+        start = time.perf_counter()
+        data = executor.submit(render, source, *args).result()
+        elapsed = time.perf_counter() - start
+        writer = self.cache.writer(key, content_type, len(data))
+        if writer is not None:
+            writer.write(data)
+            writer.commit()
+        with self._lock:
+            self._counters['rendered'] += 1
+            self._counters['bytes_in'] += len(source)
+            self._counters['bytes_out'] += len(data)
+            self._counters['seconds'] += elapsed
+        return data
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        cache_stats = self.cache.stats()
+        stats.update(
+            enabled=self.enabled,
+            posters_enabled=self.posters_enabled,
+            entries=cache_stats['entries'],
+            bytes=cache_stats['bytes'],
+            max_bytes=cache_stats['max_bytes'],
+            evictions=cache_stats['evictions'],
+        )
+        return stats
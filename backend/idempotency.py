@@ -0,0 +1,125 @@
+"""提交任务接口的幂等键 - Idempotency-Key对应首次提交的响应，记录在任务库中，多个worker进程共享
+
+重复请求直接返回首次提交的响应；首次提交仍在处理时（可能在另一个进程中）等待它完成。
+首次提交失败（非200）时释放键，客户端可以用同一个键重试。同一个键换了请求内容时拒绝（422）。
+"""
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+
+from resilience import UpstreamUnavailable, remaining
+
+
+class IdempotencyInProgress(UpstreamUnavailable):
+    """相同Idempotency-Key的请求在时间预算内没有完成，调用方应返回409并带上Retry-After"""
+
+    status_code = 409
+
+    def __init__(self, key, retry_after):
+        super().__init__(f'Idempotency-Key {key} 的请求仍在处理中，请稍后重试', retry_after)
+        self.key = key
+
+
+class IdempotencyKeyReused(ValueError):
+    """同一个Idempotency-Key被用于不同的接口或不同的请求内容"""
+
+
+def body_hash(body, content_type=''):
+    """请求体摘要，用于识别同一个键被用于不同的请求；multipart的分隔符每次提交随机生成，计算前去掉"""
+    _, _, boundary = (content_type or '').partition('boundary=')
+    boundary = boundary.split(';')[0].strip().strip('"')
+    if boundary:
+        body = body.replace(boundary.encode('latin-1'), b'')
+    return hashlib.sha256(body).hexdigest()
+
+
+class Claim:
+    """一次幂等请求的处理权：token非空表示由本请求提交，response非空表示直接返回已有响应"""
+
+    __slots__ = ('key', 'token', 'response', 'status_code')
+
+    def __init__(self, key, token=None, response=None, status_code=None):
+        self.key = key
+        self.token = token
+        self.response = response
+        self.status_code = status_code
+
+
+class Idempotency:
+    """ttl为键的保留时间；lease为首次请求的占用期限，超过后视为原请求已失败，其他请求可以接管"""
+
+    def __init__(self, store, ttl=86400.0, lease=120.0, poll_interval=0.1):
+        self.store = store
+        self.ttl = ttl
+        self.lease = lease
+        self.poll_interval = poll_interval
+
+    @classmethod
+    def from_env(cls, store):
+        return cls(
+            store,
+            ttl=float(os.getenv('IDEMPOTENCY_TTL', '86400')),
+            lease=float(os.getenv('IDEMPOTENCY_LEASE', '120')),
+        )
+
+    def _try_claim(self, key, scope, digest):
+        """返回Claim；首次请求仍在处理时返回None"""
+        record = self.store.get_idempotency_key(key)
+        now = time.time() * 1000
+        usable = record is not None and record['expires_at'] >= now
+        if not usable or (record['response'] is None and record['lease_until'] < now):
+            token = uuid.uuid4().hex
+            record = self.store.claim_idempotency_key(
+                key, scope, token, digest, int(self.lease * 1000), int(self.ttl * 1000)
+            )
+            if record is None:
+                return Claim(key)  # 任务库不可用时按普通请求处理
+            if record['token'] == token:
+                return Claim(key, token)
+        if record['scope'] != scope:
+            raise IdempotencyKeyReused(f'Idempotency-Key {key} 已用于 {record["scope"]}')
+        # 旧记录没有摘要，不做比较
+        if record['body_hash'] is not None and record['body_hash'] != digest:
+            raise IdempotencyKeyReused(f'Idempotency-Key {key} 已用于内容不同的请求')
+        if record['response'] is not None:
+            return Claim(key, response=record['response'], status_code=record['status_code'])
+        return None
+
+    def _wait_time(self, key, deadline):
+        left = remaining(deadline)
+        if left is not None and left <= self.poll_interval:
+            raise IdempotencyInProgress(key, 1.0)
+        return self.poll_interval
+
+    def claim(self, key, scope, digest, deadline=None):
+        """占用键或取得已有响应；digest为body_hash计算的请求体摘要。
+        首次请求仍在处理时等待，超出时间预算时抛出IdempotencyInProgress；键已用于其他请求时抛出IdempotencyKeyReused
+        """
+        while True:
+            claim = self._try_claim(key, scope, digest)
+            if claim is not None:
+                return claim
+            time.sleep(self._wait_time(key, deadline))
+
+    async def claim_async(self, key, scope, digest, deadline=None):
+        """协程版本：占用键的SQLite事务（BEGIN IMMEDIATE可能等锁）在线程中执行，等待期间只占用协程"""
+        while True:
+            claim = await asyncio.to_thread(self._try_claim, key, scope, digest)
+            if claim is not None:
+                return claim
+            await asyncio.sleep(self._wait_time(key, deadline))
+
+    def finish(self, claim, status_code, response):
+        """记录本请求提交的结果：成功时保存响应，失败时释放键"""
+        if claim.token is None:
+            return
+        if status_code == 200:
+            self.store.complete_idempotency_key(claim.key, claim.token, response, status_code)
+        else:
+            self.store.release_idempotency_key(claim.key, claim.token)
+
+    def abort(self, claim):
+        if claim.token is not None:
+            self.store.release_idempotency_key(claim.key, claim.token)
@@ -0,0 +1,114 @@
+"""上传图片预处理 - 按模型最大分辨率缩放并重新压缩后再转发给VolcEngine
+
+依赖Pillow（可选）；未安装或关闭时图片原样转发。
+"""
+import base64
+import binascii
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow未安装时关闭预处理
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# 各模型输入图片的最长边上限，超过的部分只会增加上传时间
+MAX_SIDES = {
+    'jimeng_vgfm_i2v_l20': 1920,
+    'high_aes_scheduler_svr_controlnet_v2.0': 1024,
+    'seededit_v3.0': 2048,
+}
+DEFAULT_MAX_SIDE = 2048
+
+
+class ImageNormalizer:
+    """在线程池中解码、缩放、重新编码上传图片，统计节省的字节数与耗时"""
+
+    def __init__(self, enabled=True, workers=2, quality=88, min_bytes=512 * 1024,
+                 max_sides=None):
+        self.enabled = enabled and Image is not None
+        self.quality = quality
+        self.min_bytes = min_bytes  # 小于该大小且分辨率未超限的图片不处理
+        self.max_sides = dict(MAX_SIDES if max_sides is None else max_sides)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-normalize')
+        self._lock = threading.Lock()
+        self._counters = {
+            'images': 0, 'normalized': 0, 'bytes_in': 0, 'bytes_out': 0, 'seconds': 0.0,
+        }
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=os.getenv('IMAGE_NORMALIZE', '1') != '0',
+            workers=int(os.getenv('IMAGE_NORMALIZE_WORKERS', '2')),
+            quality=int(os.getenv('IMAGE_NORMALIZE_QUALITY', '88')),
+            min_bytes=int(os.getenv('IMAGE_NORMALIZE_MIN_BYTES', str(512 * 1024))),
+        )
+
+    def normalize(self, image, req_key):
+        """image为base64字符串或可seek的二进制流，返回同类型的（可能已压缩的）图片"""
+        if not self.enabled or not image:
+            return image
+        max_side = self.max_sides.get(req_key, DEFAULT_MAX_SIDE)
+        if isinstance(image, str):
+            try:
+                raw = base64.b64decode(image, validate=True)
+            except (binascii.Error, ValueError):
+                return image
+            result = self._executor.submit(self._process, io.BytesIO(raw), max_side).result()
+            return image if result is None else base64.b64encode(result).decode('ascii')
+        result = self._executor.submit(self._process, image, max_side).result()
+        if result is None:
+            image.seek(0)
+            return image
+        return io.BytesIO(result)
+
+    def _process(self, stream, max_side):
+        """返回重新编码后的字节；无需处理或结果不更小时返回None"""
+        start = time.perf_counter()
+        stream.seek(0, 2)
+        size = stream.tell()
+        stream.seek(0)
+        output = None
+        try:
+            with Image.open(stream) as img:
+                if size >= self.min_bytes or max(img.size) > max_side:
+                    output = self._encode(img, max_side)
+        except Exception as e:
+            logger.warning('图片预处理失败，原样转发: %s', e)
+        elapsed = time.perf_counter() - start
+
+        if output is not None and len(output) >= size:
+            output = None
+        with self._lock:
+            self._counters['images'] += 1
+            self._counters['bytes_in'] += size
+            self._counters['bytes_out'] += size if output is None else len(output)
+            self._counters['seconds'] += elapsed
+            if output is not None:
+                self._counters['normalized'] += 1
+        return output
+
+    def _encode(self, img, max_side):
+        img = ImageOps.exif_transpose(img)  # 手机照片依赖EXIF方向，去掉EXIF前先转正
+        if max(img.size) > max_side:
+            img.thumbnail((max_side, max_side), Image.LANCZOS)
+        buf = io.BytesIO()
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        if has_alpha:
+            img.save(buf, format='PNG', optimize=True)
+        else:
+            img.convert('RGB').save(buf, format='JPEG', quality=self.quality, optimize=True)
+        return buf.getvalue()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters, enabled=self.enabled)
+        stats['bytes_saved'] = stats['bytes_in'] - stats['bytes_out']
+        return stats
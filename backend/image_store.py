@@ -0,0 +1,197 @@
+"""上传图片的内容寻址存储 - 同一张原图只上传一次，之后的生成请求用image_ref引用
+
+图片按原始字节的SHA-256命名，以base64文本存放在磁盘上，多个worker进程共用同一目录，按字节预算LRU淘汰。
+按模型预处理（缩放、压缩）后的base64在内存中保留，反复修改同一张图时不再重复解码和编码。
+"""
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from asset_cache import remove_stale_part
+
+logger = logging.getLogger(__name__)
+
+REF_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+class StoredImage:
+    """通过image_ref取出的图片，base64为上传时编码好的字符串"""
+
+    __slots__ = ('ref', 'base64')
+
+    def __init__(self, ref, base64_text):
+        self.ref = ref
+        self.base64 = base64_text
+
+
+class ImageStore:
+    """磁盘上的LRU存储，文件 <ref>.b64 为图片的base64文本；预处理结果按 (ref, req_key) 缓存在内存中"""
+
+    def __init__(self, root, max_bytes, variant_bytes=128 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.variant_bytes = variant_bytes
+        self._entries = OrderedDict()  # ref -> base64文本的字节数，按最近使用排序
+        self._bytes = 0
+        self._variants = OrderedDict()  # (ref, req_key) -> 预处理后的base64
+        self._variant_total = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            'uploads': 0, 'deduplicated': 0, 'hits': 0, 'misses': 0, 'evictions': 0,
+            'variant_hits': 0, 'variant_misses': 0,
+        }
+        if self.enabled:
+            os.makedirs(root, exist_ok=True)
+            self._load()
+
+    @classmethod
+    def from_env(cls):
+        default_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'images')
+        return cls(
+            os.getenv('IMAGE_STORE_DIR', default_root),
+            int(os.getenv('IMAGE_STORE_MAX_BYTES', str(1024 ** 3))),
+            variant_bytes=int(os.getenv('IMAGE_STORE_VARIANT_BYTES', str(128 * 1024 * 1024))),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def _path(self, ref):
+        return os.path.join(self.root, f'{ref}.b64')
+
+    def _load(self):
+        """启动时按最近使用时间恢复LRU顺序，清理残留的临时文件"""
+        found = []
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith('.part'):
+                # 多个worker进程共用目录，只清理写入进程已退出后残留的
+                remove_stale_part(path, now)
+            elif name.endswith('.b64') and REF_PATTERN.fullmatch(name[:-len('.b64')]):
+                stat = os.stat(path)
+                found.append((stat.st_mtime, name[:-len('.b64')], stat.st_size))
+        for _, ref, size in sorted(found):
+            self._entries[ref] = size
+            self._bytes += size
+        with self._lock:
+            self._evict_locked()
+
+    def put(self, image):
+        """保存图片（base64字符串或二进制流），返回 (image_ref, 原始字节数)；base64不合法时抛出ValueError"""
+        if isinstance(image, str):
+            try:
+                raw = base64.b64decode(image, validate=True)
+            except binascii.Error as e:
+                raise ValueError('图片不是有效的base64') from e
+        else:
+            raw = image.read()
+        if not raw:
+            raise ValueError('图片为空')
+        ref = hashlib.sha256(raw).hexdigest()
+        path = self._path(ref)
+        with self._lock:
+            self._counters['uploads'] += 1
+            known = ref in self._entries
+        if known or os.path.exists(path):
+            # 同一张图已经上传过（可能是其他worker进程），只刷新最近使用时间
+            self._adopt(ref, path)
+            with self._lock:
+                self._counters['deduplicated'] += 1
+            return ref, len(raw)
+        text = base64.b64encode(raw)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.part'
+        with open(tmp_path, 'wb') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._add_locked(ref, len(text))
+        return ref, len(raw)
+
+    def _adopt(self, ref, path):
+        """把磁盘上已有的文件登记到本进程的LRU，文件已被淘汰时返回False"""
+        try:
+            os.utime(path)  # 用mtime记录最近使用时间，重启后恢复LRU顺序
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            self._add_locked(ref, size)
+        return True
+
+    def _add_locked(self, ref, size):
+        old = self._entries.pop(ref, None)
+        if old is not None:
+            self._bytes -= old
+        self._entries[ref] = size
+        self._bytes += size
+        self._evict_locked()
+
+    def _evict_locked(self):
+        while self._bytes > self.max_bytes and self._entries:
+            ref, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._counters['evictions'] += 1
+            try:
+                os.remove(self._path(ref))
+            except FileNotFoundError:
+                pass
+
+    def get(self, ref):
+        """按image_ref取出图片，返回StoredImage；不存在或已被淘汰时返回None"""
+        if not self.enabled or not isinstance(ref, str) or not REF_PATTERN.fullmatch(ref):
+            return None
+        path = self._path(ref)
+        try:
+            with open(path, 'rb') as f:
+                text = f.read().decode('ascii')
+        except FileNotFoundError:
+            text = None
+        if text is not None and not self._adopt(ref, path):
+            text = None  # 读取后被并发淘汰，按未命中处理
+        with self._lock:
+            self._counters['hits' if text is not None else 'misses'] += 1
+        return StoredImage(ref, text) if text is not None else None
+
+    def normalized(self, image, req_key, normalize, enabled=True):
+        """返回StoredImage按req_key预处理后的base64；normalize为 (base64, req_key) -> base64。
+        预处理关闭时原样返回，不占用预处理结果的缓存"""
+        if not enabled:
+            return image.base64
+        key = (image.ref, req_key)
+        with self._lock:
+            result = self._variants.get(key)
+            if result is not None:
+                self._variants.move_to_end(key)
+                self._counters['variant_hits'] += 1
+                return result
+            self._counters['variant_misses'] += 1
+        result = normalize(image.base64, req_key)
+        with self._lock:
+            if key not in self._variants and len(result) <= self.variant_bytes:
+                self._variants[key] = result
+                self._variant_total += len(result)
+                while self._variant_total > self.variant_bytes:
+                    _, evicted = self._variants.popitem(last=False)
+                    self._variant_total -= len(evicted)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return dict(
+                self._counters,
+                enabled=self.enabled,
+                images=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                variants=len(self._variants),
+                variant_bytes=self._variant_total,
+            )
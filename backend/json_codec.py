@@ -0,0 +1,27 @@
+"""JSON编解码 - 安装了orjson时使用orjson，否则回退到标准库json
+
+接口统一以bytes为输出（loads同时接受bytes和str），请求体、上游请求与响应都不经过str中转。
+orjson直接输出UTF-8；标准库保持ensure_ascii（转义非ASCII字符比输出UTF-8更快），两者都是紧凑格式。
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson未安装时使用标准库
+    orjson = None
+
+NAME = 'orjson' if orjson is not None else 'json'
+
+
+if orjson is not None:
+    def dumps(obj):
+        return orjson.dumps(obj)
+
+    def loads(data):
+        return orjson.loads(data)
+else:
+    def dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode('ascii')
+
+    def loads(data):
+        return json.loads(data)
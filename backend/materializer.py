@@ -0,0 +1,206 @@
+"""生成结果本地化 - 任务完成后在后台把上游的结果文件下载到本地，状态接口返回稳定的本地URL
+
+上游返回的签名URL会过期；本地副本不参与LRU淘汰，作品库中的旧结果始终可用，首次播放也直接读本地文件。
+下载在有界线程池中进行，总速率受带宽预算限制；多个worker进程通过任务库中的记录协调，同一结果只下载一次。
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from asset_cache import cache_key
+from task_store import now_ms
+
+logger = logging.getLogger(__name__)
+
+# 结果URL中可以保留的扩展名；其余（如CDN的 ~tplv-xxx.image）按任务类型决定
+KNOWN_EXTENSIONS = {'.mp4', '.png', '.jpg', '.jpeg', '.webp', '.gif'}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class BandwidthLimiter:
+    """所有下载线程共用的字节速率上限；rate为0时不限速"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size):
+        """登记size字节，在这些字节的发送时段开始前等待"""
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + size / self.rate
+        if start > now:
+            time.sleep(start - now)
+
+
+class ResultMaterializer:
+    """fetch(url)返回流式的requests.Response（由调用方选择请求头和超时）；文件名为源URL的哈希加扩展名"""
+
+    def __init__(self, store, root, fetch, base_url, workers=2, bandwidth=0, stale_after=600.0, retry_after=10.0):
+        self.store = store
+        self.root = root
+        self.fetch = fetch
+        self.base_url = base_url.rstrip('/')
+        self.workers = workers
+        self.limiter = BandwidthLimiter(bandwidth)
+        self.stale_after = stale_after
+        self.retry_after = retry_after
+        self._known = set()  # 本进程已登记过的文件名，避免每次状态查询都写库
+        self._pending = set()  # 本进程已排队或正在下载的文件名，同一结果不重复排队
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._counters = {'queued': 0, 'downloaded': 0, 'failed': 0, 'bytes': 0}
+        if self.enabled:
+            os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, store, fetch):
+        default_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'results')
+        return cls(
+            store,
+            os.getenv('RESULT_STORE_DIR', default_root),
+            fetch,
+            os.getenv('PUBLIC_BASE_URL', 'http://localhost:5000'),
+            workers=int(os.getenv('MATERIALIZE_WORKERS', '2')),
+            bandwidth=int(os.getenv('MATERIALIZE_BANDWIDTH', str(20 * 1024 * 1024))),
+            retry_after=float(os.getenv('MATERIALIZE_RETRY_AFTER', '10')),
+        )
+
+    @property
+    def enabled(self):
+        return self.workers > 0
+
+    @property
+    def url_prefix(self):
+        return f'{self.base_url}/api/results/'
+
+    def _executor_for_process(self):
+        # 与流水线相同，fork出的worker进程各自创建线程池
+        pid = os.getpid()
+        with self._lock:
+            if self._pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='materialize')
+                self._known = set()
+                self._pending = set()
+                self._pid = pid
+            return self._executor
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    @staticmethod
+    def name_for(url, default_ext):
+        ext = os.path.splitext(urlsplit(url).path)[1].lower()
+        return cache_key(url) + (ext if ext in KNOWN_EXTENSIONS else default_ext)
+
+    def materialize(self, url, default_ext):
+        """登记结果并在后台开始下载，返回稳定的本地URL；关闭时原样返回url"""
+        if not self.enabled or not url or url.startswith(self.url_prefix):
+            return url
+        name = self.name_for(url, default_ext)
+        executor = self._executor_for_process()
+        with self._lock:
+            known = name in self._known
+            self._known.add(name)
+        if not known:
+            self.store.add_result(name, url)
+            self._submit(executor, name, url)
+        return self.url_prefix + name
+
+    def _submit(self, executor, name, url):
+        with self._lock:
+            if name in self._pending:
+                return
+            self._pending.add(name)
+            self._counters['queued'] += 1
+        executor.submit(self._download, name, url)
+
+    def retry(self, record):
+        """下载失败或执行下载的进程已退出时重新排队（由结果文件路由在回源时调用）；
+        其他进程正在下载、或失败后不到retry_after秒时不排队，本次请求只回源"""
+        if not self.enabled or record['status'] == 'done':
+            return
+        age = now_ms() - record['updated_at']
+        if record['status'] == 'downloading' and age < self.stale_after * 1000:
+            return
+        if record['status'] == 'failed' and age < self.retry_after * 1000:
+            return
+        self._submit(self._executor_for_process(), record['name'], record['url'])
+
+    def get(self, name):
+        return self.store.get_result(name)
+
+    def record_for_url(self, url):
+        """本地结果URL对应的记录；不是本地结果URL时返回None"""
+        if not url or not url.startswith(self.url_prefix):
+            return None
+        return self.get(url[len(self.url_prefix):])
+
+    def open(self, record):
+        """已下载完成时返回 (文件对象, 字节数)，否则返回None"""
+        if record['status'] != 'done':
+            return None
+        try:
+            f = open(self.path(record['name']), 'rb')
+        except FileNotFoundError:
+            return None
+        return f, os.fstat(f.fileno()).st_size
+
+    def _download(self, name, url):
+        try:
+            if not self.store.claim_result(name, int(self.stale_after * 1000), int(self.retry_after * 1000)):
+                return  # 已下载完成，或其他进程正在下载
+            try:
+                content_type, size = self._fetch_to_file(name, url)
+            except Exception as e:
+                logger.warning('结果文件下载失败 %s: %s', url, e)
+                self.store.finish_result(name, 'failed')
+                self._count('failed')
+                return
+            self.store.finish_result(name, 'done', content_type, size)
+            self._count('downloaded')
+        finally:
+            with self._lock:
+                self._pending.discard(name)
+
+    def _fetch_to_file(self, name, url):
+        response = self.fetch(url)
+        tmp_path = f'{self.path(name)}.{uuid.uuid4().hex}.part'
+        try:
+            if response.status_code != 200:
+                raise RuntimeError(f'上游返回{response.status_code}')
+            size = 0
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    self.limiter.consume(len(chunk))
+                    f.write(chunk)
+                    size += len(chunk)
+            content_length = response.headers.get('content-length')
+            if content_length and int(content_length) != size:
+                raise RuntimeError(f'下载不完整: {size}/{content_length} 字节')
+            os.replace(tmp_path, self.path(name))
+        finally:
+            response.close()
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            self._counters['bytes'] += size
+        return response.headers.get('content-type'), size
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, enabled=self.enabled, in_flight=len(self._pending))
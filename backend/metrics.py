@@ -0,0 +1,174 @@
+"""轻量的Prometheus文本格式指标 - 计数器、仪表盘、直方图，按标签值分组"""
+import bisect
+import threading
+
+# 延迟直方图的桶（秒），覆盖本地处理到VolcEngine生成接口的长尾
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# 请求/响应体大小直方图的桶（字节）
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}')
+        return lines
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, *labels, value):
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value):
+        # 每个桶只记录落入该区间的次数，输出时再累加，observe只需一次二分查找
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = [(labels, (list(s[0]), s[1], s[2])) for labels, s in self._values.items()]
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = 'le="' + _format_number(float(bound)) + '"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_str} {_format_number(total)}')
+            lines.append(f'{self.name}_count{label_str} {count}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """注册在输出前调用的回调，用于把其他子系统的统计值同步到仪表盘"""
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.counter(
+    'http_requests_total', 'HTTP requests handled, by route and status', ('route', 'method', 'status'))
+http_latency = REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time to produce response headers', ('route', 'method'))
+http_in_flight = REGISTRY.gauge(
+    'http_requests_in_flight', 'HTTP requests currently being handled', ('route',))
+http_request_size = REGISTRY.histogram(
+    'http_request_size_bytes', 'HTTP request body size', ('route',), SIZE_BUCKETS)
+http_response_size = REGISTRY.histogram(
+    'http_response_size_bytes', 'HTTP response body size when known', ('route',), SIZE_BUCKETS)
+
+upstream_requests = REGISTRY.counter(
+    'upstream_requests_total', 'Upstream requests, by Action and HTTP status', ('action', 'status'))
+upstream_latency = REGISTRY.histogram(
+    'upstream_request_duration_seconds', 'Upstream time to response headers', ('action',))
+upstream_in_flight = REGISTRY.gauge(
+    'upstream_requests_in_flight', 'Upstream requests currently waiting for headers', ('action',))
+upstream_errors = REGISTRY.counter(
+    'upstream_errors_total', 'Upstream failures, by VolcEngine error code or exception type', ('action', 'code'))
+upstream_request_size = REGISTRY.histogram(
+    'upstream_request_size_bytes', 'Upstream request body size', ('action',), SIZE_BUCKETS)
+upstream_response_size = REGISTRY.histogram(
+    'upstream_response_size_bytes', 'Upstream response Content-Length', ('action',), SIZE_BUCKETS)
+upstream_retries = REGISTRY.counter(
+    'upstream_retries_total', 'Upstream requests retried after a transient failure', ('action',))
+admission_queue_depth = REGISTRY.gauge(
+    'upstream_admission_queue_depth', 'Requests waiting for an upstream admission slot', ('action',))
+admission_rejected = REGISTRY.counter(
+    'upstream_admission_rejected_total', 'Requests rejected with 429 by admission control', ('action',))
+admission_wait = REGISTRY.histogram(
+    'upstream_admission_wait_seconds', 'Time spent waiting for an upstream admission slot', ('action',))
+credential_requests = REGISTRY.counter(
+    'volcengine_account_requests_total', 'VolcEngine requests by account and outcome (ok, quota, auth)',
+    ('account', 'outcome'))
+sign_latency = REGISTRY.histogram(
+    'volcengine_sign_duration_seconds', 'Time spent signing VolcEngine requests', (),
+    (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005))
@@ -0,0 +1,125 @@
+"""服务端生成流水线 - 多个生成步骤在后台依次执行，上一步的结果URL直接作为下一步的输入图片
+
+每个阶段的状态写入任务库，任意worker进程都能查询进度；客户端不再下载中间结果再重新上传。
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from task_store import now_ms
+
+logger = logging.getLogger(__name__)
+
+
+class PipelineRunner:
+    """run_stage(step, image_url) 执行一步，返回 {'task_id': ..., 'result_url': ...}，失败时抛出异常
+
+    step为该步的参数dict；image_url为上一步的结果URL，第一步为None。
+    """
+
+    def __init__(self, store, run_stage, workers=4, stale_after=900.0):
+        self.store = store
+        self.run_stage = run_stage
+        self.workers = workers
+        self.stale_after = stale_after
+        self._lock = threading.Lock()
+        self._pid = None
+        self._executor = None
+        self._counters = {'started': 0, 'done': 0, 'failed': 0}
+        self._running = 0
+
+    @classmethod
+    def from_env(cls, store, run_stage, stage_timeout):
+        return cls(
+            store,
+            run_stage,
+            workers=int(os.getenv('PIPELINE_WORKERS', '4')),
+            # 单个阶段最长的无进度时间，超过后认为执行该流水线的进程已退出
+            stale_after=stage_timeout + 60,
+        )
+
+    def _executor_for_process(self):
+        # 与任务轮询相同，延迟到第一次使用时创建，fork出的worker进程各自创建线程池
+        pid = os.getpid()
+        with self._lock:
+            if self._pid != pid:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='pipeline')
+                self._pid = pid
+            return self._executor
+
+    def start(self, steps):
+        """登记流水线并在后台开始执行，返回初始记录"""
+        pipeline_id = uuid.uuid4().hex
+        stages = [
+            {'index': index, 'type': step['type'], 'prompt': step.get('prompt', ''), 'status': 'pending',
+             'task_id': None, 'result_url': None, 'error': None, 'started_at': None, 'completed_at': None}
+            for index, step in enumerate(steps)
+        ]
+        self.store.save_pipeline(pipeline_id, 'running', stages)
+        with self._lock:
+            self._counters['started'] += 1
+            self._running += 1
+        self._executor_for_process().submit(self._run, pipeline_id, steps, stages)
+        return self.get(pipeline_id)
+
+    def _run(self, pipeline_id, steps, stages):
+        image_url = None
+        status = 'done'
+        try:
+            for step, stage in zip(steps, stages):
+                stage['status'] = 'running'
+                stage['started_at'] = now_ms()
+                self.store.save_pipeline(pipeline_id, 'running', stages)
+                try:
+                    result = self.run_stage(step, image_url)
+                except Exception as e:
+                    logger.warning('流水线 %s 第%d步失败: %s', pipeline_id, stage['index'], e)
+                    stage.update(status='failed', error=str(e), completed_at=now_ms())
+                    for rest in stages[stage['index'] + 1:]:
+                        rest['status'] = 'skipped'
+                    status = 'failed'
+                    break
+                stage.update(status='done', completed_at=now_ms(), **result)
+                image_url = result['result_url']
+            self.store.save_pipeline(pipeline_id, status, stages)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._counters[status] += 1
+
+    def get(self, pipeline_id):
+        """读取流水线记录；长时间没有进度的running流水线标记为interrupted（执行它的进程已退出）"""
+        pipeline = self.store.get_pipeline(pipeline_id)
+        if pipeline is None:
+            return None
+        if pipeline['status'] == 'running' and now_ms() - pipeline['updated_at'] > self.stale_after * 1000:
+            pipeline['status'] = 'interrupted'
+        last = pipeline['stages'][-1]
+        pipeline['result_url'] = last['result_url'] if pipeline['status'] == 'done' else None
+        pipeline['pipeline_id'] = pipeline.pop('id')
+        return pipeline
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, running=self._running)
+
+
+def wait_for_task(poller, kind, task_id, timeout, heartbeat=15.0):
+    """借助后台轮询等待异步任务结束，返回最终的 (响应体, HTTP状态码)；超时抛出TimeoutError"""
+    poller.watch(kind, task_id)
+    end = time.monotonic() + timeout
+    version = 0
+    while True:
+        left = end - time.monotonic()
+        if left <= 0:
+            raise TimeoutError(f'任务 {task_id} 等待超时')
+        snapshot, version, terminal = poller.wait_for_change(kind, task_id, version, min(left, heartbeat))
+        if snapshot is None:
+            poller.watch(kind, task_id)  # 任务记录被淘汰时重新登记
+            continue
+        body, code = snapshot
+        if terminal or (not body.get('success') and code != 500):
+            return body, code
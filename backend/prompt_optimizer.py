@@ -0,0 +1,209 @@
+"""提示词优化 - 后端调用DeepSeek（OpenAI兼容的chat/completions接口）改写用户输入的提示词
+
+流式请求边收到token边转发给浏览器；改写结果按规范化后的提示词缓存（LRU+TTL），
+相同提示词同时只有一个LLM调用在途，其余请求等待并共用它的结果。
+"""
+import asyncio
+import os
+import unicodedata
+
+import json_codec
+from result_cache import ResultCache
+
+SYSTEM_PROMPTS = {
+    'video': """你是一个专业的视频生成提示词优化专家。请根据以下3个要点优化用户的描述：
+
+1. 明确运镜方式：
+   - 添加具体的镜头运动描述（如"镜头围绕...旋转"、"镜头从上往下俯拍"、"镜头缓缓推进"等）
+   - 描述视觉焦点和画面构图
+
+2. 明确行动逻辑：
+   - 确保动作有清晰的时间顺序
+   - 使用顺序词（首先、接着、然后、最后等）
+   - 描述连贯的动作流程
+
+3. 文字描述精准：
+   - 使用具体生动的动词
+   - 避免含糊不清的表达
+   - 添加细节描述增强画面感
+
+请将用户输入优化为更适合视频生成的提示词，保持原意但增强视觉表现力。
+
+重要限制：
+1. 优化后的提示词必须控制在150个字以内，请精炼表达
+2. 直接返回优化后的提示词内容，不要添加任何前缀、后缀或说明文字""",
+    'image': """你是一个专业的图片生成提示词优化专家。请根据以下要点优化用户的描述：
+
+1. 视觉元素描述：
+   - 明确主体对象、背景环境、色彩搭配
+   - 添加光影效果描述（如"柔和的阳光"、"戏剧性的阴影"等）
+   - 描述材质质感和细节特征
+
+2. 艺术风格指定：
+   - 指定绘画风格（如写实、插画、水彩、油画等）
+   - 添加艺术流派或艺术家风格参考
+   - 描述画面构图和视角
+
+3. 画面氛围营造：
+   - 使用情感化的形容词
+   - 描述整体氛围和情绪表达
+   - 添加细节描述增强画面感染力
+
+请将用户输入优化为更适合图片生成的提示词，保持原意但增强视觉表现力。
+
+重要限制：
+1. 优化后的提示词必须控制在120个字以内，请精炼表达
+2. 直接返回优化后的提示词内容，不要添加任何前缀、后缀或说明文字""",
+}
+MAX_TOKENS = {'video': 300, 'image': 250}
+
+# 模型偶尔仍会加上的前缀，按顺序去掉
+RESULT_PREFIXES = ('优化后的提示词', '提示词', '以下是优化后的内容')
+
+
+def normalize_prompt(text):
+    """缓存键使用的规范化提示词：全角转半角、合并连续空白"""
+    return ' '.join(unicodedata.normalize('NFKC', text).split())
+
+
+def clean_optimized_prompt(text):
+    text = text.strip()
+    for prefix in RESULT_PREFIXES:
+        for colon in (':', '：'):
+            if text.startswith(prefix + colon):
+                text = text[len(prefix) + 1:].lstrip()
+    return text.strip()
+
+
+def completion_text(response_data):
+    """非流式响应中的完整文本"""
+    return response_data['choices'][0]['message']['content']
+
+
+def parse_stream_line(line):
+    """解析SSE流中的一行，返回新增的文本；注释、空行、[DONE]和没有内容的分块返回空字符串"""
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    line = line.strip()
+    if not line.startswith('data:'):
+        return ''
+    payload = line[len('data:'):].strip()
+    if payload == '[DONE]':
+        return ''
+    choices = json_codec.loads(payload).get('choices') or [{}]
+    return choices[0].get('delta', {}).get('content') or ''
+
+
+class PromptOptimizer:
+    """构造chat/completions请求体并管理改写结果的缓存；HTTP请求由调用方通过连接池发送"""
+
+    def __init__(self, base_url, api_key, model='deepseek-chat', temperature=0.7, cache=None):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.model = model
+        self.temperature = temperature
+        self.cache = cache if cache is not None else ResultCache()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv('DEEPSEEK_API_BASE', 'https://api.deepseek.com/v1'),
+            os.getenv('DEEPSEEK_API_KEY', ''),
+            model=os.getenv('DEEPSEEK_MODEL', 'deepseek-chat'),
+            cache=ResultCache(
+                max_entries=int(os.getenv('PROMPT_CACHE_MAX_ENTRIES', '4096')),
+                ttl=float(os.getenv('PROMPT_CACHE_TTL', '86400')),
+            ),
+        )
+
+    @property
+    def url(self):
+        return f'{self.base_url}/chat/completions'
+
+    @property
+    def headers(self):
+        return {'Authorization': f'Bearer {self.api_key}', 'Content-Type': 'application/json'}
+
+    def request_body(self, kind, prompt, stream):
+        """UTF-8编码的请求体（bytes）"""
+        return json_codec.dumps({
+            'model': self.model,
+            'messages': [
+                {'role': 'system', 'content': SYSTEM_PROMPTS[kind]},
+                {'role': 'user', 'content': prompt},
+            ],
+            'temperature': self.temperature,
+            'max_tokens': MAX_TOKENS[kind],
+            'stream': stream,
+        })
+
+    @staticmethod
+    def cache_key(kind, prompt):
+        return ('optimize-prompt', kind, normalize_prompt(prompt))
+
+    def optimize(self, kind, prompt, fetch):
+        """返回改写后的提示词；fetch(请求体)发送非流式请求并返回模型输出的文本"""
+        return self.cache.get_or_compute(
+            self.cache_key(kind, prompt),
+            lambda: clean_optimized_prompt(fetch(self.request_body(kind, prompt, stream=False))),
+            bool,
+        )
+
+    async def optimize_async(self, kind, prompt, fetch):
+        """协程版本：fetch(请求体)返回awaitable"""
+        async def compute():
+            return clean_optimized_prompt(await fetch(self.request_body(kind, prompt, stream=False)))
+        return await self.cache.get_or_compute_async(self.cache_key(kind, prompt), compute, bool)
+
+    def stream(self, kind, prompt, open_stream):
+        """逐个产生事件dict：{'delta': 新增文本} ...，最后是 {'done': True, 'prompt': 完整结果}
+
+        open_stream(请求体)返回上游SSE响应的行迭代器。命中缓存或等待在途调用时只产生一个delta。
+        """
+        key = self.cache_key(kind, prompt)
+        state, value = self.cache.lookup(key)
+        if state != 'miss':
+            text = value if state == 'hit' else value.result()
+            yield {'delta': text}
+            yield {'done': True, 'prompt': text}
+            return
+        parts = []
+        try:
+            for line in open_stream(self.request_body(kind, prompt, stream=True)):
+                delta = parse_stream_line(line)
+                if delta:
+                    parts.append(delta)
+                    yield {'delta': delta}
+        except BaseException as e:
+            # 客户端断开时生成器被关闭（GeneratorExit），等待同一提示词的请求也要结束
+            self.cache.finish(key, value, error=e if isinstance(e, Exception) else RuntimeError('提示词优化已取消'))
+            raise
+        text = clean_optimized_prompt(''.join(parts))
+        self.cache.finish(key, value, text, cacheable=bool(text))
+        yield {'done': True, 'prompt': text}
+
+    async def stream_async(self, kind, prompt, open_stream):
+        """协程版本：open_stream(请求体)返回异步的行迭代器"""
+        key = self.cache_key(kind, prompt)
+        state, value = self.cache.lookup(key)
+        if state != 'miss':
+            text = value if state == 'hit' else await asyncio.wrap_future(value)
+            yield {'delta': text}
+            yield {'done': True, 'prompt': text}
+            return
+        parts = []
+        try:
+            async for line in open_stream(self.request_body(kind, prompt, stream=True)):
+                delta = parse_stream_line(line)
+                if delta:
+                    parts.append(delta)
+                    yield {'delta': delta}
+        except BaseException as e:
+            self.cache.finish(key, value, error=e if isinstance(e, Exception) else RuntimeError('提示词优化已取消'))
+            raise
+        text = clean_optimized_prompt(''.join(parts))
+        self.cache.finish(key, value, text, cacheable=bool(text))
+        yield {'done': True, 'prompt': text}
+
+    def stats(self):
+        return dict(self.cache.stats(), configured=bool(self.api_key))
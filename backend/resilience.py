@@ -0,0 +1,116 @@
+"""上游调用的容错原语 - 截止时间、带抖动的指数退避重试、按host的熔断器"""
+import math
+import random
+import threading
+import time
+
+
+class UpstreamUnavailable(Exception):
+    """上游暂时不可用，路由据此返回status_code（带Retry-After时提示客户端稍后重试）"""
+
+    status_code = 503
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self):
+        if self.retry_after is None:
+            return None
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class CircuitOpen(UpstreamUnavailable):
+    """熔断器打开期间直接失败，不再占用worker等待已经宕掉的上游"""
+
+    def __init__(self, host, retry_after):
+        super().__init__(f'上游 {host} 暂时不可用，请 {retry_after:.1f} 秒后重试', retry_after)
+        self.host = host
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """请求的时间预算已用完"""
+
+    status_code = 504
+
+    def __init__(self, message='上游请求超时'):
+        super().__init__(message)
+
+
+def remaining(deadline):
+    """距离截止时间（time.monotonic()）还剩多少秒；deadline为None表示不限"""
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def backoff_delay(attempt, base, cap):
+    """第attempt次重试前的等待时间：full jitter指数退避，避免大量请求同时重试"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """连续失败达到阈值后打开；冷却期过后放行一个探测请求（半开），成功则关闭"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, host, failure_threshold=5, reset_timeout=30.0):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.short_circuited = 0
+
+    def before_request(self):
+        """请求前调用；熔断打开（或半开且已有探测请求在途）时抛出CircuitOpen"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self._state == self.OPEN and now - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.short_circuited += 1
+            retry_after = max(self.reset_timeout - (now - self._opened_at), 0.0)
+        raise CircuitOpen(self.host, retry_after)
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def abort_probe(self):
+        """请求没有得到上游的结果（被取消或中断）：释放半开状态的探测名额，状态不变，下一个请求继续探测"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._state,
+                'failures': self._failures,
+                'opened': self.opened,
+                'short_circuited': self.short_circuited,
+            }
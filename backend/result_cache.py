@@ -0,0 +1,105 @@
+"""确定性生成请求的合并与结果缓存 - 相同请求体只产生一次上游调用，结果按TTL/LRU保留
+
+同一个key同时只有一个调用在途（single-flight），其余调用等待并共用它的结果或异常；
+完成且可缓存的结果在TTL内直接返回。同步线程和事件循环中的协程共用同一张在途表。
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class ResultCache:
+    """key -> 上游响应；缓存的值被多个请求共享，调用方不能修改"""
+
+    def __init__(self, max_entries=1024, ttl=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (过期时间, 值)，按最近使用排序
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'shared': 0, 'evictions': 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv('RESULT_CACHE_MAX_ENTRIES', '1024')),
+            ttl=float(os.getenv('RESULT_CACHE_TTL', '3600')),
+        )
+
+    def lookup(self, key):
+        """返回 ('hit', 值)、('shared', 在途Future) 或 ('miss', 新登记的Future)
+
+        得到miss的调用方负责计算结果，并且无论成功失败都必须调用finish()。
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._counters['hits'] += 1
+                    return 'hit', entry[1]
+                del self._entries[key]
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters['shared'] += 1
+                return 'shared', future
+            future = self._inflight[key] = Future()
+            future.set_running_or_notify_cancel()  # 等待者被取消时不会连带取消共享的Future
+            self._counters['misses'] += 1
+            return 'miss', future
+
+    def finish(self, key, future, value=None, error=None, cacheable=False):
+        with self._lock:
+            del self._inflight[key]
+            if error is None and cacheable and self.max_entries > 0:
+                self._entries[key] = (time.monotonic() + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self._counters['evictions'] += 1
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def get_or_compute(self, key, compute, cacheable=lambda value: True):
+        """返回key对应的结果；未命中且没有在途调用时执行compute()，cacheable(结果)为真时写入缓存"""
+        state, value = self.lookup(key)
+        if state == 'hit':
+            return value
+        if state == 'shared':
+            return value.result()
+        try:
+            result = compute()
+        except BaseException as e:
+            self.finish(key, value, error=e)
+            raise
+        self.finish(key, value, result, cacheable=cacheable(result))
+        return result
+
+    async def get_or_compute_async(self, key, compute, cacheable=lambda value: True):
+        """协程版本：compute为返回awaitable的函数，等待在途调用只占用协程"""
+        state, value = self.lookup(key)
+        if state == 'hit':
+            return value
+        if state == 'shared':
+            return await asyncio.wrap_future(value)
+        task = asyncio.ensure_future(compute())
+        task.add_done_callback(lambda done: self._settle(key, value, done, cacheable))
+        # 发起调用的请求被取消（客户端断开）时上游调用继续进行，其他等待者照常拿到结果
+        return await asyncio.shield(task)
+
+    def _settle(self, key, future, task, cacheable):
+        if task.cancelled():
+            self.finish(key, future, error=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self.finish(key, future, error=task.exception())
+        else:
+            self.finish(key, future, task.result(), cacheable=cacheable(task.result()))
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, entries=len(self._entries), in_flight=len(self._inflight))
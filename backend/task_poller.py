@@ -0,0 +1,205 @@
+"""后台任务状态轮询 - 每个task_id只向VolcEngine轮询一次，状态接口直接读本地任务表"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 这些状态出现后任务不会再变化，停止轮询
+TERMINAL_STATUSES = frozenset({'done', 'failed', 'not_found', 'expired'})
+
+
+class TaskEntry:
+    """任务表中的一条记录"""
+
+    __slots__ = (
+        'kind', 'task_id', 'body', 'code', 'status', 'terminal', 'polling',
+        'next_poll', 'updated_at', 'last_watched', 'polls', 'version',
+    )
+
+    def __init__(self, kind, task_id, now):
+        self.kind = kind
+        self.task_id = task_id
+        self.body = None  # 最近一次查询得到的响应体
+        self.code = None
+        self.status = None
+        self.terminal = False
+        self.polling = False
+        self.next_poll = now
+        self.updated_at = now
+        self.last_watched = now
+        self.polls = 0
+        self.version = 0  # 响应体每次变化时递增，供事件流判断是否有新状态
+
+    def snapshot(self):
+        if self.body is None:
+            return None
+        return self.body, self.code
+
+
+class TaskPoller:
+    """按固定节奏在后台轮询在途任务
+
+    fetchers: kind -> fetch(task_id)，返回 (响应体, HTTP状态码, 任务状态)。
+    同一任务的多个观察者共享一条记录，只产生一次上游查询。
+    """
+
+    def __init__(self, fetchers, interval=2.0, workers=4, idle_ttl=120, done_ttl=600):
+        self.fetchers = dict(fetchers)
+        self.interval = interval
+        self.workers = workers
+        self.idle_ttl = idle_ttl
+        self.done_ttl = done_ttl
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._executor = None
+        self._listeners = []
+        self._counters = {'watches': 0, 'merged_watches': 0, 'polls': 0, 'poll_errors': 0}
+
+    @classmethod
+    def from_env(cls, fetchers):
+        return cls(
+            fetchers,
+            interval=float(os.getenv('TASK_POLL_INTERVAL', '2')),
+            workers=int(os.getenv('TASK_POLL_WORKERS', '4')),
+            idle_ttl=float(os.getenv('TASK_POLL_IDLE_TTL', '120')),
+            done_ttl=float(os.getenv('TASK_POLL_DONE_TTL', '600')),
+        )
+
+    def _ensure_started(self):
+        # 延迟到第一次使用时启动，避免debug重载器的父进程也跑一份轮询线程
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix='task-poller'
+            )
+            thread = threading.Thread(target=self._run, name='task-scheduler', daemon=True)
+            thread.start()
+            self._pid = pid
+
+    def watch(self, kind, task_id):
+        """登记对任务的关注并返回当前快照 (响应体, HTTP状态码)；尚未查询到结果时返回None"""
+        if kind not in self.fetchers:
+            raise KeyError(f'unknown task kind: {kind}')
+        self._ensure_started()
+        now = time.monotonic()
+        key = (kind, task_id)
+        with self._lock:
+            self._counters['watches'] += 1
+            entry = self._tasks.get(key)
+            if entry is None:
+                entry = self._tasks[key] = TaskEntry(kind, task_id, now)
+                created = True
+            else:
+                self._counters['merged_watches'] += 1
+                created = False
+            entry.last_watched = now
+            snapshot = entry.snapshot()
+        if created:
+            self._wakeup.set()
+        return snapshot
+
+    def wait_for_change(self, kind, task_id, version, timeout):
+        """阻塞直到任务版本号超过version或超时，返回 (快照, 版本号, 是否已结束)"""
+        key = (kind, task_id)
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                entry = self._tasks.get(key)
+                if entry is None:
+                    return None, version, False
+                entry.last_watched = time.monotonic()
+                if entry.version > version:
+                    return entry.snapshot(), entry.version, entry.terminal
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return entry.snapshot(), entry.version, entry.terminal
+                self._changed.wait(remaining)
+
+    def add_listener(self, callback):
+        """注册状态变化回调 callback(kind, task_id)，在轮询线程中调用，不能阻塞"""
+        self._listeners.append(callback)
+
+    def _notify_listeners(self, entry):
+        for callback in self._listeners:
+            try:
+                callback(entry.kind, entry.task_id)
+            except Exception:
+                logger.exception('任务状态回调失败')
+
+    def get(self, kind, task_id):
+        """只读取任务记录，不登记关注"""
+        with self._lock:
+            return self._tasks.get((kind, task_id))
+
+    def _run(self):
+        tick = min(self.interval, 0.5)
+        while True:
+            now = time.monotonic()
+            due = []
+            with self._lock:
+                for key, entry in list(self._tasks.items()):
+                    if entry.terminal:
+                        if now - entry.updated_at > self.done_ttl:
+                            del self._tasks[key]
+                        continue
+                    if now - entry.last_watched > self.idle_ttl:
+                        # 没有客户端再关心的任务不再轮询
+                        del self._tasks[key]
+                        continue
+                    if not entry.polling and entry.next_poll <= now:
+                        entry.polling = True
+                        due.append(entry)
+            for entry in due:
+                self._executor.submit(self._poll, entry)
+            self._wakeup.wait(tick)
+            self._wakeup.clear()
+
+    def _poll(self, entry):
+        fetch = self.fetchers[entry.kind]
+        try:
+            body, code, status = fetch(entry.task_id)
+        except Exception as e:
+            logger.warning('轮询任务 %s 失败: %s', entry.task_id, e)
+            with self._lock:
+                self._counters['polls'] += 1
+                self._counters['poll_errors'] += 1
+                # 网络异常不覆盖已有的有效状态，首次查询即失败时才返回错误
+                changed = entry.body is None
+                if changed:
+                    entry.body, entry.code = {'success': False, 'error': str(e)}, 500
+                    entry.version += 1
+                    self._changed.notify_all()
+                entry.polling = False
+                entry.next_poll = time.monotonic() + self.interval
+            if changed:
+                self._notify_listeners(entry)
+            return
+        with self._lock:
+            self._counters['polls'] += 1
+            entry.polls += 1
+            changed = (body, code) != (entry.body, entry.code)
+            if changed:
+                entry.version += 1
+                self._changed.notify_all()
+            entry.body, entry.code, entry.status = body, code, status
+            entry.terminal = status in TERMINAL_STATUSES
+            entry.updated_at = time.monotonic()
+            entry.polling = False
+            entry.next_poll = entry.updated_at + self.interval
+        if changed:
+            self._notify_listeners(entry)
+
+    def stats(self):
+        with self._lock:
+            in_flight = sum(1 for e in self._tasks.values() if not e.terminal)
+            return dict(self._counters, tracked=len(self._tasks), in_flight=in_flight)
@@ -0,0 +1,351 @@
+"""任务持久化 - 嵌入式SQLite（WAL模式）记录提交过的生成任务，重启后历史仍在
+
+每个线程（及fork出的每个进程）使用自己的连接；WAL模式下读不阻塞写，多个worker进程可共用同一个库文件。
+写入失败只记录日志，不影响提交和查询接口本身。
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from task_poller import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# 旧版本建的表上补加的列：(表, 列, 类型)
+ADDED_COLUMNS = (
+    ('idempotency_keys', 'body_hash', 'TEXT'),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    req_key TEXT NOT NULL,
+    prompt TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL,
+    result_urls TEXT NOT NULL DEFAULT '[]',
+    submitted_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    completed_at INTEGER,
+    UNIQUE (kind, task_id)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, id);
+CREATE INDEX IF NOT EXISTS tasks_kind ON tasks (kind, id);
+CREATE INDEX IF NOT EXISTS tasks_submitted_at ON tasks (submitted_at);
+CREATE TABLE IF NOT EXISTS task_accounts (
+    kind TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    PRIMARY KEY (kind, task_id)
+);
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    scope TEXT NOT NULL,
+    token TEXT NOT NULL,
+    body_hash TEXT,
+    response TEXT,
+    status_code INTEGER,
+    lease_until INTEGER NOT NULL,
+    expires_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_keys_expires_at ON idempotency_keys (expires_at);
+CREATE TABLE IF NOT EXISTS pipelines (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    stages TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    name TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL,
+    content_type TEXT,
+    size INTEGER,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL
+);
+"""
+
+COLUMNS = 'id, kind, task_id, req_key, prompt, status, result_urls, submitted_at, updated_at, completed_at'
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+class TaskStore:
+    """tasks表每个 (kind, task_id) 一行，task_accounts表记录任务由哪个VolcEngine账号提交，
+    idempotency_keys表记录提交接口的幂等键，
+    pipelines表记录流水线各阶段的状态，results表记录下载到本地的结果文件；时间均为毫秒时间戳
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = {'writes': 0, 'errors': 0}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        # journal_mode是库文件的持久属性，建表时设置一次即可
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(SCHEMA)
+        self._add_columns(conn)
+
+    @classmethod
+    def from_env(cls):
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'tasks.sqlite3')
+        return cls(os.getenv('TASK_STORE_PATH', default_path))
+
+    @staticmethod
+    def _add_columns(conn):
+        for table, column, column_type in ADDED_COLUMNS:
+            columns = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+            if column in columns:
+                continue
+            try:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+            except sqlite3.OperationalError as e:
+                # 多个worker进程同时启动时，其他进程可能已经加上了这一列
+                if 'duplicate column' not in str(e):
+                    raise
+
+    def _connection(self):
+        local = self._local
+        pid = os.getpid()
+        if getattr(local, 'pid', None) != pid:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA synchronous=NORMAL')  # WAL下只在checkpoint时fsync
+            local.conn, local.pid = conn, pid
+        return local.conn
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _write(self, sql, params):
+        try:
+            cursor = self._connection().execute(sql, params)
+        except sqlite3.Error:
+            logger.exception('写入任务表失败')
+            self._count('errors')
+            return 0
+        self._count('writes')
+        return cursor.rowcount
+
+    def add(self, kind, task_id, req_key, prompt='', status='pending', result_urls=()):
+        """登记新提交的任务；同步生成的结果直接以done状态登记"""
+        now = now_ms()
+        completed_at = now if status in TERMINAL_STATUSES else None
+        self._write(
+            'INSERT INTO tasks (kind, task_id, req_key, prompt, status, result_urls,'
+            ' submitted_at, updated_at, completed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+            ' ON CONFLICT (kind, task_id) DO NOTHING',
+            (kind, task_id, req_key, prompt or '', status, json.dumps(list(result_urls)),
+             now, now, completed_at),
+        )
+
+    def update_status(self, kind, task_id, status, result_urls=()):
+        """记录轮询得到的最新状态；状态和结果都没变时不写库。未登记过的任务忽略"""
+        now = now_ms()
+        urls = json.dumps(list(result_urls))
+        completed_at = now if status in TERMINAL_STATUSES else None
+        return self._write(
+            'UPDATE tasks SET status = ?, result_urls = ?, updated_at = ?,'
+            ' completed_at = COALESCE(completed_at, ?)'
+            ' WHERE kind = ? AND task_id = ? AND (status != ? OR result_urls != ?)',
+            (status, urls, now, completed_at, kind, task_id, status, urls),
+        )
+
+    def get(self, kind, task_id):
+        """返回任务记录dict，不存在时返回None"""
+        try:
+            row = self._connection().execute(
+                f'SELECT {COLUMNS} FROM tasks WHERE kind = ? AND task_id = ?', (kind, task_id)
+            ).fetchone()
+        except sqlite3.Error:
+            logger.exception('读取任务表失败')
+            self._count('errors')
+            return None
+        return self._row(row) if row is not None else None
+
+    def list(self, limit=20, cursor=None, status=None, kind=None):
+        """按提交顺序倒序分页，返回 (记录列表, 下一页游标)；游标为上一页最后一条的id"""
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append('id < ?')
+            params.append(cursor)
+        if status is not None:
+            clauses.append('status = ?')
+            params.append(status)
+        if kind is not None:
+            clauses.append('kind = ?')
+            params.append(kind)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connection().execute(
+            f'SELECT {COLUMNS} FROM tasks {where} ORDER BY id DESC LIMIT ?', (*params, limit + 1)
+        ).fetchall()
+        tasks = [self._row(row) for row in rows[:limit]]
+        next_cursor = tasks[-1]['id'] if len(rows) > limit else None
+        return tasks, next_cursor
+
+    def set_task_account(self, kind, task_id, account):
+        """记录提交任务的账号；上游返回task_id后、任务登记之前调用，已记录过时不变"""
+        self._write(
+            'INSERT INTO task_accounts (kind, task_id, account, created_at) VALUES (?, ?, ?, ?)'
+            ' ON CONFLICT (kind, task_id) DO NOTHING',
+            (kind, task_id, account, now_ms()),
+        )
+
+    def get_task_account(self, kind, task_id):
+        """提交任务的账号名，没有记录时返回None"""
+        try:
+            row = self._connection().execute(
+                'SELECT account FROM task_accounts WHERE kind = ? AND task_id = ?', (kind, task_id)
+            ).fetchone()
+        except sqlite3.Error:
+            logger.exception('读取任务账号失败')
+            self._count('errors')
+            return None
+        return row[0] if row is not None else None
+
+    def get_idempotency_key(self, key):
+        """返回幂等键记录dict（response为NULL表示首次请求仍在处理），不存在时返回None"""
+        try:
+            row = self._connection().execute(
+                'SELECT key, scope, token, body_hash, response, status_code, lease_until, expires_at'
+                ' FROM idempotency_keys WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            logger.exception('读取幂等键失败')
+            self._count('errors')
+            return None
+        return dict(row) if row is not None else None
+
+    def claim_idempotency_key(self, key, scope, token, body_hash, lease_ms, ttl_ms):
+        """尝试以token占用幂等键并记下请求体摘要，返回占用后的记录；记录的token等于传入的token时表示占用成功
+
+        已过期的记录、以及占用期限已过仍未完成的记录（原请求所在进程已退出）会被清除后重新占用。
+        数据库不可用时返回None。
+        """
+        now = now_ms()
+        conn = self._connection()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute(
+                    'DELETE FROM idempotency_keys WHERE expires_at < ?'
+                    ' OR (key = ? AND response IS NULL AND lease_until < ?)', (now, key, now)
+                )
+                conn.execute(
+                    'INSERT OR IGNORE INTO idempotency_keys (key, scope, token, body_hash, lease_until, expires_at)'
+                    ' VALUES (?, ?, ?, ?, ?, ?)', (key, scope, token, body_hash, now + lease_ms, now + ttl_ms)
+                )
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error:
+            logger.exception('写入幂等键失败')
+            self._count('errors')
+            return None
+        self._count('writes')
+        return self.get_idempotency_key(key)
+
+    def complete_idempotency_key(self, key, token, response, status_code):
+        """记录首次请求的响应，之后的重复请求直接返回它"""
+        self._write(
+            'UPDATE idempotency_keys SET response = ?, status_code = ? WHERE key = ? AND token = ?',
+            (response, status_code, key, token),
+        )
+
+    def release_idempotency_key(self, key, token):
+        """首次请求失败时释放幂等键，客户端可以用同一个键重试"""
+        self._write('DELETE FROM idempotency_keys WHERE key = ? AND token = ?', (key, token))
+
+    def save_pipeline(self, pipeline_id, status, stages):
+        """新建或更新流水线记录"""
+        now = now_ms()
+        self._write(
+            'INSERT INTO pipelines (id, status, stages, created_at, updated_at) VALUES (?, ?, ?, ?, ?)'
+            ' ON CONFLICT (id) DO UPDATE SET status = excluded.status, stages = excluded.stages,'
+            ' updated_at = excluded.updated_at',
+            (pipeline_id, status, json.dumps(stages, ensure_ascii=False), now, now),
+        )
+
+    def get_pipeline(self, pipeline_id):
+        """返回流水线记录dict，不存在时返回None"""
+        try:
+            row = self._connection().execute(
+                'SELECT id, status, stages, created_at, updated_at FROM pipelines WHERE id = ?', (pipeline_id,)
+            ).fetchone()
+        except sqlite3.Error:
+            logger.exception('读取流水线失败')
+            self._count('errors')
+            return None
+        if row is None:
+            return None
+        pipeline = dict(row)
+        pipeline['stages'] = json.loads(pipeline['stages'])
+        return pipeline
+
+    def add_result(self, name, url):
+        """登记待下载到本地的结果文件，已登记过时不变"""
+        now = now_ms()
+        self._write(
+            "INSERT INTO results (name, url, status, created_at, updated_at) VALUES (?, ?, 'pending', ?, ?)"
+            ' ON CONFLICT (name) DO NOTHING',
+            (name, url, now, now),
+        )
+
+    def claim_result(self, name, stale_ms, retry_ms):
+        """占用结果文件的下载，成功返回True；下载中的记录超过stale_ms没有更新时（进程已退出）可以重新占用，
+        失败的记录超过retry_ms后重试"""
+        now = now_ms()
+        return self._write(
+            "UPDATE results SET status = 'downloading', updated_at = ? WHERE name = ? AND (status = 'pending'"
+            " OR (status = 'downloading' AND updated_at < ?) OR (status = 'failed' AND updated_at < ?))",
+            (now, name, now - stale_ms, now - retry_ms),
+        ) == 1
+
+    def finish_result(self, name, status, content_type=None, size=None):
+        self._write(
+            'UPDATE results SET status = ?, content_type = ?, size = ?, updated_at = ? WHERE name = ?',
+            (status, content_type, size, now_ms(), name),
+        )
+
+    def get_result(self, name):
+        """返回结果文件记录dict，不存在时返回None"""
+        try:
+            row = self._connection().execute(
+                'SELECT name, url, status, content_type, size, created_at, updated_at FROM results WHERE name = ?',
+                (name,)
+            ).fetchone()
+        except sqlite3.Error:
+            logger.exception('读取结果文件记录失败')
+            self._count('errors')
+            return None
+        return dict(row) if row is not None else None
+
+    @staticmethod
+    def _row(row):
+        task = dict(row)
+        task['result_urls'] = json.loads(task['result_urls'])
+        return task
+
+    def stats(self):
+        try:
+            rows = self._connection().execute('SELECT status, COUNT(*) FROM tasks GROUP BY status').fetchall()
+        except sqlite3.Error:
+            rows = []
+        counts = dict(rows)
+        in_flight = sum(n for status, n in counts.items() if status not in TERMINAL_STATUSES)
+        with self._lock:
+            return dict(self._counters, path=self.path, tasks=sum(counts.values()), in_flight=in_flight)
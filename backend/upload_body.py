@@ -0,0 +1,65 @@
+"""二进制图片上传的流式请求体 - 边读文件边做base64编码，内存占用与图片大小无关"""
+import base64
+import hashlib
+
+import json_codec
+
+# 请求体中图片位置的占位符，序列化后整体替换为流式编码的base64字符串
+IMAGE_PLACEHOLDER = '\x00binary_image\x00'
+
+# 3的倍数，保证分块base64编码中间不会出现填充字符
+CHUNK_SIZE = 3 * 16 * 1024
+
+
+class StreamingJsonBody:
+    """上游JSON请求体：image_stream的内容以base64字符串的形式出现在占位符处
+
+    构造时完整读一遍文件计算SHA-256（签名需要），发送时再读一遍，
+    两次都只在内存中保留一个分块。实现了__len__，requests据此设置Content-Length。
+    """
+
+    def __init__(self, request_body, image_stream, chunk_size=CHUNK_SIZE):
+        data = json_codec.dumps(request_body)
+        head, sep, tail = data.partition(json_codec.dumps(IMAGE_PLACEHOLDER))
+        if not sep:
+            raise ValueError('request_body中缺少图片占位符')
+        self._head = head + b'"'
+        self._tail = b'"' + tail
+        self._image = image_stream
+        self._chunk_size = chunk_size
+
+        self._image.seek(0, 2)
+        self.image_size = self._image.tell()
+        self._image.seek(0)
+        encoded_size = (self.image_size + 2) // 3 * 4
+        self._length = len(self._head) + encoded_size + len(self._tail)
+
+        digest = hashlib.sha256()
+        for chunk in self:
+            digest.update(chunk)
+        self.payload_hash = digest.hexdigest()
+
+    def __len__(self):
+        return self._length
+
+    def _iter_image_chunks(self):
+        """按chunk_size读取原始字节；底层流短读时补齐到3的倍数再编码"""
+        self._image.seek(0)
+        pending = b''
+        while True:
+            data = self._image.read(self._chunk_size)
+            if not data:
+                break
+            pending += data
+            usable = len(pending) - len(pending) % 3
+            if usable:
+                yield pending[:usable]
+                pending = pending[usable:]
+        if pending:
+            yield pending
+
+    def __iter__(self):
+        yield self._head
+        for chunk in self._iter_image_chunks():
+            yield base64.b64encode(chunk)
+        yield self._tail
@@ -0,0 +1,212 @@
+"""上游HTTP客户端 - 所有VolcEngine及CDN请求共用的长连接池，带截止时间、重试与熔断"""
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+import metrics
+from resilience import CircuitBreaker, DeadlineExceeded, backoff_delay, remaining
+
+logger = logging.getLogger(__name__)
+
+# 网络层可重试的异常：连接失败、超时、连接被重置
+RETRYABLE_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+# 上游过载或网关错误，可重试且计入熔断
+RETRYABLE_STATUSES = frozenset((500, 502, 503, 504))
+
+
+def is_connect_error(e):
+    """连接建立阶段的失败（连接被拒绝、DNS解析失败、连接超时）：请求还没有发出，任何请求都可以安全重试"""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], 'reason', None) if e.args else None
+    return isinstance(e, requests.ConnectionError) and isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
+class UpstreamClient:
+    """每个worker进程持有一个带连接池的Session，复用TCP+TLS连接"""
+
+    def __init__(self, pool_size=20, connect_timeout=3.05, read_timeout=60,
+                 max_attempts=3, backoff_base=0.2, backoff_cap=2.0,
+                 breaker_threshold=5, breaker_reset=30.0):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    @classmethod
+    def from_env(cls):
+        """从环境变量读取连接池配置"""
+        return cls(
+            pool_size=int(os.getenv('UPSTREAM_POOL_SIZE', '20')),
+            connect_timeout=float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '3.05')),
+            read_timeout=float(os.getenv('UPSTREAM_READ_TIMEOUT', '60')),
+            max_attempts=int(os.getenv('UPSTREAM_RETRY_ATTEMPTS', '3')),
+            backoff_base=float(os.getenv('UPSTREAM_RETRY_BACKOFF', '0.2')),
+            backoff_cap=float(os.getenv('UPSTREAM_RETRY_BACKOFF_MAX', '2')),
+            breaker_threshold=int(os.getenv('UPSTREAM_BREAKER_THRESHOLD', '5')),
+            breaker_reset=float(os.getenv('UPSTREAM_BREAKER_RESET', '30')),
+        )
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,  # 每个host一个连接池：VolcEngine + 若干CDN域名
+            pool_maxsize=self.pool_size,
+            max_retries=0,
+        )
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers['Connection'] = 'keep-alive'
+        return session
+
+    @property
+    def session(self):
+        # fork之后的子进程不能继承父进程的socket，按pid重新建立连接池
+        pid = os.getpid()
+        if self._session is None or self._pid != pid:
+            with self._lock:
+                if self._session is None or self._pid != pid:
+                    self._session = self._new_session()
+                    self._pid = pid
+        return self._session
+
+    def breaker(self, host):
+        breaker = self._breakers.get(host)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(
+                    host, CircuitBreaker(host, self.breaker_threshold, self.breaker_reset))
+        return breaker
+
+    def _timeout_for(self, deadline):
+        """读取超时不超过剩余的时间预算；预算已用完时抛出DeadlineExceeded"""
+        left = remaining(deadline)
+        if left is None:
+            return self.timeout
+        if left <= 0:
+            raise DeadlineExceeded()
+        return (min(self.connect_timeout, left), min(self.read_timeout, left))
+
+    def request(self, method, url, action=None, retry=False, deadline=None, **kwargs):
+        """发送请求并记录指标；action为指标标签，默认使用目标host
+
+        连接建立阶段的失败对所有请求都做带抖动的指数退避重试；retry为True时另外重试
+        发出之后的连接错误、超时和5xx（上游可能已经处理了请求，仅用于幂等请求）。
+        deadline为time.monotonic()时间点，限制包括重试在内的总耗时。
+        同一host连续失败会触发熔断，熔断期间直接抛出CircuitOpen。
+        """
+        parts = urlsplit(url)
+        action = action or parts.hostname
+        breaker = self.breaker(parts.netloc)
+        attempts = self.max_attempts
+        for attempt in range(attempts):
+            # 先检查时间预算再占用探测名额，预算用完时不会留下占着名额的半开熔断器
+            kwargs['timeout'] = self._timeout_for(deadline)
+            breaker.before_request()
+            try:
+                response = self._send(method, url, action, **kwargs)
+            except RETRYABLE_EXCEPTIONS as e:
+                breaker.record_failure()
+                if attempt + 1 >= attempts or not (retry or is_connect_error(e)):
+                    if isinstance(e, requests.Timeout) and deadline is not None and remaining(deadline) <= 0:
+                        raise DeadlineExceeded() from e
+                    raise
+                logger.info('上游请求失败，准备重试 %s (%d/%d): %s', action, attempt + 1, attempts, e)
+            except Exception:
+                breaker.record_failure()
+                raise
+            except BaseException:
+                breaker.abort_probe()
+                raise
+            else:
+                if response.status_code not in RETRYABLE_STATUSES:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                if attempt + 1 >= attempts or not retry:
+                    return response
+                response.close()
+                logger.info('上游返回%d，准备重试 %s (%d/%d)', response.status_code, action, attempt + 1, attempts)
+            delay = backoff_delay(attempt, self.backoff_base, self.backoff_cap)
+            left = remaining(deadline)
+            if left is not None and delay >= left:
+                raise DeadlineExceeded()
+            metrics.upstream_retries.inc(action)
+            time.sleep(delay)
+
+    def _send(self, method, url, action, **kwargs):
+        data = kwargs.get('data')
+        if data is not None and hasattr(data, '__len__'):
+            metrics.upstream_request_size.observe(action, value=len(data))
+        metrics.upstream_in_flight.inc(action)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except Exception as e:
+            metrics.upstream_requests.inc(action, 'error')
+            metrics.upstream_errors.inc(action, type(e).__name__)
+            raise
+        finally:
+            metrics.upstream_in_flight.dec(action)
+            metrics.upstream_latency.observe(action, value=time.perf_counter() - start)
+        metrics.upstream_requests.inc(action, str(response.status_code))
+        content_length = response.headers.get('content-length')
+        if content_length and content_length.isdigit():
+            metrics.upstream_response_size.observe(action, value=int(content_length))
+        return response
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def stats(self):
+        """连接池统计：misses为新建连接数，hits为复用已有连接的请求数"""
+        hits = misses = 0
+        pools = {}
+        session = self._session
+        if session is not None and self._pid == os.getpid():
+            for adapter in set(session.adapters.values()):
+                manager = adapter.poolmanager
+                for key in list(manager.pools.keys()):
+                    pool = manager.pools.get(key)
+                    if pool is None:
+                        continue
+                    pool_misses = pool.num_connections
+                    pool_hits = max(pool.num_requests - pool.num_connections, 0)
+                    hits += pool_hits
+                    misses += pool_misses
+                    pools[f'{pool.scheme}://{pool.host}'] = {
+                        'hits': pool_hits,
+                        'misses': pool_misses,
+                    }
+        breakers = {host: breaker.stats() for host, breaker in list(self._breakers.items())}
+        return {
+            'pool_size': self.pool_size,
+            'connect_timeout': self.connect_timeout,
+            'read_timeout': self.read_timeout,
+            'hits': hits,
+            'misses': misses,
+            'breakers_open': sum(1 for b in breakers.values() if b['state'] != CircuitBreaker.CLOSED),
+            'pools': pools,
+            'breakers': breakers,
+        }
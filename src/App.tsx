@@ -2,7 +2,7 @@ import { useState, useEffect } from 'react'
 import { Card, Radio, Input, Upload, Button, message, Spin, Image } from 'antd'
 import { UploadOutlined, DownloadOutlined } from '@ant-design/icons'
 import type { UploadFile } from 'antd/es/upload'
-import { jimengApi, deepseekApi } from './services/api'
+import { jimengApi, deepseekApi, type GenerationResponse } from './services/api'
 import { fileToBase64, downloadFile, detectImageAspectRatio, type AspectRatioType, IMAGE_ASPECT_RATIOS, type ImageAspectRatioType } from './utils/fileUtils'
 import './App.css'
 
@@ -85,6 +85,12 @@ function App() {
   
   const [aspectRatio, setAspectRatio] = useState<AspectRatioType>('16:9')
   const [imageAspectRatio, setImageAspectRatio] = useState<ImageAspectRatioType>('1:1')
+  // 后端没有ffmpeg时封面帧接口返回501，此时视频不设置封面
+  const [postersEnabled, setPostersEnabled] = useState(false)
+
+  useEffect(() => {
+    jimengApi.getFeatures().then(features => setPostersEnabled(features.posters_enabled))
+  }, [])
 
   // 清理预览URL
   useEffect(() => {
@@ -281,12 +287,14 @@ function App() {
     setState((prev: any) => ({ ...prev, optimizing: true }))
     try {
       // 根据模式选择不同的优化函数
+      // 优化结果边生成边显示在输入框中
+      const showPartial = (partial: string) => setState((prev: any) => ({ ...prev, textInput: partial }))
       let optimizedText: string
       if (currentMode === 'text-to-image') {
-        optimizedText = await deepseekApi.processImagePrompt(currentState.textInput)
+        optimizedText = await deepseekApi.processImagePrompt(currentState.textInput, showPartial)
       } else {
         // text-to-video 和 image-to-video 使用视频优化
-        optimizedText = await deepseekApi.processVideoPrompt(currentState.textInput)
+        optimizedText = await deepseekApi.processVideoPrompt(currentState.textInput, showPartial)
       }
       
       // 清理可能的前缀文字
@@ -485,6 +493,14 @@ function App() {
           
           console.log(`${mode} 状态查询响应:`, statusResponse)
           
+          if (handleStatusResponse(statusResponse)) {
+            // 保持loading状态，继续检查
+            setTimeout(checkStatus, 3000)
+          }
+        }
+        
+        // 处理一次状态结果，返回true表示任务仍在进行中
+        const handleStatusResponse = (statusResponse: GenerationResponse): boolean => {
           if (statusResponse.success && statusResponse.data) {
             const { status, result, video_url } = statusResponse.data
             
@@ -521,8 +537,7 @@ function App() {
                 ...prev, 
                 statusMessage: statusMap[status] || `当前状态: ${status}` 
               }))
-              // 保持loading状态，继续检查
-              setTimeout(checkStatus, 3000)
+              return true
             }
           } else {
             setState((prev: any) => ({ 
@@ -532,9 +547,16 @@ function App() {
             }))
             message.error('检查状态失败，请刷新页面重试')
           }
+          return false
         }
         
-        setTimeout(checkStatus, 3000)
+        // 优先通过SSE接收状态推送，事件流不可用时回退到3秒轮询
+        jimengApi.watchTaskEvents(
+          response.data!.task_id,
+          mode === 'image-edit' ? 'image_edit' : 'video',
+          handleStatusResponse,
+          () => setTimeout(checkStatus, 3000)
+        )
       } else {
         setState((prev: any) => ({ 
           ...prev, 
@@ -1082,7 +1104,8 @@ function App() {
             return result.type === 'image' ? (
               <div>
                 <Image
-                  src={result.url}
+                  src={`http://localhost:5000/api/image-proxy?url=${encodeURIComponent(result.url)}&w=960`}
+                  preview={{ src: result.url }}
                   alt="生成的图片"
                   style={{ maxWidth: '100%' }}
                 />
@@ -1097,7 +1120,9 @@ function App() {
               </div>
             ) : (
               <video
-                src={result.url.startsWith('http') ? `http://localhost:5000/api/video-proxy?url=${encodeURIComponent(result.url)}` : result.url}
+                src={result.url.startsWith('http') && !result.url.startsWith('http://localhost:5000') ? `http://localhost:5000/api/video-proxy?url=${encodeURIComponent(result.url)}` : result.url}
+                poster={postersEnabled ? `http://localhost:5000/api/video-poster?url=${encodeURIComponent(result.url)}` : undefined}
+                preload="metadata"
                 controls
                 style={{ maxWidth: '100%' }}
                 onError={(e) => {
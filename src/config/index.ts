@@ -1,7 +1,5 @@
 export const API_CONFIG = {
-  DEEPSEEK_API_KEY: import.meta.env.VITE_DEEPSEEK_API_KEY || 'sk-43fc565dd627428db42a1325b24886bd',
   JIMENG_API_BASE: 'https://visual.volcengineapi.com',
-  DEEPSEEK_API_BASE: 'https://api.deepseek.com/v1',
   // 火山引擎认证信息
   VOLCENGINE_ACCESS_KEY: import.meta.env.VITE_VOLCENGINE_ACCESS_KEY || '',
   VOLCENGINE_SECRET_KEY: import.meta.env.VITE_VOLCENGINE_SECRET_KEY || '',
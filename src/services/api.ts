@@ -1,5 +1,3 @@
-import axios from 'axios'
-import { API_CONFIG } from '../config'
 
 // const JIMENG_API_BASE = API_CONFIG.JIMENG_API_BASE // 不再使用，改为直接使用代理
 
@@ -52,7 +50,25 @@ export interface GenerationResponse {
   error?: string
 }
 
+export interface BackendFeatures {
+  posters_enabled: boolean
+}
+
 export const jimengApi = {
+  // 后端的可选功能；请求失败时按全部关闭处理
+  async getFeatures(): Promise<BackendFeatures> {
+    try {
+      const response = await fetch('http://localhost:5000/api/features')
+      const responseData = await response.json()
+      if (responseData.success && responseData.data) {
+        return responseData.data
+      }
+    } catch (error: any) {
+      console.error('获取后端功能失败:', error)
+    }
+    return { posters_enabled: false }
+  },
+
   async generateTextToVideo(request: TextToVideoRequest): Promise<GenerationResponse> {
     try {
       // 使用Python后端服务
@@ -258,108 +274,106 @@ export const jimengApi = {
         error: error.message
       }
     }
-  }
-}
-
-export const deepseekApi = {
-  async processVideoPrompt(text: string): Promise<string> {
-    try {
-      const response = await axios.post(`${API_CONFIG.DEEPSEEK_API_BASE}/chat/completions`, {
-        model: 'deepseek-chat',
-        messages: [
-          {
-            role: 'system',
-            content: `你是一个专业的视频生成提示词优化专家。请根据以下3个要点优化用户的描述：
+  },
 
-1. 明确运镜方式：
-   - 添加具体的镜头运动描述（如"镜头围绕...旋转"、"镜头从上往下俯拍"、"镜头缓缓推进"等）
-   - 描述视觉焦点和画面构图
+  // 订阅任务状态事件流（SSE），状态变化时立即回调；连接失败时调用onError以便回退到轮询
+  watchTaskEvents(
+    task_id: string,
+    kind: 'video' | 'image_edit',
+    onStatus: (response: GenerationResponse) => void,
+    onError: () => void
+  ): () => void {
+    const source = new EventSource(
+      `http://localhost:5000/api/tasks/${encodeURIComponent(task_id)}/events?kind=${kind}`
+    )
+    let finished = false
 
-2. 明确行动逻辑：
-   - 确保动作有清晰的时间顺序
-   - 使用顺序词（首先、接着、然后、最后等）
-   - 描述连贯的动作流程
+    source.addEventListener('status', (event) => {
+      const responseData: GenerationResponse = JSON.parse((event as MessageEvent).data)
+      console.log('即梦AI 任务状态事件:', responseData)
+      if (!responseData.success || responseData.data?.status === 'done' || responseData.data?.status === 'failed') {
+        finished = true
+        source.close()
+      }
+      onStatus(responseData)
+    })
 
-3. 文字描述精准：
-   - 使用具体生动的动词
-   - 避免含糊不清的表达
-   - 添加细节描述增强画面感
+    source.onerror = () => {
+      if (finished) return
+      finished = true
+      source.close()
+      onError()
+    }
 
-请将用户输入优化为更适合视频生成的提示词，保持原意但增强视觉表现力。
+    return () => {
+      finished = true
+      source.close()
+    }
+  }
+}
 
-重要限制：
-1. 优化后的提示词必须控制在150个字以内，请精炼表达
-2. 直接返回优化后的提示词内容，不要添加任何前缀、后缀或说明文字`
-          },
-          {
-            role: 'user',
-            content: text
-          }
-        ],
-        temperature: 0.7,
-        max_tokens: 300
-      }, {
+// 提示词优化由后端调用DeepSeek：流式返回模型输出，相同提示词共用后端缓存；失败时返回原文
+export const deepseekApi = {
+  async optimizePrompt(text: string, kind: 'video' | 'image', onDelta?: (partial: string) => void): Promise<string> {
+    try {
+      const response = await fetch('http://localhost:5000/api/optimize-prompt', {
+        method: 'POST',
         headers: {
-          'Authorization': `Bearer ${API_CONFIG.DEEPSEEK_API_KEY}`,
           'Content-Type': 'application/json'
-        }
+        },
+        body: JSON.stringify({
+          prompt: text,
+          kind: kind,
+          stream: true
+        })
       })
       
-      return response.data.choices[0].message.content
-    } catch (error: any) {
-      console.error('DeepSeek API error:', error)
-      return text
-    }
-  },
-
-  async processImagePrompt(text: string): Promise<string> {
-    try {
-      const response = await axios.post(`${API_CONFIG.DEEPSEEK_API_BASE}/chat/completions`, {
-        model: 'deepseek-chat',
-        messages: [
-          {
-            role: 'system',
-            content: `你是一个专业的图片生成提示词优化专家。请根据以下要点优化用户的描述：
-
-1. 视觉元素描述：
-   - 明确主体对象、背景环境、色彩搭配
-   - 添加光影效果描述（如"柔和的阳光"、"戏剧性的阴影"等）
-   - 描述材质质感和细节特征
-
-2. 艺术风格指定：
-   - 指定绘画风格（如写实、插画、水彩、油画等）
-   - 添加艺术流派或艺术家风格参考
-   - 描述画面构图和视角
-
-3. 画面氛围营造：
-   - 使用情感化的形容词
-   - 描述整体氛围和情绪表达
-   - 添加细节描述增强画面感染力
-
-请将用户输入优化为更适合图片生成的提示词，保持原意但增强视觉表现力。
-
-重要限制：
-1. 优化后的提示词必须控制在120个字以内，请精炼表达
-2. 直接返回优化后的提示词内容，不要添加任何前缀、后缀或说明文字`
-          },
-          {
-            role: 'user',
-            content: text
+      if (!response.ok || !response.body) {
+        console.error('提示词优化 API 错误:', response.status)
+        return text
+      }
+      
+      // NDJSON：每行一个 {"delta": ...}，最后一行为 {"done": true, "prompt": ...}
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+      let partial = ''
+      let result = text
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+        const lines = buffer.split('\n')
+        buffer = lines.pop() ?? ''
+        for (const line of lines) {
+          if (!line.trim()) continue
+          const event = JSON.parse(line)
+          if (event.error) {
+            console.error('提示词优化 API 错误:', event.error)
+            return text
+          }
+          if (event.delta) {
+            partial += event.delta
+            onDelta?.(partial)
+          }
+          if (event.done) {
+            result = event.prompt || text
           }
-        ],
-        temperature: 0.7,
-        max_tokens: 250
-      }, {
-        headers: {
-          'Authorization': `Bearer ${API_CONFIG.DEEPSEEK_API_KEY}`,
-          'Content-Type': 'application/json'
         }
-      })
+      }
       
-      return response.data.choices[0].message.content
+      return result
     } catch (error: any) {
       console.error('DeepSeek API error:', error)
       return text
     }
+  },
+
+  async processVideoPrompt(text: string, onDelta?: (partial: string) => void): Promise<string> {
+    return deepseekApi.optimizePrompt(text, 'video', onDelta)
+  },
+
+  async processImagePrompt(text: string, onDelta?: (partial: string) => void): Promise<string> {
+    return deepseekApi.optimizePrompt(text, 'image', onDelta)
   }
-}
\ No newline at end of file
+}
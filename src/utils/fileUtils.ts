@@ -26,7 +26,12 @@ export function downloadFile(url: string, filename: string) {
   
   console.log('是否为图片:', isImage)
   
-  if (isImage) {
+  if (url.startsWith('http://localhost:5000/api/results/')) {
+    // 已本地化的生成结果直接从后端下载
+    const resultUrl = `${url}?download=true&filename=${encodeURIComponent(filename)}`
+    console.log('下载本地结果:', resultUrl)
+    link.href = resultUrl
+  } else if (isImage) {
     // 使用后端代理下载图片，传递文件名参数
     const proxyUrl = `http://localhost:5000/api/image-proxy?url=${encodeURIComponent(url)}&filename=${encodeURIComponent(filename)}`
     console.log('使用图片代理下载:', proxyUrl)